@@ -10,7 +10,7 @@ class CartItemInline(admin.TabularInline):
 class CartAdmin(admin.ModelAdmin):
     list_display = ['id', 'user_id', 'total_items', 'total_amount', 'created_at']
     inlines = [CartItemInline]
-    readonly_fields = ['total_amount', 'total_items', 'created_at', 'updated_at']
+    readonly_fields = ['total_amount', 'total_items', 'items_count', 'created_at', 'updated_at']
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
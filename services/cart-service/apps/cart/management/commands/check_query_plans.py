@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from shop_common.query_plans import analyze, check_plans, seeded_test_database
+from shop_common.transport import get_transport
+from ...models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN QUERY PLAN основных запросов представлений на заполненной тестовой БД; ошибка при полном сканировании'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=2000)
+        parser.add_argument('--items', type=int, default=5, help='Позиций в корзине')
+
+    def seed(self, carts, items_per_cart):
+        transport = get_transport()
+        transport.add_user('plan-check', 1, email='plan-check@example.com')
+        for product_id in range(1, items_per_cart + 2):
+            transport.add_product(product_id, f'Product {product_id}', '10.00', stock_quantity=1000)
+
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in range(1, carts + 1)])
+        CartItem.objects.bulk_create([
+            CartItem(cart_id=cart_id, product_id=product_id, product_name=f'Product {product_id}',
+                     price=Decimal('10.00'), quantity=1)
+            for cart_id in Cart.objects.values_list('id', flat=True)
+            for product_id in range(1, items_per_cart + 1)
+        ])
+        Cart.refresh_totals(Cart.objects.values_list('id', flat=True))
+        analyze()
+
+    def scenarios(self, headers):
+        item_id = CartItem.objects.filter(cart__user_id=1).values_list('id', flat=True).first()
+        new_product_id = CartItem.objects.values_list('product_id', flat=True).order_by('-product_id').first() + 1
+
+        return [
+            ('cart detail', lambda client: client.get('/api/cart/', **headers)),
+            ('cart summary', lambda client: client.get('/api/cart/summary/', **headers)),
+            ('add to cart', lambda client: client.post('/api/cart/add/', {'product_id': new_product_id, 'quantity': 1},
+                                                       content_type='application/json', **headers)),
+            ('update cart item', lambda client: client.put(f'/api/cart/update/{item_id}/', {'quantity': 2},
+                                                           content_type='application/json', **headers)),
+            ('bulk cart operations', lambda client: client.post(
+                '/api/cart/bulk/', {'operations': [{'op': 'add', 'product_id': 1},
+                                                   {'op': 'update', 'product_id': 2, 'quantity': 3},
+                                                   {'op': 'remove', 'product_id': new_product_id}]},
+                content_type='application/json', **headers)),
+        ]
+
+    def handle(self, *args, **options):
+        with seeded_test_database(), override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport'):
+            get_transport.cache_clear()
+            try:
+                self.seed(options['carts'], options['items'])
+                full_scans = check_plans(self.scenarios({'HTTP_AUTHORIZATION': 'Bearer plan-check'}),
+                                         self.stdout.write)
+            finally:
+                get_transport.cache_clear()
+
+        if full_scans:
+            raise CommandError('Full table scans: ' + '; '.join(f"{label}: {detail}" for label, detail, _ in full_scans))
+        self.stdout.write(self.style.SUCCESS('No full table scans'))
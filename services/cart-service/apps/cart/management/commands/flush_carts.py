@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...storage import CartFlusher, RedisCartStorage, get_cart_storage
+
+
+class Command(BaseCommand):
+    help = 'Запись изменённых корзин из Redis в БД (для CART_STORAGE = RedisCartStorage)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Сохранить все изменённые корзины и выйти')
+        parser.add_argument('--interval', type=float, default=settings.CART_FLUSH_INTERVAL,
+                            help='Пауза в секундах, когда изменённых корзин нет')
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        if not isinstance(storage, RedisCartStorage):
+            raise CommandError(f"CART_STORAGE {settings.CART_STORAGE} does not use write-behind persistence")
+
+        flusher = CartFlusher(storage)
+        if not options['once']:
+            self.stdout.write(f"Flushing carts every {options['interval']}s")
+            flusher.run(options['interval'])
+
+        total = 0
+        while True:
+            flushed = flusher.flush()
+            if not flushed:
+                break
+            total += flushed
+        self.stdout.write(self.style.SUCCESS(f"Flushed {total} carts"))
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ...models import Cart
+from ...storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = ('Удаление брошенных корзин (пустых старше CART_EMPTY_RETENTION и без изменений '
+            'дольше CART_STALE_RETENTION) вместе с позициями, пачками короткими транзакциями; '
+            'корзины, которые есть в Redis или ещё не сохранены из него, не удаляются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.CART_PURGE_CHUNK_SIZE,
+                            help='Корзин в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать брошенные корзины')
+        parser.add_argument('--compact', action='store_true',
+                            help='Вернуть освободившиеся страницы SQLite файловой системе (auto_vacuum=INCREMENTAL)')
+
+    @staticmethod
+    def pragma(name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+        return row and row[0]
+
+    def free_bytes(self):
+        """Байты на свободных страницах файла SQLite; None для других БД."""
+        if connection.vendor != 'sqlite':
+            return None
+        return self.pragma('freelist_count') * self.pragma('page_size')
+
+    def compact(self, chunk_pages=1000):
+        """Возвращает свободные страницы файлу порциями, не блокируя запись надолго; байты, на которые он уменьшился."""
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING(f"--compact is only supported for SQLite, not {connection.vendor}"))
+            return 0
+        if self.pragma('auto_vacuum') != 2:
+            self.stdout.write(self.style.WARNING(
+                "SQLite auto_vacuum is not INCREMENTAL: free pages are reused by new rows, "
+                "run VACUUM in a maintenance window to shrink the file"))
+            return 0
+        page_size = self.pragma('page_size')
+        before = self.pragma('page_count')
+        while self.pragma('freelist_count'):
+            self.pragma(f'incremental_vacuum({chunk_pages})')
+        return (before - self.pragma('page_count')) * page_size
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            carts = Cart.objects.abandoned()
+            self.stdout.write(self.style.SUCCESS(f"{carts.count()} abandoned carts would be deleted"))
+            return
+
+        storage = get_cart_storage()
+        free_before = self.free_bytes()
+        carts = items = 0
+        for user_ids, items_deleted in Cart.purge_abandoned(options['chunk_size'], keep=storage.active_users):
+            storage.evict(user_ids)
+            carts += len(user_ids)
+            items += items_deleted
+
+        message = f"Deleted {carts} carts and {items} items"
+        if free_before is not None:
+            message += f", {self.free_bytes() - free_before} bytes freed for reuse"
+        if options['compact']:
+            message += f", file shrunk by {self.compact()} bytes"
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from ...models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Сверка хранимых итогов корзин с позициями и исправление расхождений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Корзин за один проход')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def drifted(self, cart_ids):
+        """Корзины пачки, у которых хранимые итоги не совпадают с позициями."""
+        return list(
+            Cart.objects.filter(pk__in=cart_ids)
+            .annotate(
+                actual_amount=Coalesce(Sum(F('items__price') * F('items__quantity')), Decimal('0.00'),
+                                       output_field=Cart._meta.get_field('total_amount')),
+                actual_items=Coalesce(Sum('items__quantity'), 0),
+                actual_count=Count('items'),
+            )
+            .filter(~Q(total_amount=F('actual_amount')) | ~Q(total_items=F('actual_items'))
+                    | ~Q(items_count=F('actual_count')))
+            .values_list('pk', flat=True)
+        )
+
+    def handle(self, *args, **options):
+        chunk_size, dry_run = options['chunk_size'], options['dry_run']
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            cart_ids = list(Cart.objects.filter(pk__gt=last_id).order_by('pk')
+                            .values_list('pk', flat=True)[:chunk_size])
+            if not cart_ids:
+                break
+            last_id = cart_ids[-1]
+            checked += len(cart_ids)
+            drifted = self.drifted(cart_ids)
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    Cart.refresh_totals(drifted)
+            repaired += len(drifted)
+
+        action = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} carts, {repaired} {action}"))
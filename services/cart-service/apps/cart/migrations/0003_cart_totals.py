@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:16
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    items = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+    Cart.objects.update(
+        total_amount=Coalesce(
+            Subquery(
+                items.annotate(total=Sum(F("price") * F("quantity"))).values("total")
+            ),
+            Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        total_items=Coalesce(
+            Subquery(items.annotate(total=Sum("quantity")).values("total")), 0
+        ),
+        items_count=Coalesce(
+            Subquery(items.annotate(count=Count("id")).values("count")), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_processedevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="items_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total_amount",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total_items",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
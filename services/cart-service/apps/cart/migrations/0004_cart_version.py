@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0003_cart_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
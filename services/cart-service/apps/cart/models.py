@@ -1,29 +1,163 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from decimal import Decimal
 
 
+class CartQuerySet(models.QuerySet):
+
+    def with_items(self):
+        """Позиции корзин загружаются одним запросом на всю выборку."""
+        return self.prefetch_related('items')
+
+    def abandoned(self, now=None):
+        """Пустые корзины старше CART_EMPTY_RETENTION и корзины без изменений дольше CART_STALE_RETENTION."""
+        now = now or timezone.now()
+        return self.filter(Q(items_count=0, updated_at__lt=now - settings.CART_EMPTY_RETENTION)
+                           | Q(updated_at__lt=now - settings.CART_STALE_RETENTION))
+
+
+class CartVersionConflict(Exception):
+    """Корзину изменил другой запрос после того, как клиент прочитал её версию."""
+
+    def __init__(self, cart_id, expected_version):
+        super().__init__(f"Cart {cart_id} is no longer at version {expected_version}")
+        self.cart_id = cart_id
+        self.expected_version = expected_version
+
+
 class Cart(models.Model):
     user_id = models.IntegerField(unique=True)
+    # Итоги по позициям хранятся в корзине и обновляются в транзакции изменения позиций
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_items = models.PositiveIntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)
+    # Увеличивается при каждом изменении позиций (оптимистическая блокировка)
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart of User {self.user_id}"
 
-    @property
-    def total_amount(self):
-        """Вычисляет общую сумму корзины."""
-        return sum(item.subtotal for item in self.items.all())
+    @classmethod
+    def check_version(cls, cart_id, expected_version):
+        """Проверяет версию корзины в начале транзакции изменения.
 
-    @property
-    def total_items(self):
-        """Вычисляет общее количество товаров в корзине."""
-        return sum(item.quantity for item in self.items.all())
+        Сравнение выполняется в UPDATE, который не меняет значения: до конца
+        транзакции другой запрос не изменит корзину между проверкой и записью.
+        При несовпадении CartVersionConflict откатывает транзакцию.
+        """
+        if expected_version is None:
+            return
+        if not cls.objects.filter(pk=cart_id, version=expected_version).update(version=F('version')):
+            raise CartVersionConflict(cart_id, expected_version)
+
+    @classmethod
+    def refresh_totals(cls, cart_ids):
+        """Пересчитывает итоги корзин по позициям и увеличивает версию одним UPDATE.
 
-    def clear(self):
+        Вызывается в транзакции, изменившей позиции. Строка корзины сначала
+        блокируется там, где есть SELECT FOR UPDATE, чтобы пересчёт видел
+        позиции уже зафиксированных параллельных изменений. Обновляет и
+        updated_at, от которого зависят ETag и Last-Modified.
+        """
+        if connection.features.has_select_for_update:
+            list(cls.objects.select_for_update().filter(pk__in=cart_ids).values_list('pk'))
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return cls.objects.filter(pk__in=cart_ids).update(
+            total_amount=Coalesce(Subquery(items.annotate(total=Sum(F('price') * F('quantity'))).values('total')),
+                                  Value(Decimal('0.00')), output_field=cls._meta.get_field('total_amount')),
+            total_items=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+            items_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), 0),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+
+    def clear(self, expected_version=None):
         """Очищает корзину от всех товаров."""
-        self.items.all().delete()
-        self.save()
+        with transaction.atomic():
+            Cart.check_version(self.pk, expected_version)
+            self.items.all().delete()
+            Cart.refresh_totals([self.pk])
+        self.refresh_from_db(fields=['total_amount', 'total_items', 'items_count', 'version', 'updated_at'])
+
+    def apply_changes(self, changes, defaults, expected_version=None):
+        """Изменяет несколько позиций одной транзакцией.
+
+        changes: product_id -> ('add', n) - увеличить на n или создать с n,
+        ('set', n) - установить n (0 удаляет позицию). defaults:
+        product_id -> product_name и price для новых позиций.
+        """
+        with transaction.atomic():
+            Cart.check_version(self.pk, expected_version)
+            existing = set(self.items.filter(product_id__in=changes).values_list('product_id', flat=True))
+            removed = [product_id for product_id, (kind, quantity) in changes.items() if not quantity]
+            if removed:
+                self.items.filter(product_id__in=removed).delete()
+
+            updated = {product_id: F('quantity') + quantity if kind == 'add' else Value(quantity)
+                       for product_id, (kind, quantity) in changes.items() if quantity and product_id in existing}
+            if updated:
+                self.items.filter(product_id__in=updated).update(
+                    quantity=Case(*[When(product_id=product_id, then=value) for product_id, value in updated.items()],
+                                  output_field=models.PositiveIntegerField()),
+                    updated_at=timezone.now(),
+                )
+
+            created = [CartItem(cart=self, product_id=product_id, quantity=quantity, **defaults[product_id])
+                       for product_id, (kind, quantity) in changes.items() if quantity and product_id not in existing]
+            try:
+                with transaction.atomic():
+                    CartItem.objects.bulk_create(created)
+            except IntegrityError:
+                # Позицию того же товара параллельно создал другой запрос
+                raise CartVersionConflict(self.pk, expected_version)
+            Cart.refresh_totals([self.pk])
+
+    @classmethod
+    def purge_abandoned(cls, chunk_size, now=None, keep=None):
+        """Удаляет брошенные корзины вместе с позициями пачками по chunk_size.
+
+        Каждая пачка - отдельная короткая транзакция, поэтому блокировка
+        записи не держится на всё время очистки. Условие проверяется заново
+        при удалении: корзина, изменённая после выборки, остаётся. keep(user_ids)
+        возвращает пользователей, корзины которых удалять нельзя. Для каждой
+        пачки возвращает (user_id удалённых корзин, число удалённых позиций).
+        """
+        now = now or timezone.now()
+        last_id = 0
+        while True:
+            chunk = list(cls.objects.abandoned(now).filter(pk__gt=last_id).order_by('pk')
+                         .values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                return
+            last_id = chunk[-1]
+            with transaction.atomic():
+                carts = cls.objects.abandoned(now).filter(pk__in=chunk)
+                if keep is not None:
+                    carts = carts.exclude(user_id__in=keep(list(carts.values_list('user_id', flat=True))))
+                if connection.features.has_select_for_update:
+                    carts = cls.objects.filter(pk__in=list(carts.select_for_update().values_list('pk', flat=True)))
+                # Первый DELETE берёт блокировку записи SQLite до конца транзакции
+                items, _ = CartItem.objects.filter(cart__in=carts).delete()
+                user_ids = list(carts.values_list('user_id', flat=True))
+                carts.delete()
+            yield user_ids, items
+
+    @classmethod
+    def clear_for_users(cls, user_ids):
+        """Очищает корзины нескольких пользователей одним DELETE."""
+        with transaction.atomic():
+            CartItem.objects.filter(cart__user_id__in=user_ids).delete()
+            return cls.objects.filter(user_id__in=user_ids).update(
+                total_amount=Decimal('0.00'), total_items=0, items_count=0,
+                version=F('version') + 1, updated_at=timezone.now()
+            )
 
 
 class CartItem(models.Model):
@@ -42,9 +176,67 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product_name or f'Product {self.product_id}'}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Cart.refresh_totals([self.cart_id])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Cart.refresh_totals([self.cart_id])
+        return result
+
+    @classmethod
+    def add_quantity(cls, cart_id, product_id, quantity, defaults, expected_version=None):
+        """Добавляет товар в корзину или увеличивает его количество на quantity.
+
+        Увеличение выполняется выражением F('quantity') + quantity в UPDATE,
+        поэтому параллельные добавления не теряются. Возвращает (позиция, создана ли).
+        """
+        with transaction.atomic():
+            Cart.check_version(cart_id, expected_version)
+            # Новая позиция пересчитывает итоги в save()
+            item, created = cls.objects.get_or_create(
+                cart_id=cart_id, product_id=product_id, defaults={**defaults, 'quantity': quantity}
+            )
+            if not created:
+                cls.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+                Cart.refresh_totals([cart_id])
+        item.refresh_from_db()
+        return item, created
+
+    def set_quantity(self, quantity, expected_version=None):
+        """Устанавливает количество одним UPDATE колонки, не перезаписывая остальные поля."""
+        with transaction.atomic():
+            Cart.check_version(self.cart_id, expected_version)
+            CartItem.objects.filter(pk=self.pk).update(quantity=quantity, updated_at=timezone.now())
+            Cart.refresh_totals([self.cart_id])
+        self.refresh_from_db()
+
+    def remove(self, expected_version=None):
+        """Удаляет позицию; с expected_version - только если корзина не менялась."""
+        with transaction.atomic():
+            Cart.check_version(self.cart_id, expected_version)
+            CartItem.objects.filter(pk=self.pk).delete()
+            Cart.refresh_totals([self.cart_id])
+
     @property
     def subtotal(self):
         """Вычисляет подитог для данного элемента корзины."""
         return self.price *  self.quantity
 
 
+class ProcessedEvent(models.Model):
+    """Журнал обработанных событий для защиты от повторной доставки."""
+    event_id = models.UUIDField(primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.event_id)
+
+    @classmethod
+    def purge_expired(cls, retention):
+        """Удаляет записи старше срока хранения."""
+        deleted, _ = cls.objects.filter(processed_at__lt=timezone.now() - retention).delete()
+        return deleted
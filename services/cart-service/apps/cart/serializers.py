@@ -1,9 +1,12 @@
+from decimal import ROUND_HALF_UP
+
 from rest_framework import serializers
+from shop_common.fieldsets import SparseFieldsetMixin
 from .models import Cart, CartItem
 from .services import ProductService
 
-class CartItemSerializer(serializers.ModelSerializer):
-    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, rounding=ROUND_HALF_UP)
     product_info = serializers.SerializerMethodField()
 
     class Meta:
@@ -18,10 +21,15 @@ class CartItemSerializer(serializers.ModelSerializer):
             'product_info',
             'created_at',
         ]
+        field_dependencies = {'subtotal': ['price', 'quantity'], 'product_info': ['product_id']}
 
     def get_product_info(self, obj):
         """Получение информации о продукте из сервиса продуктов."""
-        product_data = ProductService.get_product(obj.product_id)
+        products = self.context.get('products')
+        if products is not None:
+            product_data = products.get(obj.product_id)
+        else:
+            product_data = ProductService.get_product(obj.product_id)
         if product_data:
             return{
                 'name': product_data.get('name'),
@@ -33,10 +41,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         return None
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
-    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    total_items = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Cart
@@ -46,11 +52,26 @@ class CartSerializer(serializers.ModelSerializer):
             'items',
             'total_items',
             'total_amount',
+            'version',
             'created_at',
             'updated_at',
         ]
+        read_only_fields = ['total_items', 'total_amount', 'version']
+
+    def to_representation(self, instance):
+        items = self.fields.get('items')
+        if items is not None and 'product_info' in items.child.fields and 'products' not in self.context:
+            # Сведения о товарах всех позиций одним запросом к product-service
+            product_ids = {item.product_id: 1 for item in instance.items.all()}
+            self.context['products'] = (ProductService.check_availability_batch(product_ids) or {}) if product_ids else {}
+        return super().to_representation(instance)
+
+class CartVersionSerializer(serializers.Serializer):
+    # Версия корзины, которую видел клиент; при расхождении изменение отклоняется с 409
+    version = serializers.IntegerField(min_value=0, required=False)
 
-class AddToCartSerializer(serializers.Serializer):
+
+class AddToCartSerializer(CartVersionSerializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1, default=1)
 
@@ -64,5 +85,24 @@ class AddToCartSerializer(serializers.Serializer):
         return value
 
 
-class UpdateCartItemSerializer(serializers.Serializer):
+class UpdateCartItemSerializer(CartVersionSerializer):
     quantity = serializers.IntegerField(min_value=1)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'update', 'remove'])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add':
+            attrs.setdefault('quantity', 1)
+        elif attrs['op'] == 'update' and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        return attrs
+
+
+class BulkCartSerializer(CartVersionSerializer):
+    MAX_OPERATIONS = 100
+
+    operations = serializers.ListField(child=CartOperationSerializer(), min_length=1, max_length=MAX_OPERATIONS)
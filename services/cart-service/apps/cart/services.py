@@ -2,16 +2,26 @@ import requests
 import logging
 from django.conf import settings
 from typing import Optional, Dict, Any
+from shop_common.transport import ETagCache, get_transport
+
+# Карточки товаров перепроверяются по ETag вместо повторной загрузки
+product_etags = ETagCache()
+
+# Поля карточки товара, которые читает корзина: без описания и вложенной категории
+PRODUCT_FIELDS = 'id,name,price,image_url,is_active,stock_quantity'
 
 class ProductService:
     """Сервис для взаимодействия с product-service"""
+    # Ограничение product-service на число товаров в пакетной проверке
+    BATCH_SIZE = 100
 
     @staticmethod
     def get_product(product_id: int)-> Optional[Dict[str, Any]]:
         """Получение информации о продукте по ID"""
         try:
-            response = requests.get(
+            response = product_etags.get(
                 f"{settings.PRODUCT_SERVICE_URL}/api/products/{product_id}/",
+                params={'fields': PRODUCT_FIELDS},
                 timeout=5
             )
             if response.status_code == 200:
@@ -25,7 +35,7 @@ class ProductService:
     def check_availability(product_id: int, quantity: int) -> bool:
         """Проверка доступности продукта"""
         try:
-            response = requests.get(
+            response = get_transport().get(
                 f"{settings.PRODUCT_SERVICE_URL}/api/products/{product_id}/check-availability/",
                 params={'quantity': quantity},
                 timeout=5
@@ -38,6 +48,31 @@ class ProductService:
             logging.error(f"Error checking availability for product {product_id}: {e}")
             return False
 
+    @staticmethod
+    def check_availability_batch(quantities: Dict[int, int]) -> Optional[Dict[int, Dict[str, Any]]]:
+        """Доступность и сведения о нескольких товарах: product_id -> ответ product-service.
+
+        Один запрос на каждые BATCH_SIZE товаров. Товаров, которых нет
+        в product-service, в результате нет; None, если сервис недоступен.
+        """
+        items = [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()]
+        results = {}
+        try:
+            for start in range(0, len(items), ProductService.BATCH_SIZE):
+                response = get_transport().post(
+                    f"{settings.PRODUCT_SERVICE_URL}/api/products/check-availability/",
+                    json={'items': items[start:start + ProductService.BATCH_SIZE]},
+                    timeout=5
+                )
+                if response.status_code != 200:
+                    logging.error(f"Batch availability check failed with {response.status_code}")
+                    return None
+                results.update((result['product_id'], result) for result in response.json()['results'])
+            return results
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error checking availability for {len(items)} products: {e}")
+            return None
+
 
 class UserService:
     """Сервис для взаимодействия с user-service"""
@@ -47,7 +82,7 @@ class UserService:
         """Получение информации о пользователе по JWT токену"""
         try:
             headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
+            response = get_transport().get(
                 f"{settings.USER_SERVICE_URL}/api/auth/user-info/",
                 headers=headers,
                 timeout=5
@@ -0,0 +1,776 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cart, CartItem, CartVersionConflict
+
+logger = logging.getLogger(__name__)
+
+
+def cart_etag(cart_id, updated_at) -> str:
+    return f"{cart_id}-{to_micro(updated_at)}"
+
+
+def to_micro(value: datetime) -> int:
+    """Время в микросекундах Unix: так оно хранится в Redis и входит в ETag."""
+    return int(value.timestamp()) * 1_000_000 + value.microsecond
+
+
+def from_micro(value) -> datetime:
+    seconds, microseconds = divmod(int(value), 1_000_000)
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc).replace(microsecond=microseconds)
+
+
+class EmptyCart:
+    """Корзина пользователя, которой ещё нет: отдаётся при чтении без создания строки в БД."""
+    id = pk = None
+    total_items = items_count = version = 0
+    total_amount = Decimal('0.00')
+    created_at = updated_at = None
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.items = CartItem.objects.none()
+
+
+class CartStorage:
+    """Интерфейс хранилища корзин, через которое работают представления.
+
+    Корзина возвращается объектом Cart с загруженными позициями (cart.items.all()
+    не обращается к БД), позиции - объектами CartItem.
+    """
+
+    def get_cart(self, user_id: int, queryset=None, create: bool = True) -> Cart:
+        """Корзина пользователя с позициями; если её нет, создаётся, а при create=False - EmptyCart."""
+        raise NotImplementedError
+
+    def validators(self, user_id: int) -> Tuple[Optional[str], Optional[datetime]]:
+        """ETag и Last-Modified корзины без загрузки позиций."""
+        raise NotImplementedError
+
+    def summary(self, user_id: int) -> Optional[dict]:
+        """Итоги и версия корзины; None, если корзины нет."""
+        raise NotImplementedError
+
+    def item_quantity(self, user_id: int, product_id: int) -> Optional[int]:
+        """Количество товара в корзине; None, если его там нет."""
+        raise NotImplementedError
+
+    def get_item(self, user_id: int, item_id: int) -> CartItem:
+        """Позиция корзины пользователя по её id; CartItem.DoesNotExist, если её нет."""
+        raise NotImplementedError
+
+    def get_product_item(self, user_id: int, product_id: int) -> CartItem:
+        """Позиция корзины пользователя по товару; CartItem.DoesNotExist, если её нет."""
+        raise NotImplementedError
+
+    def add_item(self, user_id: int, product_id: int, quantity: int, defaults: dict,
+                 expected_version: Optional[int] = None) -> Tuple[CartItem, bool]:
+        """Добавление товара или увеличение количества; (позиция, создана ли)."""
+        raise NotImplementedError
+
+    def set_quantity(self, user_id: int, item: CartItem, quantity: int,
+                     expected_version: Optional[int] = None) -> CartItem:
+        raise NotImplementedError
+
+    def remove_item(self, user_id: int, item: CartItem, expected_version: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    def apply_changes(self, user_id: int, changes: Dict[int, Tuple[str, int]], defaults: Dict[int, dict],
+                      expected_version: Optional[int] = None) -> None:
+        """Изменения нескольких позиций одной транзакцией (формат - Cart.apply_changes)."""
+        raise NotImplementedError
+
+    def clear(self, user_id: int, expected_version: Optional[int] = None) -> bool:
+        """Очистка корзины; False, если корзины нет."""
+        raise NotImplementedError
+
+    def clear_for_users(self, user_ids: Iterable[int]) -> int:
+        """Очистка корзин нескольких пользователей; число очищенных корзин в БД."""
+        raise NotImplementedError
+
+    def evict(self, user_ids: Iterable[int]) -> None:
+        """Забывает корзины пользователей, удалённые из БД (purge_carts)."""
+        raise NotImplementedError
+
+    def active_users(self, user_ids: Iterable[int]) -> set:
+        """Пользователи, корзины которых ещё не сохранены в БД или используются: их нельзя удалять."""
+        raise NotImplementedError
+
+
+class DatabaseCartStorage(CartStorage):
+    """Корзины в таблицах Cart и CartItem: каждое изменение - транзакция БД."""
+
+    def get_cart(self, user_id, queryset=None, create=True):
+        queryset = Cart.objects.with_items() if queryset is None else queryset
+        if not create:
+            try:
+                return queryset.get(user_id=user_id)
+            except Cart.DoesNotExist:
+                return EmptyCart(user_id)
+        cart, created = queryset.get_or_create(user_id=user_id)
+        if created:
+            logger.info("Created new cart for user_id: %s", user_id)
+        return cart
+
+    def validators(self, user_id):
+        cart = Cart.objects.filter(user_id=user_id).values_list('id', 'updated_at').first()
+        return (None, None) if cart is None else (cart_etag(*cart), cart[1])
+
+    def summary(self, user_id):
+        return (Cart.objects.filter(user_id=user_id)
+                .values('total_items', 'total_amount', 'items_count', 'version').first())
+
+    def item_quantity(self, user_id, product_id):
+        return (CartItem.objects.filter(cart__user_id=user_id, product_id=product_id)
+                .values_list('quantity', flat=True).first())
+
+    def get_item(self, user_id, item_id):
+        return CartItem.objects.get(id=item_id, cart__user_id=user_id)
+
+    def get_product_item(self, user_id, product_id):
+        return CartItem.objects.get(product_id=product_id, cart__user_id=user_id)
+
+    def add_item(self, user_id, product_id, quantity, defaults, expected_version=None):
+        cart, _ = Cart.objects.get_or_create(user_id=user_id)
+        return CartItem.add_quantity(cart.id, product_id, quantity, defaults, expected_version)
+
+    def set_quantity(self, user_id, item, quantity, expected_version=None):
+        item.set_quantity(quantity, expected_version)
+        return item
+
+    def remove_item(self, user_id, item, expected_version=None):
+        item.remove(expected_version)
+
+    def apply_changes(self, user_id, changes, defaults, expected_version=None):
+        cart, _ = Cart.objects.get_or_create(user_id=user_id)
+        cart.apply_changes(changes, defaults, expected_version)
+
+    def clear(self, user_id, expected_version=None):
+        cart = Cart.objects.filter(user_id=user_id).first()
+        if cart is None:
+            return False
+        cart.clear(expected_version)
+        return True
+
+    def clear_for_users(self, user_ids):
+        return Cart.clear_for_users(user_ids)
+
+    def evict(self, user_ids):
+        pass
+
+    def active_users(self, user_ids):
+        return set()
+
+
+class RedisCartStorage(CartStorage):
+    """Горячие корзины в хешах Redis с отложенной записью в БД (write-behind).
+
+    Корзина пользователя занимает три ключа:
+      cart:{user_id}           - cart_id, version, created_at, updated_at;
+      cart:{user_id}:items     - product_id -> количество (HINCRBY);
+      cart:{user_id}:products  - product_id -> название, цена и время добавления.
+    Изменения увеличивают version в той же транзакции MULTI и добавляют
+    пользователя в множество carts:dirty, которое разбирает CartFlusher.
+    Холодная корзина загружается из БД при первом обращении, ключи живут
+    CART_REDIS_TTL секунд с последнего изменения.
+
+    Строки CartItem появляются только при сохранении, поэтому
+    идентификатор позиции в ответах - product_id.
+    """
+    DIRTY_KEY = 'carts:dirty'
+
+    def __init__(self, client=None):
+        self.client = client or redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT,
+                                            db=settings.REDIS_DB, decode_responses=False)
+        self.ttl = settings.CART_REDIS_TTL
+
+    @staticmethod
+    def keys(user_id) -> Tuple[str, str, str]:
+        meta_key = f'cart:{user_id}'
+        return meta_key, f'{meta_key}:items', f'{meta_key}:products'
+
+    @staticmethod
+    def _product_info(name, price, created_at) -> bytes:
+        return orjson.dumps({'name': name, 'price': str(price), 'created_at': to_micro(created_at)})
+
+    def load(self, user_id, create=True) -> Optional[Dict[bytes, bytes]]:
+        """Поля cart:{user_id}; холодная корзина сначала загружается из БД.
+
+        Запись идёт под WATCH: если корзину параллельно загрузил другой
+        запрос, его данные (возможно, уже изменённые) не перезаписываются.
+        При create=False корзина, которой нет и в БД, не создаётся - None.
+        """
+        meta_key, items_key, products_key = self.keys(user_id)
+        meta = self.client.hgetall(meta_key)
+        if b'cart_id' in meta:
+            return meta
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(meta_key)
+                # Без cart_id ключ остался от изменения, записанного после evict()
+                if not pipe.hexists(meta_key, 'cart_id'):
+                    if create:
+                        cart, _ = Cart.objects.get_or_create(user_id=user_id)
+                    else:
+                        cart = Cart.objects.filter(user_id=user_id).first()
+                        if cart is None:
+                            return None
+                    items = list(cart.items.all())
+                    pipe.multi()
+                    pipe.delete(meta_key, items_key, products_key)
+                    for item in items:
+                        pipe.hset(items_key, item.product_id, item.quantity)
+                        pipe.hset(products_key, item.product_id,
+                                  self._product_info(item.product_name, item.price, item.created_at))
+                    pipe.hset(meta_key, mapping={
+                        'cart_id': cart.id,
+                        'version': cart.version,
+                        'created_at': to_micro(cart.created_at),
+                        'updated_at': to_micro(cart.updated_at),
+                    })
+                    self._expire(pipe, user_id)
+                    pipe.execute()
+                    logger.info("Loaded cart of user_id %s into Redis", user_id)
+            except redis.WatchError:
+                pass
+        return self.client.hgetall(meta_key)
+
+    def _expire(self, pipe, user_id):
+        for key in self.keys(user_id):
+            pipe.expire(key, self.ttl)
+
+    def snapshot(self, user_id) -> Optional[Tuple[Dict[bytes, bytes], List[CartItem]]]:
+        """Поля корзины и позиции, прочитанные одной транзакцией; None, если корзины нет в Redis."""
+        meta_key, items_key, products_key = self.keys(user_id)
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(meta_key)
+            pipe.hgetall(items_key)
+            pipe.hgetall(products_key)
+            meta, quantities, products = pipe.execute()
+        if b'cart_id' not in meta:
+            return None
+
+        cart_id = int(meta[b'cart_id'])
+        items = []
+        for product_id, quantity in quantities.items():
+            info = products.get(product_id)
+            if info is None:
+                continue
+            info = orjson.loads(info)
+            items.append(CartItem(id=int(product_id), cart_id=cart_id, product_id=int(product_id),
+                                  quantity=int(quantity), price=Decimal(info['price']),
+                                  product_name=info['name'], created_at=from_micro(info['created_at'])))
+        items.sort(key=lambda item: (item.created_at, item.product_id))
+        return meta, items
+
+    def _snapshot(self, user_id, create=True):
+        if self.load(user_id, create) is None:
+            return None
+        state = self.snapshot(user_id)
+        if state is None:
+            # Ключи истекли между загрузкой и чтением
+            if self.load(user_id, create) is None:
+                return None
+            state = self.snapshot(user_id)
+        return state
+
+    def get_cart(self, user_id, queryset=None, create=True):
+        state = self._snapshot(user_id, create)
+        if state is None:
+            return EmptyCart(user_id)
+        meta, items = state
+        cart = Cart(id=int(meta[b'cart_id']), user_id=user_id, version=int(meta[b'version']),
+                    total_amount=sum((item.subtotal for item in items), Decimal('0.00')),
+                    total_items=sum(item.quantity for item in items), items_count=len(items),
+                    created_at=from_micro(meta[b'created_at']), updated_at=from_micro(meta[b'updated_at']))
+        # Позиции кладутся так же, как их сохраняет prefetch_related
+        prefetched = CartItem.objects.all()
+        prefetched._result_cache = items
+        prefetched._prefetch_done = True
+        cart._prefetched_objects_cache = {'items': prefetched}
+        return cart
+
+    def validators(self, user_id):
+        meta = self.load(user_id, create=False)
+        if meta is None:
+            return None, None
+        return f"{int(meta[b'cart_id'])}-{int(meta[b'updated_at'])}", from_micro(meta[b'updated_at'])
+
+    def summary(self, user_id):
+        cart = self.get_cart(user_id, create=False)
+        if cart.pk is None:
+            return None
+        return {'total_items': cart.total_items, 'total_amount': cart.total_amount,
+                'items_count': cart.items_count, 'version': cart.version}
+
+    def item_quantity(self, user_id, product_id):
+        if self.load(user_id, create=False) is None:
+            return None
+        quantity = self.client.hget(self.keys(user_id)[1], product_id)
+        return None if quantity is None else int(quantity)
+
+    def get_item(self, user_id, item_id):
+        return self.get_product_item(user_id, item_id)
+
+    def get_product_item(self, user_id, product_id):
+        state = self._snapshot(user_id, create=False)
+        for item in state[1] if state else []:
+            if item.product_id == product_id:
+                return item
+        raise CartItem.DoesNotExist(f"Cart item for product {product_id} does not exist")
+
+    def _mutate(self, user_id, expected_version, commands, item_id=None):
+        """Изменение корзины одной транзакцией MULTI вместе с версией и отметкой для сохранения.
+
+        При expected_version или item_id (позиция должна существовать) ключи
+        отслеживаются WATCH; без expected_version транзакция повторяется,
+        если корзину изменили между проверкой и записью.
+        """
+        meta_key, items_key, _ = self.keys(user_id)
+        cart_id = int(self.load(user_id)[b'cart_id'])
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    if expected_version is not None or item_id is not None:
+                        pipe.watch(meta_key, items_key)
+                        if expected_version is not None and int(pipe.hget(meta_key, 'version')) != expected_version:
+                            raise CartVersionConflict(cart_id, expected_version)
+                        if item_id is not None and not pipe.hexists(items_key, item_id):
+                            raise CartItem.DoesNotExist(f"Cart item {item_id} does not exist")
+                        pipe.multi()
+                    commands(pipe)
+                    pipe.hincrby(meta_key, 'version', 1)
+                    pipe.hset(meta_key, 'updated_at', to_micro(timezone.now()))
+                    pipe.sadd(self.DIRTY_KEY, user_id)
+                    self._expire(pipe, user_id)
+                    return pipe.execute()
+                except redis.WatchError:
+                    if expected_version is not None:
+                        raise CartVersionConflict(cart_id, expected_version)
+
+    def add_item(self, user_id, product_id, quantity, defaults, expected_version=None):
+        _, items_key, products_key = self.keys(user_id)
+        info = self._product_info(defaults['product_name'], defaults['price'], timezone.now())
+
+        def commands(pipe):
+            pipe.hsetnx(products_key, product_id, info)
+            pipe.hincrby(items_key, product_id, quantity)
+
+        created = bool(self._mutate(user_id, expected_version, commands)[0])
+        return self.get_item(user_id, product_id), created
+
+    def set_quantity(self, user_id, item, quantity, expected_version=None):
+        items_key = self.keys(user_id)[1]
+        self._mutate(user_id, expected_version, lambda pipe: pipe.hset(items_key, item.product_id, quantity),
+                     item_id=item.product_id)
+        item.quantity = quantity
+        return item
+
+    def remove_item(self, user_id, item, expected_version=None):
+        _, items_key, products_key = self.keys(user_id)
+
+        def commands(pipe):
+            pipe.hdel(items_key, item.product_id)
+            pipe.hdel(products_key, item.product_id)
+
+        self._mutate(user_id, expected_version, commands, item_id=item.product_id)
+
+    def apply_changes(self, user_id, changes, defaults, expected_version=None):
+        _, items_key, products_key = self.keys(user_id)
+        now = timezone.now()
+
+        def commands(pipe):
+            for product_id, (kind, quantity) in changes.items():
+                if not quantity:
+                    pipe.hdel(items_key, product_id)
+                    pipe.hdel(products_key, product_id)
+                    continue
+                info = defaults[product_id]
+                pipe.hsetnx(products_key, product_id, self._product_info(info['product_name'], info['price'], now))
+                if kind == 'add':
+                    pipe.hincrby(items_key, product_id, quantity)
+                else:
+                    pipe.hset(items_key, product_id, quantity)
+
+        self._mutate(user_id, expected_version, commands)
+
+    def clear(self, user_id, expected_version=None):
+        meta_key, items_key, products_key = self.keys(user_id)
+        if not self.client.exists(meta_key) and not Cart.objects.filter(user_id=user_id).exists():
+            return False
+        self._mutate(user_id, expected_version, lambda pipe: pipe.delete(items_key, products_key))
+        return True
+
+    def clear_for_users(self, user_ids):
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            meta_key, items_key, products_key = self.keys(user_id)
+            if self.client.exists(meta_key):
+                self._mutate(user_id, None, lambda pipe: pipe.delete(items_key, products_key))
+        return Cart.clear_for_users(user_ids)
+
+    def evict(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        with self.client.pipeline() as pipe:
+            for user_id in user_ids:
+                pipe.delete(*self.keys(user_id))
+            pipe.srem(self.DIRTY_KEY, *user_ids)
+            pipe.execute()
+
+    def active_users(self, user_ids):
+        user_ids = list(user_ids)
+        with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.sismember(self.DIRTY_KEY, user_id)
+                pipe.exists(self.keys(user_id)[0])
+            flags = pipe.execute()
+        return {user_id for user_id, dirty, cached in zip(user_ids, flags[::2], flags[1::2]) if dirty or cached}
+
+
+class LocalRedis:
+    """Замена Redis в памяти процесса для тестов и разработки.
+
+    Поддерживает только команды, которые использует RedisCartStorage,
+    с теми же типами ответов (значения - bytes), включая транзакции
+    pipeline() с WATCH/MULTI/EXEC.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+        self._expires = {}
+        # Номер изменения ключа для WATCH
+        self._revisions = {}
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _get(self, key, default=None):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._remove(key)
+        return self._data.get(key, default)
+
+    def _remove(self, key):
+        if self._data.pop(key, None) is not None:
+            self._touch(key)
+        self._expires.pop(key, None)
+
+    def _touch(self, key):
+        self._revisions[key] = self._revisions.get(key, 0) + 1
+
+    def _hash(self, key) -> dict:
+        value = self._get(key)
+        if value is None:
+            value = self._data[key] = {}
+        self._touch(key)
+        return value
+
+    def _drop_empty(self, key):
+        if not self._data.get(key):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(self._get(key) is not None for key in keys)
+
+    def delete(self, *keys):
+        with self._lock:
+            existing = [key for key in keys if self._get(key) is not None]
+            for key in existing:
+                self._remove(key)
+            return len(existing)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key, {}))
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._get(key, {}).get(self._bytes(field))
+
+    def hexists(self, key, field):
+        with self._lock:
+            return self._bytes(field) in self._get(key, {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._lock:
+            values = self._hash(key)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = 0
+            for name, item in items.items():
+                name = self._bytes(name)
+                added += name not in values
+                values[name] = self._bytes(item)
+            return added
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            values = self._hash(key)
+            field = self._bytes(field)
+            if field in values:
+                return False
+            values[field] = self._bytes(value)
+            return True
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            values = self._hash(key)
+            field = self._bytes(field)
+            result = int(values.get(field, 0)) + amount
+            values[field] = self._bytes(result)
+            return result
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            values = self._hash(key)
+            removed = sum(values.pop(self._bytes(field), None) is not None for field in fields)
+            self._drop_empty(key)
+            return removed
+
+    def sadd(self, key, *members):
+        with self._lock:
+            values = self._get(key)
+            if values is None:
+                values = self._data[key] = set()
+            before = len(values)
+            values.update(self._bytes(member) for member in members)
+            self._touch(key)
+            return len(values) - before
+
+    def srem(self, key, *members):
+        with self._lock:
+            values = self._get(key, set())
+            removed = sum(self._bytes(member) in values for member in members)
+            values.difference_update(self._bytes(member) for member in members)
+            self._touch(key)
+            self._drop_empty(key)
+            return removed
+
+    def sismember(self, key, member):
+        with self._lock:
+            return self._bytes(member) in self._get(key, set())
+
+    def srandmember(self, key, number=None):
+        with self._lock:
+            values = list(self._get(key, set()))[:number or 1]
+            return values if number is not None else (values[0] if values else None)
+
+
+class LocalPipeline:
+    """pipeline() LocalRedis: после watch() команды выполняются сразу, после multi() - при execute()."""
+
+    def __init__(self, client: LocalRedis):
+        self.client = client
+        self.reset()
+
+    def reset(self):
+        self._commands = []
+        self._watched = {}
+        self._immediate = False
+
+    def watch(self, *keys):
+        with self.client._lock:
+            self._watched = {key: self.client._revisions.get(key, 0) for key in keys}
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if self._immediate:
+                return method(*args, **kwargs)
+            self._commands.append((method, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        with self.client._lock:
+            try:
+                for key, revision in self._watched.items():
+                    self.client._get(key)
+                    if self.client._revisions.get(key, 0) != revision:
+                        raise redis.WatchError("Watched variable changed.")
+                return [method(*args, **kwargs) for method, args, kwargs in self._commands]
+            finally:
+                self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+
+class LocalRedisCartStorage(RedisCartStorage):
+    """RedisCartStorage поверх LocalRedis: без сервера Redis, данные живут в процессе."""
+
+    def __init__(self):
+        super().__init__(client=LocalRedis())
+
+
+class CartFlusher:
+    """Запись изменённых корзин из Redis в БД пачками (для RedisCartStorage).
+
+    Пользователь остаётся в carts:dirty, пока его корзина не сохранена:
+    после коммита отметка снимается, только если версия корзины не
+    изменилась с момента чтения (WATCH). Если процесс упал или запись в БД
+    не удалась, корзины будут сохранены следующим проходом.
+    """
+
+    def __init__(self, storage: Optional[RedisCartStorage] = None):
+        self.storage = storage or get_cart_storage()
+
+    def flush(self, limit: Optional[int] = None) -> int:
+        """Один проход: сохраняет до limit корзин, возвращает число сохранённых."""
+        members = self.storage.client.srandmember(RedisCartStorage.DIRTY_KEY,
+                                                  limit or settings.CART_FLUSH_BATCH_SIZE)
+        user_ids = [int(user_id) for user_id in members]
+        if not user_ids:
+            return 0
+        states = {user_id: self.storage.snapshot(user_id) for user_id in user_ids}
+        # Ключи истекли: сохранять нечего
+        versions = {user_id: None for user_id, state in states.items() if state is None}
+        states = {user_id: state for user_id, state in states.items() if state is not None}
+        missing = self.persist(list(states.values()))
+        if missing:
+            self.storage.evict(user_id for user_id, (meta, _) in states.items()
+                               if int(meta[b'cart_id']) in missing)
+        versions.update((user_id, int(meta[b'version'])) for user_id, (meta, _) in states.items()
+                        if int(meta[b'cart_id']) not in missing)
+        self.mark_clean(versions)
+        return len(states) - len(missing)
+
+    def mark_clean(self, versions: Dict[int, Optional[int]]) -> None:
+        """Снимает отметку carts:dirty с сохранённых корзин, версия которых не изменилась."""
+        if not versions:
+            return
+        with self.storage.client.pipeline() as pipe:
+            while True:
+                try:
+                    meta_keys = {user_id: self.storage.keys(user_id)[0] for user_id in versions}
+                    pipe.watch(*meta_keys.values())
+                    clean = []
+                    for user_id, version in versions.items():
+                        current = pipe.hget(meta_keys[user_id], 'version')
+                        if (None if current is None else int(current)) == version:
+                            clean.append(user_id)
+                    if not clean:
+                        return
+                    pipe.multi()
+                    pipe.srem(RedisCartStorage.DIRTY_KEY, *clean)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    @staticmethod
+    def persist(snapshots) -> set:
+        """Приводит позиции, итоги и версии корзин в БД к состоянию из Redis одной транзакцией.
+
+        Возвращает id корзин, которых уже нет в БД (удалены purge_carts): они пропускаются.
+        """
+        if not snapshots:
+            return set()
+        now = timezone.now()
+        with transaction.atomic():
+            cart_ids = {int(meta[b'cart_id']) for meta, _ in snapshots}
+            existing_ids = set(Cart.objects.filter(pk__in=cart_ids).values_list('pk', flat=True))
+            missing = cart_ids - existing_ids
+            if missing:
+                logger.warning(f"Skipped {len(missing)} carts missing in database: {sorted(missing)}")
+
+            wanted = {}
+            versions = {}
+            for meta, items in snapshots:
+                cart_id = int(meta[b'cart_id'])
+                if cart_id in missing:
+                    continue
+                versions[cart_id] = int(meta[b'version'])
+                for item in items:
+                    wanted[(cart_id, item.product_id)] = item
+
+            existing = {(item.cart_id, item.product_id): item
+                        for item in CartItem.objects.filter(cart_id__in=versions)}
+            removed = [item.pk for key, item in existing.items() if key not in wanted]
+            created = [CartItem(cart_id=item.cart_id, product_id=item.product_id, quantity=item.quantity,
+                                price=item.price, product_name=item.product_name)
+                       for key, item in wanted.items() if key not in existing]
+            changed = []
+            for key, item in existing.items():
+                if key in wanted and wanted[key].quantity != item.quantity:
+                    item.quantity, item.updated_at = wanted[key].quantity, now
+                    changed.append(item)
+
+            CartItem.objects.filter(pk__in=removed).delete()
+            CartItem.objects.bulk_create(created)
+            CartItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+            Cart.refresh_totals(list(versions))
+            Cart.objects.filter(pk__in=versions).update(version=Case(
+                *[When(pk=cart_id, then=Value(version)) for cart_id, version in versions.items()],
+                output_field=IntegerField()
+            ))
+        logger.info(f"Flushed {len(versions)} carts: {len(created)} items added, "
+                    f"{len(changed)} updated, {len(removed)} removed")
+        return missing
+
+    def start(self) -> threading.Thread:
+        """Цикл сохранения в фоновом потоке процесса."""
+        thread = threading.Thread(target=self.run, name='cart-flusher', daemon=True)
+        thread.start()
+        logger.info("Cart flusher started in background thread")
+        return thread
+
+    def run(self, interval: Optional[float] = None):
+        """Цикл сохранения; ждёт interval секунд, когда изменённых корзин не осталось."""
+        interval = settings.CART_FLUSH_INTERVAL if interval is None else interval
+        while True:
+            try:
+                flushed = self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing carts: {e}")
+                flushed = 0
+            if flushed < settings.CART_FLUSH_BATCH_SIZE:
+                time.sleep(interval)
+
+
+@lru_cache(maxsize=None)
+def get_cart_storage() -> CartStorage:
+    """Хранилище корзин из настройки CART_STORAGE (создаётся при первом обращении)."""
+    storage = import_string(settings.CART_STORAGE)()
+    if isinstance(storage, RedisCartStorage) and settings.CART_FLUSH_IN_PROCESS:
+        CartFlusher(storage).start()
+    return storage
@@ -1,3 +1,752 @@
-from django.test import TestCase
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop_common.event_backends import InMemoryEventBackend
+from shop_common.event_codec import EVENT_SCHEMA_VERSIONS, decode_event, encode_event
+from shop_common.events import EventConsumer, RetryScheduler, _handlers, dispatch_batch, stream_name
+from shop_common.transport import ETagCache, LocalResponse, get_transport
+from .models import Cart, CartItem, ProcessedEvent
+from .services import ProductService
+from .storage import CartFlusher, get_cart_storage
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class CartQueryCountTests(TestCase):
+    """Число запросов к БД не зависит от количества позиций в корзине."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        transport = get_transport()
+        transport.add_user(self.token, self.user_id, email='user@example.com')
+        for product_id in range(1, 11):
+            transport.add_product(product_id, f'Product {product_id}', '5.00', stock_quantity=100)
+        self.addCleanup(get_transport.cache_clear)
+        self.cart = Cart.objects.create(user_id=self.user_id)
+
+    def fill_cart(self, count):
+        self.cart.items.all().delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product_id=product_id, product_name=f'Product {product_id}',
+                     price=Decimal('5.00'), quantity=2)
+            for product_id in range(1, count + 1)
+        ])
+        Cart.refresh_totals([self.cart.id])
+
+    def get(self, url):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_cart_query_count_is_constant(self):
+        self.fill_cart(1)
+        # корзина, позиции
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(reverse('cart-detail')).status_code, 200)
+
+        self.fill_cart(10)
+        with self.assertNumQueries(2):
+            response = self.get(reverse('cart-detail'))
+        self.assertEqual(response.json()['total_items'], 20)
+        self.assertEqual(Decimal(response.json()['total_amount']), Decimal('100.00'))
+
+    def test_cart_summary_single_query(self):
+        self.fill_cart(10)
+        with self.assertNumQueries(1):
+            response = self.get(reverse('cart-summary'))
+        self.assertEqual(response.json()['items_count'], 10)
+        self.assertEqual(response.json()['total_items'], 20)
+        self.assertEqual(Decimal(response.json()['total_amount']), Decimal('100.00'))
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class CartConditionalGetTests(TestCase):
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+        self.cart = Cart.objects.create(user_id=self.user_id)
+        self.item = CartItem.objects.create(cart=self.cart, product_id=1, product_name='Product 1',
+                                            price=Decimal('5.00'), quantity=1)
+
+    def get(self, params=None, **headers):
+        params = {'exclude': 'items.product_info'} if params is None else params
+        return self.client.get(reverse('cart-detail'), params, HTTP_AUTHORIZATION=f'Bearer {self.token}', **headers)
+
+    def test_matching_etag_returns_304(self):
+        etag = self.get()['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_responses_with_product_info_have_no_validators(self):
+        etag = self.get()['ETag']
+        response = self.get({}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_item_changes_change_etag(self):
+        etag = self.get()['ETag']
+        self.item.quantity = 2
+        self.item.save()
+        changed = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+        self.item.delete()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 200)
+
+
+class ETagTransport:
+    """Сервис, отвечающий 304 на совпадающий If-None-Match."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers.get('If-None-Match'))
+        if headers.get('If-None-Match') == '"v1"':
+            return LocalResponse(304)
+        response = LocalResponse(200, {'id': 1, 'name': 'Product 1'})
+        response.headers = {'ETag': '"v1"'}
+        return response
+
+
+@override_settings(SERVICE_TRANSPORT='apps.cart.tests.ETagTransport')
+class ETagCacheTests(TestCase):
+
+    def setUp(self):
+        get_transport.cache_clear()
+        self.addCleanup(get_transport.cache_clear)
+
+    def test_revalidates_with_stored_etag(self):
+        cache = ETagCache()
+        first = cache.get('http://products/api/products/1/')
+        second = cache.get('http://products/api/products/1/')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(get_transport().requests, [None, '"v1"'])
+
+        second.json()['name'] = 'changed'
+        self.assertEqual(cache.get('http://products/api/products/1/').json()['name'], 'Product 1')
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class CartSparseFieldsetTests(TestCase):
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+        cart = Cart.objects.create(user_id=self.user_id)
+        CartItem.objects.create(cart=cart, product_id=1, product_name='Product 1', price=Decimal('5.00'), quantity=2)
+
+    def get(self, **params):
+        return self.client.get(reverse('cart-detail'), params, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_excluded_product_info_is_not_fetched(self):
+        with mock.patch.object(ProductService, 'get_product') as get_product:
+            response = self.get(fields='total_amount,items.quantity,items.subtotal')
+        get_product.assert_not_called()
+        self.assertEqual(response.json()['items'], [{'id': CartItem.objects.get().id, 'quantity': 2,
+                                                     'subtotal': '10.00'}])
+        self.assertEqual(Decimal(response.json()['total_amount']), Decimal('10.00'))
+
+    def test_fields_without_items_skip_prefetch(self):
+        # валидаторы ETag, корзина
+        with self.assertNumQueries(2):
+            response = self.get(fields='user_id')
+        self.assertEqual(set(response.json()), {'id', 'user_id'})
+
+
+class CartTotalsTests(TestCase):
+    """Итоги корзины обновляются вместе с позициями."""
+
+    def setUp(self):
+        self.cart = Cart.objects.create(user_id=1)
+
+    def totals(self):
+        self.cart.refresh_from_db()
+        return self.cart.total_items, self.cart.total_amount, self.cart.items_count
+
+    def test_item_changes_update_totals(self):
+        item = CartItem.objects.create(cart=self.cart, product_id=1, product_name='Product 1',
+                                       price=Decimal('5.00'), quantity=2)
+        CartItem.objects.create(cart=self.cart, product_id=2, product_name='Product 2',
+                                price=Decimal('1.50'), quantity=1)
+        self.assertEqual(self.totals(), (3, Decimal('11.50'), 2))
+
+        item.quantity = 4
+        item.save()
+        self.assertEqual(self.totals(), (5, Decimal('21.50'), 2))
+
+        item.delete()
+        self.assertEqual(self.totals(), (1, Decimal('1.50'), 1))
+
+        self.cart.clear()
+        self.assertEqual(self.totals(), (0, Decimal('0.00'), 0))
+
+    def test_clear_for_users_resets_totals(self):
+        CartItem.objects.create(cart=self.cart, product_id=1, product_name='Product 1',
+                                price=Decimal('5.00'), quantity=2)
+        Cart.clear_for_users([self.cart.user_id])
+        self.assertEqual(self.totals(), (0, Decimal('0.00'), 0))
+
+    def test_repair_command_fixes_drift(self):
+        CartItem.objects.create(cart=self.cart, product_id=1, product_name='Product 1',
+                                price=Decimal('5.00'), quantity=2)
+        consistent = Cart.objects.create(user_id=2)
+        Cart.objects.filter(pk=self.cart.pk).update(total_items=7, total_amount=Decimal('99.00'))
+
+        out = StringIO()
+        call_command('repair_cart_totals', '--chunk-size=1', stdout=out)
+        self.assertIn('Checked 2 carts, 1 repaired', out.getvalue())
+        self.assertEqual(self.totals(), (2, Decimal('10.00'), 1))
+        consistent.refresh_from_db()
+        self.assertEqual(consistent.total_items, 0)
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class CartVersionTests(TestCase):
+    """Изменения корзины без потери обновлений и с проверкой версии."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        transport = get_transport()
+        transport.add_user(self.token, self.user_id, email='user@example.com')
+        transport.add_product(1, 'Product 1', '5.00', stock_quantity=100)
+        self.addCleanup(get_transport.cache_clear)
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json',
+                                HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def put(self, url, data):
+        return self.client.put(url, data, content_type='application/json',
+                               HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_increment_is_applied_in_database(self):
+        self.post(reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        cart = Cart.objects.get(user_id=self.user_id)
+        # Количество, прочитанное до параллельного добавления, не перезаписывает его
+        CartItem.objects.filter(cart=cart).update(quantity=5)
+        response = self.post(reverse('add-to-cart'), {'product_id': 1, 'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['cart_item']['quantity'], 8)
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_items, cart.version), (8, 2))
+
+    def test_stale_version_returns_conflict_with_current_state(self):
+        self.post(reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        item = CartItem.objects.get()
+        self.assertEqual(self.put(reverse('update-cart-item', args=[item.id]),
+                                  {'quantity': 4, 'version': 1}).status_code, 200)
+
+        response = self.put(reverse('update-cart-item', args=[item.id]), {'quantity': 7, 'version': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 2)
+        self.assertEqual(response.json()['total_items'], 4)
+        self.assertEqual(response.json()['cart_item']['quantity'], 4)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 4)
+
+    def test_stale_version_rolls_back_delete(self):
+        self.post(reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        item = CartItem.objects.get()
+        response = self.client.delete(f"{reverse('remove-cart-item', args=[item.id])}?version=0",
+                                      HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(CartItem.objects.filter(pk=item.pk).exists())
+
+    def test_database_item_ids_are_primary_keys(self):
+        other = Cart.objects.create(user_id=2)
+        other.items.create(product_id=7, product_name='Product 7', price=Decimal('5.00'))
+        cart = Cart.objects.create(user_id=self.user_id)
+        item = cart.items.create(product_id=1, product_name='Product 1', price=Decimal('5.00'), quantity=2)
+        self.assertNotEqual(item.id, item.product_id)
+
+        response = self.client.get(reverse('cart-detail'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual([(row['id'], row['product_id']) for row in response.json()['items']], [(item.id, 1)])
+        response = self.put(reverse('update-cart-item', args=[item.id]), {'quantity': 3})
+        self.assertEqual(response.json()['cart_item']['id'], item.id)
+        self.assertEqual(self.put(reverse('update-cart-item', args=[item.product_id]), {'quantity': 4}).status_code, 404)
+
+    def test_product_routes_do_not_depend_on_storage(self):
+        cart = Cart.objects.create(user_id=self.user_id)
+        cart.items.create(product_id=1, product_name='Product 1', price=Decimal('5.00'), quantity=2)
+
+        for storage in ('apps.cart.storage.DatabaseCartStorage', 'apps.cart.storage.LocalRedisCartStorage'):
+            with self.subTest(storage), override_settings(CART_STORAGE=storage):
+                get_cart_storage.cache_clear()
+                response = self.put(reverse('update-cart-product', args=[1]), {'quantity': 3})
+                self.assertEqual(response.json()['cart_item']['product_id'], 1)
+                self.assertEqual(self.put(reverse('update-cart-product', args=[7]), {'quantity': 3}).status_code, 404)
+        get_cart_storage.cache_clear()
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport',
+                   CART_STORAGE='apps.cart.storage.LocalRedisCartStorage')
+class RedisCartStorageTests(TestCase):
+    """Корзины в Redis (LocalRedis) с отложенной записью в БД."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_cart_storage.cache_clear()
+        transport = get_transport()
+        transport.add_user(self.token, self.user_id, email='user@example.com')
+        for product_id in (1, 2):
+            transport.add_product(product_id, f'Product {product_id}', '5.00', stock_quantity=100)
+        self.addCleanup(get_transport.cache_clear)
+        self.addCleanup(get_cart_storage.cache_clear)
+
+    def request(self, method, url, data=None):
+        return getattr(self.client, method)(url, data, content_type='application/json',
+                                            HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def flush(self):
+        return CartFlusher(get_cart_storage()).flush()
+
+    def test_mutations_stay_in_redis_until_flush(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 3})
+        self.request('post', reverse('add-to-cart'), {'product_id': 2, 'quantity': 1})
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.request('get', reverse('cart-summary'))
+        self.assertEqual(response.json(), {'total_items': 6, 'total_amount': '30.00', 'items_count': 2,
+                                           'version': 3})
+
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.flush(), 0)
+        cart = Cart.objects.get(user_id=self.user_id)
+        self.assertEqual(dict(cart.items.values_list('product_id', 'quantity')), {1: 5, 2: 1})
+        self.assertEqual((cart.total_items, cart.total_amount, cart.version), (6, Decimal('30.00'), 3))
+
+        self.request('delete', reverse('remove-cart-item', args=[2]))
+        self.request('put', reverse('update-cart-item', args=[1]), {'quantity': 4})
+        self.flush()
+        self.assertEqual(dict(cart.items.values_list('product_id', 'quantity')), {1: 4})
+
+    def test_cold_cart_is_loaded_from_database(self):
+        cart = Cart.objects.create(user_id=self.user_id)
+        CartItem.objects.create(cart=cart, product_id=1, product_name='Product 1', price=Decimal('5.00'), quantity=2)
+
+        response = self.request('get', reverse('cart-detail'))
+        self.assertEqual(response.json()['id'], cart.id)
+        self.assertEqual([(item['id'], item['quantity']) for item in response.json()['items']], [(1, 2)])
+        self.assertEqual(response.json()['version'], 1)
+
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 1})
+        # Повторная загрузка из БД не перезаписывает горячую корзину
+        get_cart_storage().load(self.user_id)
+        self.assertEqual(get_cart_storage().item_quantity(self.user_id, 1), 3)
+
+    def test_stale_version_and_clear(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        response = self.request('put', reverse('update-cart-item', args=[1]), {'quantity': 5, 'version': 0})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(response.json()['cart_item']['quantity'], 2)
+
+        self.request('post', reverse('add-to-cart'), {'product_id': 2, 'quantity': 1})
+        self.flush()
+        get_cart_storage().clear_for_users([self.user_id])
+        self.assertFalse(CartItem.objects.exists())
+        self.flush()
+        self.assertEqual(self.request('get', reverse('cart-summary')).json()['items_count'], 0)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_deleted_in_database_is_evicted_on_flush(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        self.flush()
+        self.request('post', reverse('add-to-cart'), {'product_id': 2, 'quantity': 1})
+        Cart.objects.filter(user_id=self.user_id).delete()
+
+        self.assertEqual(self.flush(), 0)
+        self.assertFalse(Cart.objects.exists())
+        self.assertIsNone(get_cart_storage().load(self.user_id, create=False))
+        self.assertIsNone(self.request('get', reverse('cart-detail')).json()['id'])
+
+    def test_failed_flush_keeps_carts_dirty(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        with mock.patch.object(CartFlusher, 'persist', side_effect=RuntimeError('database is down')):
+            with self.assertRaises(RuntimeError):
+                self.flush()
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_change_during_flush_is_saved_by_next_pass(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        persist = CartFlusher.persist
+
+        def persist_with_concurrent_change(snapshots):
+            missing = persist(snapshots)
+            self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 1})
+            return missing
+
+        with mock.patch.object(CartFlusher, 'persist', side_effect=persist_with_concurrent_change):
+            self.assertEqual(self.flush(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+        self.assertEqual(self.flush(), 0)
+
+    def test_purge_skips_carts_live_in_redis(self):
+        self.request('post', reverse('add-to-cart'), {'product_id': 1, 'quantity': 2})
+        Cart.objects.create(user_id=2)
+        Cart.objects.update(updated_at=timezone.now() - timedelta(days=91))
+
+        out = StringIO()
+        call_command('purge_carts', stdout=out)
+        self.assertIn('Deleted 1 carts and 0 items', out.getvalue())
+        self.assertEqual(list(Cart.objects.values_list('user_id', flat=True)), [self.user_id])
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class CartPurgeTests(TestCase):
+    """Чтение не создаёт корзин, брошенные корзины удаляются purge_carts."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+
+    def cart(self, user_id, items=0, age=timedelta()):
+        cart = Cart.objects.create(user_id=user_id)
+        for product_id in range(1, items + 1):
+            CartItem.objects.create(cart=cart, product_id=product_id, product_name=f'Product {product_id}',
+                                    price=Decimal('5.00'), quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - age)
+        return cart
+
+    def test_read_does_not_create_cart(self):
+        response = self.client.get(reverse('cart-detail'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['id'], response.json()['items'], response.json()['total_items']),
+                         (None, [], 0))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_purge_deletes_empty_and_stale_carts(self):
+        self.cart(1, age=timedelta(days=2))
+        self.cart(2, items=2, age=timedelta(days=91))
+        self.cart(3)
+        self.cart(4, items=1, age=timedelta(days=30))
+
+        out = StringIO()
+        call_command('purge_carts', '--dry-run', stdout=out)
+        self.assertIn('2 abandoned carts would be deleted', out.getvalue())
+
+        out = StringIO()
+        call_command('purge_carts', '--chunk-size=1', stdout=out)
+        self.assertIn('Deleted 2 carts and 2 items', out.getvalue())
+        self.assertEqual(set(Cart.objects.values_list('user_id', flat=True)), {3, 4})
+        self.assertEqual(CartItem.objects.count(), 1)
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class BulkCartTests(TestCase):
+    """Пакетные операции с корзиной: одна проверка товаров и одна транзакция."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_cart_storage.cache_clear()
+        transport = get_transport()
+        transport.add_user(self.token, self.user_id, email='user@example.com')
+        for product_id in range(1, 21):
+            transport.add_product(product_id, f'Product {product_id}', '5.00', stock_quantity=10)
+        transport.add_product(21, 'Inactive', '5.00', stock_quantity=10, is_active=False)
+        self.addCleanup(get_transport.cache_clear)
+        self.addCleanup(get_cart_storage.cache_clear)
+
+    def bulk(self, operations, **data):
+        return self.client.post(reverse('cart-bulk'), {'operations': operations, **data},
+                                content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_reorder_is_one_request_with_one_product_lookup(self):
+        with mock.patch.object(ProductService, 'check_availability_batch',
+                               wraps=ProductService.check_availability_batch) as batch, \
+                mock.patch.object(ProductService, 'get_product') as get_product:
+            response = self.bulk([{'op': 'add', 'product_id': product_id, 'quantity': 2}
+                                  for product_id in range(1, 21)])
+        self.assertEqual(response.status_code, 200)
+        # проверка операций и product_info позиций ответа
+        self.assertEqual(batch.call_count, 2)
+        get_product.assert_not_called()
+        self.assertEqual((response.json()['total_items'], response.json()['version']), (40, 1))
+        self.assertEqual(response.json()['items'][0]['product_info']['current_price'], '5.00')
+
+    def test_operations_fold_per_product(self):
+        self.bulk([{'op': 'add', 'product_id': 1}, {'op': 'add', 'product_id': 2, 'quantity': 3}])
+        response = self.bulk([
+            {'op': 'add', 'product_id': 1, 'quantity': 2},
+            {'op': 'update', 'product_id': 2, 'quantity': 5},
+            {'op': 'add', 'product_id': 2},
+            {'op': 'add', 'product_id': 3},
+            {'op': 'remove', 'product_id': 3},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item['product_id']: item['quantity'] for item in response.json()['items']}, {1: 3, 2: 6})
+        cart = Cart.objects.get(user_id=self.user_id)
+        self.assertEqual((cart.total_items, cart.items_count), (9, 2))
+
+    def test_any_error_rejects_all_operations(self):
+        response = self.bulk([
+            {'op': 'add', 'product_id': 1},
+            {'op': 'add', 'product_id': 2, 'quantity': 11},
+            {'op': 'add', 'product_id': 21},
+            {'op': 'remove', 'product_id': 4},
+            {'op': 'add', 'product_id': 99},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['index'], error['detail']) for error in response.json()['errors']], [
+            (1, 'Product not available in requested quantity.'),
+            (2, 'Product is not active.'),
+            (3, 'Product is not in the cart.'),
+            (4, 'Product does not exist.'),
+        ])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_stale_version_conflicts(self):
+        self.bulk([{'op': 'add', 'product_id': 1}])
+        response = self.bulk([{'op': 'add', 'product_id': 2}], version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['items_count'], 1)
+
+    @override_settings(CART_STORAGE='apps.cart.storage.LocalRedisCartStorage')
+    def test_redis_storage_applies_in_one_transaction(self):
+        get_cart_storage.cache_clear()
+        self.bulk([{'op': 'add', 'product_id': 1}, {'op': 'add', 'product_id': 2}])
+        response = self.bulk([{'op': 'add', 'product_id': 1, 'quantity': 2}, {'op': 'remove', 'product_id': 2}])
+        self.assertEqual({item['id']: item['quantity'] for item in response.json()['items']}, {1: 3})
+        self.assertEqual(response.json()['version'], 2)
+        CartFlusher(get_cart_storage()).flush()
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(1, 3)])
+
+
+class EventConsumerTests(TestCase):
+    def setUp(self):
+        from . import event_handlers  # noqa: F401 - регистрация обработчиков
+
+        self.backend = InMemoryEventBackend()
+        self.stream = stream_name('order.created')
+        Cart.objects.create(user_id=1).items.create(product_id=1, product_name='Product 1', price=Decimal('10.00'))
+
+    def publish(self, event_type, data):
+        event = {'id': uuid.uuid4().hex, 'type': event_type, 'version': EVENT_SCHEMA_VERSIONS[event_type], 'data': data}
+        self.backend.append(stream_name(event_type), {'payload': encode_event(event)})
+        return event
+
+    @override_settings(EVENT_CLAIM_IDLE_MS=0)
+    def test_stale_pending_events_are_reclaimed(self):
+        dead = EventConsumer(self.backend)
+        dead.ensure_groups()
+        self.publish('order.created', {'user_id': 1})
+        # Потребитель получил событие и упал до подтверждения
+        dead.backend.read_group(dead.group, 'dead-consumer', [self.stream], count=10, block_ms=0)
+        self.assertTrue(CartItem.objects.exists())
+
+        EventConsumer(self.backend).reclaim_stale()
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.backend.claim_stale(self.stream, dead.group, 'other', 0, 10), [])
+
+    def test_recently_delivered_events_are_not_reclaimed(self):
+        consumer = EventConsumer(self.backend)
+        consumer.ensure_groups()
+        self.publish('order.created', {'user_id': 1})
+        consumer.backend.read_group(consumer.group, 'busy-consumer', [self.stream], count=10, block_ms=0)
+
+        consumer.reclaim_stale()
+        self.assertTrue(CartItem.objects.exists())
+
+    def test_run_event_consumer_discovers_handlers(self):
+        out = StringIO()
+        with mock.patch('shop_common.events.EventConsumer.run') as run:
+            call_command('run_event_consumer', stdout=out)
+        run.assert_called_once_with()
+        self.assertIn(self.stream, out.getvalue())
+
+
+@override_settings(EVENT_RETRY_BASE_DELAY=0, EVENT_RETRY_MAX_ATTEMPTS=3)
+class EventRetryTests(TestCase):
+    def setUp(self):
+        self.backend = InMemoryEventBackend()
+        self.consumer = EventConsumer(self.backend)
+        self.retries = RetryScheduler(self.backend)
+        self.handler = mock.Mock()
+        patcher = mock.patch.dict(_handlers, {'order.created': [self.handler]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.payload = encode_event({'id': uuid.uuid4().hex, 'type': 'order.created',
+                                     'version': EVENT_SCHEMA_VERSIONS['order.created'], 'data': {'user_id': 1}})
+
+    def test_redelivered_event_is_applied_once(self):
+        self.consumer.handle_messages([(self.payload, 0)])
+        self.consumer.handle_messages([(self.payload, 0)])
+        self.handler.assert_called_once_with([{'user_id': 1}])
+        self.assertEqual(ProcessedEvent.objects.count(), 1)
+
+    def test_failing_handler_is_rescheduled_with_next_attempt(self):
+        self.handler.side_effect = ValueError('boom')
+        self.consumer.handle_messages([(self.payload, 1)])
+        self.assertEqual(self.retries.claim_due(10), [(self.payload, 2)])
+        # Откат транзакции не оставляет событие в журнале - повтор его применит
+        self.assertFalse(ProcessedEvent.objects.exists())
+
+    def test_event_is_dead_lettered_after_max_attempts(self):
+        self.handler.side_effect = ValueError('boom')
+        self.consumer.handle_messages([(self.payload, 2)])
+        self.assertEqual(self.retries.claim_due(10), [])
+        [(_, fields)] = self.retries.dead_letters()
+        self.assertEqual(fields['payload'], self.payload)
+        self.assertEqual(fields['attempts'], b'3')
+        self.assertEqual(fields['error'], b'ValueError: boom')
+
+    def test_event_deadletters_replays_into_retry_queue(self):
+        self.retries.dead_letter(self.payload, 3, 'ValueError: boom')
+        out = StringIO()
+        with mock.patch('shop_common.management.commands.event_deadletters.get_event_backend',
+                        return_value=self.backend):
+            call_command('event_deadletters', 'replay', stdout=out)
+        self.assertIn('Replayed 1 events', out.getvalue())
+        self.assertEqual(self.retries.dead_letters(), [])
+
+        due = self.retries.claim_due(10)
+        self.assertEqual(due, [(self.payload, 0)])
+        self.consumer.handle_retries(due)
+        self.handler.assert_called_once_with([{'user_id': 1}])
+
+    @override_settings(EVENT_CLAIM_IDLE_MS=60000)
+    def test_claimed_retry_survives_consumer_crash(self):
+        self.retries.schedule(self.payload, 1, 'ValueError: boom')
+        due_at = time.time() + settings.EVENT_RETRY_MAX_DELAY
+
+        def claim_at(now):
+            with mock.patch('shop_common.events.time.time', return_value=now):
+                return self.retries.claim_due(10)
+
+        self.assertEqual(claim_at(due_at), [(self.payload, 1)])
+        # Взятый повтор не выдаётся другим потребителям...
+        self.assertEqual(claim_at(due_at + 59), [])
+        # ...но возвращается, если взявший упал, не завершив его
+        due = claim_at(due_at + 61)
+        self.assertEqual(due, [(self.payload, 1)])
+        self.consumer.handle_retries(due)
+        self.assertEqual(claim_at(due_at + 3600), [])
+        self.handler.assert_called_once_with([{'user_id': 1}])
+
+
+def make_event(event_type, data):
+    return {'id': uuid.uuid4().hex, 'type': event_type, 'version': EVENT_SCHEMA_VERSIONS[event_type], 'data': data}
+
+
+@override_settings(EVENT_RETRY_BASE_DELAY=0)
+class DispatchBatchTests(TestCase):
+    def setUp(self):
+        self.committed = []
+        self.failing_users = {2}
+        patcher = mock.patch.dict(_handlers, {
+            'order.created': [self.record('created')],
+            'order.cancelled': [self.record('cancelled')],
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, event_type):
+        def handler(events):
+            user_ids = [data['user_id'] for data in events]
+            if self.failing_users.intersection(user_ids):
+                raise ValueError('boom')
+            transaction.on_commit(lambda: self.committed.extend((event_type, user_id) for user_id in user_ids))
+        return handler
+
+    def test_one_transaction_and_handler_call_per_event_type(self):
+        events = [make_event('order.created', {'user_id': 1}), make_event('order.cancelled', {'user_id': 3}),
+                  make_event('order.created', {'user_id': 4})]
+        with mock.patch('shop_common.events.transaction') as events_transaction, \
+                self.captureOnCommitCallbacks(execute=True):
+            events_transaction.atomic.side_effect = transaction.atomic
+            dispatch_batch(events)
+        self.assertEqual(events_transaction.atomic.call_count, 2)
+        self.assertEqual(self.committed, [('created', 1), ('created', 4), ('cancelled', 3)])
+
+    def test_failing_event_does_not_commit_siblings_twice(self):
+        consumer = EventConsumer(InMemoryEventBackend())
+        events = [make_event('order.created', {'user_id': user_id}) for user_id in (1, 2, 3)]
+        messages = [(encode_event(event), 0) for event in events]
+        with self.captureOnCommitCallbacks(execute=True):
+            consumer.handle_messages(messages)
+        self.assertEqual(self.committed, [('created', 1), ('created', 3)])
+
+        # Повтор упавшего события и повторная доставка всей пачки
+        self.failing_users = set()
+        with self.captureOnCommitCallbacks(execute=True):
+            consumer.handle_retries(consumer.retries.claim_due(10))
+            consumer.handle_messages(messages)
+        self.assertEqual(self.committed, [('created', 1), ('created', 3), ('created', 2)])
+        self.assertEqual(ProcessedEvent.objects.count(), 3)
+
+
+class ClearCartsHandlerTests(TestCase):
+    def test_batch_clears_each_users_cart(self):
+        from .event_handlers import clear_carts_on_order_created
+
+        for user_id in (1, 2, 3):
+            Cart.objects.create(user_id=user_id).items.create(
+                product_id=1, product_name='Product 1', price=Decimal('10.00'))
+        clear_carts_on_order_created([{'user_id': 1}, {'user_id': 2}, {'user_id': 1}])
+        self.assertEqual(list(CartItem.objects.values_list('cart__user_id', flat=True)), [3])
+
+
+class EventCodecTests(TestCase):
+    event = make_event('order.created', {'user_id': 1, 'total_amount': Decimal('19.90'), 'items': [{'product_id': 1}]})
+
+    def test_round_trip_in_each_format(self):
+        for codec_name, header in (('json', b'\x01'), ('msgpack', b'\x02')):
+            with self.subTest(codec_name):
+                payload = encode_event(self.event, codec_name)
+                self.assertEqual(payload[:1], header)
+                decoded = decode_event(payload)
+                self.assertEqual(decoded, self.event)
+                self.assertIsInstance(decoded['data']['total_amount'], Decimal)
+
+    def test_unknown_header_raises(self):
+        with self.assertRaisesMessage(ValueError, "Unsupported event codec header b'\\x7f'"):
+            decode_event(b'\x7f' + encode_event(self.event, 'json')[1:])
+
+    def test_newer_schema_version_raises(self):
+        with self.assertRaisesMessage(ValueError, 'Unsupported schema version 99 for event order.created'):
+            decode_event(encode_event(dict(self.event, version=99)))
+
+    def test_legacy_json_without_header_decodes(self):
+        payload = b'{"type": "order.created", "data": {"user_id": 1}}'
+        self.assertEqual(decode_event(payload), {'type': 'order.created', 'data': {'user_id': 1}, 'version': 0})
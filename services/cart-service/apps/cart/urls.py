@@ -6,6 +6,10 @@ urlpatterns = [
     path('cart/add/', views.add_to_cart, name='add-to-cart'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update-cart-item'),
     path('cart/remove/<int:item_id>/', views.remove_cart_item, name='remove-cart-item'),
+    # Позиция по товару: одинаково при любом CART_STORAGE
+    path('cart/products/<int:product_id>/update/', views.update_cart_item, name='update-cart-product'),
+    path('cart/products/<int:product_id>/remove/', views.remove_cart_item, name='remove-cart-product'),
     path('cart/clear/', views.clear_cart, name='clear-cart'),
+    path('cart/bulk/', views.bulk_update_cart, name='cart-bulk'),
     path('cart/summary/', views.cart_summary, name='cart-summary'),
 ]
\ No newline at end of file
@@ -4,10 +4,14 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer, AddToCartSerializer, UpdateCartItemSerializer
+from django.http import Http404
+from django.views.decorators.http import condition
+from shop_common.fieldsets import SparseFieldsetViewMixin
+from .models import Cart, CartItem, CartVersionConflict
+from .serializers import (CartSerializer, CartItemSerializer, AddToCartSerializer, UpdateCartItemSerializer,
+                          CartVersionSerializer, BulkCartSerializer)
 from .services import ProductService
+from .storage import get_cart_storage
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,17 +20,68 @@ class IsAuthenticatedCustom:
     def has_permission(self, request, view):
         return hasattr(request, 'user_id') and request.user_id is not None
 
-class CartView(generics.RetrieveAPIView):
-    """Представление для получения корзины пользователя."""
+def cart_validators(request):
+    """Слабый ETag и Last-Modified корзины по updated_at без загрузки позиций."""
+    if not hasattr(request, 'cart_validators'):
+        etag, last_modified = get_cart_storage().validators(request.user_id)
+        request.cart_validators = (etag and f'W/"{etag}"', last_modified)
+    return request.cart_validators
+
+
+cart_condition = condition(etag_func=lambda request, *args, **kwargs: cart_validators(request)[0],
+                           last_modified_func=lambda request, *args, **kwargs: cart_validators(request)[1])
+
+
+def get_cart_item(request, item_id=None, product_id=None):
+    """Позиция по id из cart/update|remove/<item_id>/ или по товару из cart/products/<product_id>/."""
+    try:
+        if product_id is not None:
+            return get_cart_storage().get_product_item(request.user_id, product_id)
+        return get_cart_storage().get_item(request.user_id, item_id)
+    except CartItem.DoesNotExist:
+        raise Http404
+
+
+class CartView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
+    """Представление для получения корзины пользователя.
+
+    Валидаторы (ETag, Last-Modified) отдаются только ответам без product_info:
+    сведения о товарах меняются в product-service без изменения корзины,
+    и 304 по updated_at вернул бы устаревшие цены и остатки.
+    """
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticatedCustom]
+    queryset = Cart.objects.with_items()
+
+    def includes_product_info(self):
+        items = self.get_serializer().fields.get('items')
+        return items is not None and 'product_info' in items.child.fields
+
+    def get(self, request, *args, **kwargs):
+        if self.includes_product_info():
+            return super().get(request, *args, **kwargs)
+        return cart_condition(super().get)(request, *args, **kwargs)
 
     def get_object(self):
         logging.info("Fetching cart for user_id: %s", self.request.user_id)
-        cart, created = Cart.objects.get_or_create(user_id=self.request.user_id)
-        if created :
-            logging.info("Created new cart for user_id: %s", self.request.user_id)
-        return cart
+        # Чтение не создаёт корзину: пока в неё ничего не добавили, отдаётся пустая
+        return get_cart_storage().get_cart(self.request.user_id, self.filter_queryset(self.get_queryset()),
+                                           create=False)
+
+
+def version_conflict(user_id, **item_lookup):
+    """409 с текущей версией, итогами корзины и позицией, которую пытались изменить."""
+    cart = get_cart_storage().get_cart(user_id)
+    cart_item = next((item for item in cart.items.all()
+                      if item_lookup and all(getattr(item, name) == value for name, value in item_lookup.items())), None)
+    return Response({
+        'detail': 'Cart was modified by another request.',
+        'version': cart.version,
+        'total_items': cart.total_items,
+        'total_amount': cart.total_amount,
+        'items_count': cart.items_count,
+        'cart_item': CartItemSerializer(cart_item).data if cart_item is not None else None,
+    }, status=status.HTTP_409_CONFLICT)
 
 
 @api_view(['POST'])
@@ -39,13 +94,11 @@ def add_to_cart(request):
     if serializer.is_valid():
         product_id = serializer.validated_data['product_id']
         quantity = serializer.validated_data['quantity']
+        storage = get_cart_storage()
 
-        #получаем корзину пользователя
-        cart, create = Cart.objects.get_or_create(user_id=request.user_id)
-        logger.info("Cart fetched/created for user_id: %s", request.user_id)
-
-        #проверяем наличие продукта
-        if not ProductService.check_availability(product_id, quantity):
+        #проверяем наличие продукта с учётом того, что уже лежит в корзине
+        in_cart = storage.item_quantity(request.user_id, product_id)
+        if not ProductService.check_availability(product_id, (in_cart or 0) + quantity):
             logger.warning("Product %s not available in requested quantity %s", product_id, quantity)
             return Response({'detail': 'Product not available in requested quantity.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -54,27 +107,21 @@ def add_to_cart(request):
             logger.error("Product %s not found in ProductService", product_id)
             return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        #Добавляем или обновляем товар в корзине
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product_id=product_id,
-            defaults={
-                'product_name': product_data['name'],
-                'price': product_data['price'],
-                'quantity': quantity
-            }
-        )
-
-        if not created:
-            new_quantity = cart_item.quantity + quantity
-            if not ProductService.check_availability(product_id, new_quantity):
-                logger.warning("Product %s not available for updated quantity %s", product_id, new_quantity)
-                return Response({'detail': 'Product not available in requested quantity.'}, status=status.HTTP_400_BAD_REQUEST)
-            cart_item.quantity = new_quantity
-            cart_item.save()
-            logger.info("Updated quantity for product %s in cart", product_id)
-        else:
+        #Добавляем товар или увеличиваем количество атомарно
+        try:
+            cart_item, created = storage.add_item(
+                request.user_id, product_id, quantity,
+                defaults={'product_name': product_data['name'], 'price': product_data['price']},
+                expected_version=serializer.validated_data.get('version'),
+            )
+        except CartVersionConflict:
+            logger.info("Cart version conflict on add for user_id: %s", request.user_id)
+            return version_conflict(request.user_id, product_id=product_id)
+
+        if created:
             logger.info("Added product %s to cart", product_id)
+        else:
+            logger.info("Updated quantity for product %s in cart", product_id)
 
         return Response({
             'message': 'Product added to cart successfully.',
@@ -88,9 +135,9 @@ def add_to_cart(request):
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticatedCustom])
-def update_cart_item(request, item_id):
+def update_cart_item(request, item_id=None, product_id=None):
     """Представление для обновления количества товара в корзине."""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user_id=request.user_id)
+    cart_item = get_cart_item(request, item_id, product_id)
     serializer = UpdateCartItemSerializer(data=request.data)
     if serializer.is_valid():
         new_quantity = serializer.validated_data['quantity']
@@ -98,8 +145,13 @@ def update_cart_item(request, item_id):
         if not ProductService.check_availability(cart_item.product_id, new_quantity):
             return Response({'detail': 'Product not available in requested quantity.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item.quantity = new_quantity
-        cart_item.save()
+        try:
+            get_cart_storage().set_quantity(request.user_id, cart_item, new_quantity,
+                                            expected_version=serializer.validated_data.get('version'))
+        except CartVersionConflict:
+            return version_conflict(request.user_id, product_id=cart_item.product_id)
+        except CartItem.DoesNotExist:
+            raise Http404
 
         return Response({
             'message': 'Cart item updated successfully.',
@@ -111,36 +163,110 @@ def update_cart_item(request, item_id):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticatedCustom])
-def remove_cart_item(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user_id=request.user_id)
-    cart_item.delete()
+def remove_cart_item(request, item_id=None, product_id=None):
+    cart_item = get_cart_item(request, item_id, product_id)
+    serializer = CartVersionSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    try:
+        get_cart_storage().remove_item(request.user_id, cart_item,
+                                       expected_version=serializer.validated_data.get('version'))
+    except CartVersionConflict:
+        return version_conflict(request.user_id, product_id=cart_item.product_id)
+    except CartItem.DoesNotExist:
+        raise Http404
     return Response({'message': 'Cart item deleted successfully.'}, status=status.HTTP_200_OK)
 
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticatedCustom])
 def clear_cart(request):
+    serializer = CartVersionSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
     try:
-        cart = Cart.objects.get(user_id=request.user_id)
-        cart.clear()
-        return Response({'message': 'Cart cleared successfully.'}, status=status.HTTP_200_OK)
-    except Cart.DoesNotExist:
+        cleared = get_cart_storage().clear(request.user_id, expected_version=serializer.validated_data.get('version'))
+    except CartVersionConflict:
+        return version_conflict(request.user_id)
+    if not cleared:
         return Response({'detail': 'Cart not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'message': 'Cart cleared successfully.'}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticatedCustom])
+def bulk_update_cart(request):
+    """Несколько операций add/update/remove одним запросом.
+
+    Операции выполняются по порядку и сворачиваются в одно изменение на товар.
+    Товары проверяются одним запросом к product-service, изменения применяются
+    одной транзакцией: при любой ошибке не применяется ни одна операция.
+    Ответ - корзина после изменений.
+    """
+    serializer = BulkCartSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    storage = get_cart_storage()
+    quantities = {item.product_id: item.quantity for item in storage.get_cart(request.user_id, create=False).items.all()}
+
+    # product_id -> ('add', n) или ('set', n), как в Cart.apply_changes
+    changes, errors = {}, []
+    first_index, added = {}, set()
+    for index, operation in enumerate(serializer.validated_data['operations']):
+        product_id, quantity = operation['product_id'], operation.get('quantity', 0)
+        first_index.setdefault(product_id, index)
+        if operation['op'] == 'add':
+            kind, current = changes.get(product_id, ('add', 0))
+            changes[product_id] = (kind, current + quantity)
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            added.add(product_id)
+        elif not quantities.get(product_id):
+            errors.append({'index': index, 'product_id': product_id, 'detail': 'Product is not in the cart.'})
+        else:
+            changes[product_id] = ('set', quantity)
+            quantities[product_id] = quantity
+
+    requested = {product_id: quantities[product_id] for product_id in changes if quantities[product_id]}
+    products = ProductService.check_availability_batch(requested) if requested else {}
+    if products is None:
+        return Response({'detail': 'Product service is unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    for product_id in requested:
+        product = products.get(product_id)
+        if product is None:
+            detail = 'Product does not exist.'
+        elif product_id in added and not product['is_active']:
+            detail = 'Product is not active.'
+        elif not product['available']:
+            detail = 'Product not available in requested quantity.'
+        else:
+            continue
+        errors.append({'index': first_index[product_id], 'product_id': product_id, 'detail': detail})
+    if errors:
+        return Response({'errors': sorted(errors, key=lambda error: error['index'])},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    defaults = {product_id: {'product_name': product['name'], 'price': product['price']}
+                for product_id, product in products.items()}
+    try:
+        storage.apply_changes(request.user_id, changes, defaults,
+                              expected_version=serializer.validated_data.get('version'))
+    except CartVersionConflict:
+        logger.info("Cart version conflict on bulk update for user_id: %s", request.user_id)
+        return version_conflict(request.user_id)
+
+    logger.info("Applied %s cart operations for user_id: %s", len(serializer.validated_data['operations']),
+                request.user_id)
+    cart = storage.get_cart(request.user_id)
+    return Response(CartSerializer(cart, context={'request': request}).data, status=status.HTTP_200_OK)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticatedCustom])
 def cart_summary(request):
     """Представление для получения сводки корзины пользователя."""
-    try:
-        cart = Cart.objects.get(user_id=request.user_id)
-        return Response({
-            'total_items': cart.total_items,
-            'total_amount': cart.total_amount,
-            'items_count': cart.items.count()
-        })
-    except Cart.DoesNotExist:
+    summary = get_cart_storage().summary(request.user_id)
+    if summary is None:
         return Response({
             'total_items': 0,
             'total_amount': 0,
-            'items_count': 0
-        })
\ No newline at end of file
+            'items_count': 0,
+            'version': 0
+        })
+    return Response(summary)
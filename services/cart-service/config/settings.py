@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -22,6 +23,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'shop_common',
     'apps.cart',
 ]
 
@@ -68,8 +70,14 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson: быстрее стандартного JSONRenderer, Decimal выводится строкой без потерь
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shop_common.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'shop_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -91,10 +99,52 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Service URLs
+# Транспорт клиентов сервисов: shop_common.transport.HttpTransport или LocalServiceTransport
+SERVICE_TRANSPORT = 'shop_common.transport.HttpTransport'
 PRODUCT_SERVICE_URL = 'http://localhost:8001'
 USER_SERVICE_URL = 'http://localhost:8004'
 
 # Redis settings
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
-REDIS_DB = 0
\ No newline at end of file
+REDIS_DB = 0
+
+# Шина событий: отдельный поток на каждый тип события.
+# Хранилище: shop_common.event_backends.RedisEventBackend или InMemoryEventBackend
+EVENT_BACKEND = 'shop_common.event_backends.RedisEventBackend'
+EVENT_STREAM_PREFIX = 'events'
+EVENT_CONSUMER_GROUP = 'cart-service'
+EVENT_BATCH_SIZE = 100
+# Короткое ожидание, чтобы вовремя забирать наступившие повторы
+EVENT_BLOCK_MS = 1000
+# Записи, не подтверждённые дольше EVENT_CLAIM_IDLE_MS (упавший потребитель),
+# забираются живым потребителем группы раз в EVENT_CLAIM_INTERVAL секунд;
+# через то же время снова наступают взятые, но не завершённые повторы
+EVENT_CLAIM_IDLE_MS = 60000
+EVENT_CLAIM_INTERVAL = 30
+# Журнал обработанных событий (дедупликация повторной доставки)
+EVENT_LEDGER_MODEL = 'cart.ProcessedEvent'
+# Журнал обработанных событий: срок хранения должен превышать окно повторной доставки
+EVENT_LEDGER_RETENTION = timedelta(days=7)
+EVENT_LEDGER_PURGE_INTERVAL = 3600
+# Повторы с экспоненциальной задержкой, затем поток недоставленных событий
+EVENT_RETRY_MAX_ATTEMPTS = 5
+EVENT_RETRY_BASE_DELAY = 2
+EVENT_RETRY_MAX_DELAY = 300
+EVENT_DEAD_LETTER_MAXLEN = 10000
+
+# Хранилище корзин: apps.cart.storage.DatabaseCartStorage (таблицы Cart/CartItem),
+# RedisCartStorage (горячие корзины в хешах Redis, запись в БД пачками командой flush_carts)
+# или LocalRedisCartStorage (то же в памяти процесса, без Redis)
+CART_STORAGE = 'apps.cart.storage.DatabaseCartStorage'
+# Корзина без изменений дольше этого срока выгружается из Redis и загружается из БД при обращении
+CART_REDIS_TTL = 7 * 24 * 3600
+CART_FLUSH_BATCH_SIZE = 500
+CART_FLUSH_INTERVAL = 1
+# Сохранение в фоновом потоке процесса вместо отдельного flush_carts
+# (для LocalRedisCartStorage, данные которого другим процессам не видны)
+CART_FLUSH_IN_PROCESS = False
+# Брошенные корзины, которые удаляет purge_carts: пустые и без изменений дольше срока
+CART_EMPTY_RETENTION = timedelta(days=1)
+CART_STALE_RETENTION = timedelta(days=90)
+CART_PURGE_CHUNK_SIZE = 500
@@ -0,0 +1,7 @@
+"""Общая инфраструктура сервисов магазина.
+
+Шина событий (events, event_backends, event_codec), транспорт вызовов
+других сервисов (transport), помощники DRF (fieldsets, flat, pagination,
+renderers) и проверка планов запросов (query_plans). Подключается в
+INSTALLED_APPS как приложение shop_common ради общих команд управления.
+"""
@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+
+class ShopCommonConfig(AppConfig):
+    name = "shop_common"
+    verbose_name = "Shop common"
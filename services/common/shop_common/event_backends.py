@@ -0,0 +1,260 @@
+import time
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Запись потока: (идентификатор, поля); значения полей - bytes
+StreamEntry = Tuple[str, Dict[str, bytes]]
+
+
+class EventBackend:
+    """Интерфейс хранилища шины событий: потоки с группами потребителей и отложенные очереди.
+
+    Имена потоков, ключи полей и идентификаторы записей - строки, значения полей - bytes.
+    """
+
+    def append(self, stream: str, fields: Dict[str, object], maxlen: Optional[int] = None) -> str:
+        """Добавление записи в поток."""
+        raise NotImplementedError
+
+    def create_group(self, stream: str, group: str) -> None:
+        """Создание группы потребителей, читающей только новые записи."""
+        raise NotImplementedError
+
+    def read_group(self, group: str, consumer: str, streams: List[str],
+                   count: int, block_ms: int) -> List[Tuple[str, List[StreamEntry]]]:
+        """Чтение новых записей для группы с ожиданием до block_ms."""
+        raise NotImplementedError
+
+    def ack(self, stream: str, group: str, *entry_ids: str) -> None:
+        """Подтверждение обработки записей."""
+        raise NotImplementedError
+
+    def claim_stale(self, stream: str, group: str, consumer: str,
+                    min_idle_ms: int, count: int) -> List[StreamEntry]:
+        """Передача consumer записей, выданных группе и не подтверждённых дольше min_idle_ms."""
+        raise NotImplementedError
+
+    def range(self, stream: str, start: str = '-', end: str = '+',
+              count: Optional[int] = None) -> List[StreamEntry]:
+        """Записи потока в диапазоне идентификаторов."""
+        raise NotImplementedError
+
+    def delete(self, stream: str, *entry_ids: str) -> None:
+        """Удаление записей из потока."""
+        raise NotImplementedError
+
+    def schedule(self, key: str, member: bytes, score: float) -> None:
+        """Добавление элемента в отложенную очередь."""
+        raise NotImplementedError
+
+    def claim_due(self, key: str, max_score: float, limit: int, score: float) -> List[bytes]:
+        """Элементы со score не больше max_score, атомарно перенесённые на score.
+
+        Элемент остаётся в очереди: другие потребители получат его только
+        после score, если взявший его не удалит элемент раньше.
+        """
+        raise NotImplementedError
+
+    def unschedule(self, key: str, member: bytes) -> bool:
+        """Удаление элемента; False, если его уже нет."""
+        raise NotImplementedError
+
+
+class RedisEventBackend(EventBackend):
+    """Потоки Redis (XADD/XREADGROUP) и sorted set для отложенных повторов."""
+
+    def __init__(self):
+        self.redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT,
+                                        db=settings.REDIS_DB, decode_responses=False)
+
+    @staticmethod
+    def _entry(entry_id, fields) -> StreamEntry:
+        return entry_id.decode(), {key.decode(): value for key, value in fields.items()}
+
+    def append(self, stream, fields, maxlen=None):
+        return self.redis_client.xadd(stream, fields, maxlen=maxlen, approximate=True).decode()
+
+    def create_group(self, stream, group):
+        try:
+            self.redis_client.xgroup_create(stream, group, id='$', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read_group(self, group, consumer, streams, count, block_ms):
+        response = self.redis_client.xreadgroup(
+            group, consumer, {stream: '>' for stream in streams}, count=count, block=block_ms
+        )
+        return [
+            (stream.decode(), [self._entry(entry_id, fields) for entry_id, fields in entries])
+            for stream, entries in response or []
+        ]
+
+    def ack(self, stream, group, *entry_ids):
+        self.redis_client.xack(stream, group, *entry_ids)
+
+    def claim_stale(self, stream, group, consumer, min_idle_ms, count):
+        _, entries, *_ = self.redis_client.xautoclaim(stream, group, consumer, min_idle_ms,
+                                                      start_id='0-0', count=count)
+        # Записи, удалённые из потока, приходят без полей
+        return [self._entry(entry_id, fields) for entry_id, fields in entries if fields]
+
+    def range(self, stream, start='-', end='+', count=None):
+        return [self._entry(entry_id, fields)
+                for entry_id, fields in self.redis_client.xrange(stream, start, end, count=count)]
+
+    def delete(self, stream, *entry_ids):
+        self.redis_client.xdel(stream, *entry_ids)
+
+    def schedule(self, key, member, score):
+        self.redis_client.zadd(key, {member: score})
+
+    def claim_due(self, key, max_score, limit, score):
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                members = pipe.zrangebyscore(key, '-inf', max_score, start=0, num=limit)
+                if members:
+                    pipe.multi()
+                    pipe.zadd(key, dict.fromkeys(members, score), xx=True)
+                    pipe.execute()
+                return members
+            except redis.WatchError:
+                # Очередь изменил другой потребитель: наступившие элементы заберём в следующий раз
+                return []
+
+    def unschedule(self, key, member):
+        return bool(self.redis_client.zrem(key, member))
+
+
+class InMemoryEventBackend(EventBackend):
+    """Хранилище в памяти процесса для тестов и бенчмарков без Redis."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+        # поток -> список (номер, идентификатор, поля)
+        self._streams = defaultdict(list)
+        # (поток, группа) -> номер последней выданной записи
+        self._groups = {}
+        # (поток, группа) -> {идентификатор: (потребитель, время выдачи)}
+        self._pending = defaultdict(dict)
+        self._sorted_sets = defaultdict(dict)
+
+    @staticmethod
+    def _to_bytes(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    @staticmethod
+    def _sequence_of(entry_id: str, default: int) -> int:
+        if entry_id in ('-', '+'):
+            return default
+        return int(entry_id.split('-')[1])
+
+    def append(self, stream, fields, maxlen=None):
+        with self._condition:
+            self._sequence += 1
+            entry_id = f"{int(time.time() * 1000)}-{self._sequence}"
+            entries = self._streams[stream]
+            entries.append((self._sequence, entry_id, {key: self._to_bytes(value) for key, value in fields.items()}))
+            if maxlen and len(entries) > maxlen:
+                del entries[:len(entries) - maxlen]
+            self._condition.notify_all()
+            return entry_id
+
+    def create_group(self, stream, group):
+        with self._condition:
+            entries = self._streams[stream]
+            self._groups.setdefault((stream, group), entries[-1][0] if entries else 0)
+
+    def _read_new(self, group, consumer, streams, count):
+        result = []
+        for stream in streams:
+            last = self._groups.get((stream, group), 0)
+            entries = [entry for entry in self._streams[stream] if entry[0] > last][:count]
+            if entries:
+                self._groups[(stream, group)] = entries[-1][0]
+                delivered_at = time.monotonic()
+                self._pending[(stream, group)].update(
+                    (entry_id, (consumer, delivered_at)) for _, entry_id, _ in entries
+                )
+                result.append((stream, [(entry_id, dict(fields)) for _, entry_id, fields in entries]))
+        return result
+
+    def read_group(self, group, consumer, streams, count, block_ms):
+        deadline = time.monotonic() + block_ms / 1000
+        with self._condition:
+            result = self._read_new(group, consumer, streams, count)
+            while not result:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                result = self._read_new(group, consumer, streams, count)
+            return result
+
+    def ack(self, stream, group, *entry_ids):
+        with self._condition:
+            pending = self._pending[(stream, group)]
+            for entry_id in entry_ids:
+                pending.pop(entry_id, None)
+
+    def claim_stale(self, stream, group, consumer, min_idle_ms, count):
+        with self._condition:
+            now = time.monotonic()
+            pending = self._pending[(stream, group)]
+            fields_by_id = {entry_id: fields for _, entry_id, fields in self._streams[stream]}
+            claimed = []
+            for entry_id, (_, delivered_at) in list(pending.items()):
+                if len(claimed) >= count:
+                    break
+                if (now - delivered_at) * 1000 < min_idle_ms:
+                    continue
+                if entry_id not in fields_by_id:
+                    del pending[entry_id]
+                    continue
+                pending[entry_id] = (consumer, now)
+                claimed.append((entry_id, dict(fields_by_id[entry_id])))
+            return claimed
+
+    def range(self, stream, start='-', end='+', count=None):
+        with self._condition:
+            low = self._sequence_of(start, 0)
+            high = self._sequence_of(end, self._sequence)
+            entries = [(entry_id, dict(fields)) for sequence, entry_id, fields in self._streams[stream]
+                       if low <= sequence <= high]
+            return entries[:count] if count else entries
+
+    def delete(self, stream, *entry_ids):
+        with self._condition:
+            self._streams[stream] = [entry for entry in self._streams[stream] if entry[1] not in entry_ids]
+
+    def schedule(self, key, member, score):
+        with self._condition:
+            self._sorted_sets[key][member] = score
+
+    def claim_due(self, key, max_score, limit, score):
+        with self._condition:
+            members = sorted(self._sorted_sets[key].items(), key=lambda item: item[1])
+            members = [member for member, member_score in members if member_score <= max_score][:limit]
+            for member in members:
+                self._sorted_sets[key][member] = score
+            return members
+
+    def unschedule(self, key, member):
+        with self._condition:
+            return self._sorted_sets[key].pop(member, None) is not None
+
+
+@lru_cache(maxsize=None)
+def get_event_backend() -> EventBackend:
+    """Хранилище шины событий из настройки EVENT_BACKEND (создаётся при первом обращении)."""
+    return import_string(settings.EVENT_BACKEND)()
@@ -0,0 +1,113 @@
+import json
+import logging
+from decimal import Decimal
+from typing import Dict, Any, Optional
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Текущие версии схем событий
+EVENT_SCHEMA_VERSIONS = {
+    'order.created': 1,
+    'order.status_changed': 1,
+    'order.cancelled': 1,
+}
+
+# Код расширения msgpack для Decimal
+DECIMAL_EXT_TYPE = 1
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return {'$decimal': str(obj)}
+    return str(obj)
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and '$decimal' in obj:
+        return Decimal(obj['$decimal'])
+    return obj
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(DECIMAL_EXT_TYPE, str(obj).encode())
+    return str(obj)
+
+
+def _msgpack_ext_hook(code, data):
+    if code == DECIMAL_EXT_TYPE:
+        return Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+class JSONCodec:
+    """Текстовый формат, доступен всегда."""
+    name = 'json'
+    header = b'\x01'
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        return json.dumps(event, default=_json_default, separators=(',', ':')).encode()
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        return json.loads(body, object_hook=_json_object_hook)
+
+
+class MsgPackCodec:
+    """Компактный бинарный формат."""
+    name = 'msgpack'
+    header = b'\x02'
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        return msgpack.packb(event, default=_msgpack_default, use_bin_type=True)
+
+    def decode(self, body: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(body, ext_hook=_msgpack_ext_hook, raw=False)
+
+
+CODECS = [JSONCodec()]
+if msgpack is not None:
+    CODECS.append(MsgPackCodec())
+
+_codecs_by_name = {codec.name: codec for codec in CODECS}
+_codecs_by_header = {codec.header: codec for codec in CODECS}
+
+
+def get_codec(name: Optional[str] = None):
+    """Кодек по имени; при недоступности используется JSON."""
+    name = name or getattr(settings, 'EVENT_CODEC', 'msgpack')
+    codec = _codecs_by_name.get(name)
+    if codec is None:
+        logger.warning(f"Event codec '{name}' is not available, falling back to json")
+        codec = _codecs_by_name['json']
+    return codec
+
+
+def encode_event(event: Dict[str, Any], codec_name: Optional[str] = None) -> bytes:
+    """Кодирование события; первый байт указывает на формат."""
+    codec = get_codec(codec_name)
+    return codec.header + codec.encode(event)
+
+
+def decode_event(payload: bytes) -> Dict[str, Any]:
+    """Декодирование события по байту заголовка."""
+    if payload[:1] == b'{':
+        # Старый формат: JSON без заголовка и версии
+        event = json.loads(payload)
+        event.setdefault('version', 0)
+        return event
+
+    codec = _codecs_by_header.get(payload[:1])
+    if codec is None:
+        raise ValueError(f"Unsupported event codec header {payload[:1]!r}")
+
+    event = codec.decode(payload[1:])
+    version = event.get('version', 0)
+    if version > EVENT_SCHEMA_VERSIONS.get(event.get('type'), 0):
+        raise ValueError(f"Unsupported schema version {version} for event {event.get('type')}")
+    return event
@@ -0,0 +1,255 @@
+import os
+import time
+import random
+import uuid
+import socket
+import logging
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .event_codec import decode_event
+from .event_backends import EventBackend, get_event_backend
+
+logger = logging.getLogger(__name__)
+
+# Реестр обработчиков: тип события -> список функций,
+# каждая получает список данных событий одной пачки
+_handlers = defaultdict(list)
+
+
+def event_handler(event_type: str):
+    """Декоратор для регистрации пакетного обработчика типа события."""
+    def decorator(func):
+        _handlers[event_type].append(func)
+        return func
+    return decorator
+
+
+def stream_name(event_type: str) -> str:
+    """Имя потока Redis для типа события."""
+    return f"{settings.EVENT_STREAM_PREFIX}:{event_type}"
+
+
+def get_ledger_model():
+    """Модель журнала обработанных событий сервиса из настройки EVENT_LEDGER_MODEL."""
+    return apps.get_model(settings.EVENT_LEDGER_MODEL)
+
+
+def claim_events(events: List[dict]) -> List[dict]:
+    """Отбрасывает уже обработанные события и записывает новые в журнал.
+
+    Вызывается внутри транзакции обработчика: один запрос на всю пачку.
+    """
+    ProcessedEvent = get_ledger_model()
+
+    event_ids = {uuid.UUID(event_data['id']) for event_data in events if event_data.get('id')}
+    seen = set(ProcessedEvent.objects.filter(event_id__in=event_ids).values_list('event_id', flat=True))
+
+    new_events = []
+    for event_data in events:
+        if not event_data.get('id'):
+            # События без идентификатора (старые публикации) не дедуплицируются
+            new_events.append(event_data)
+            continue
+        event_id = uuid.UUID(event_data['id'])
+        if event_id in seen:
+            logger.info(f"Skipping duplicate event {event_id}")
+            continue
+        seen.add(event_id)
+        new_events.append(event_data)
+
+    ProcessedEvent.objects.bulk_create(
+        [ProcessedEvent(event_id=uuid.UUID(event_data['id'])) for event_data in new_events if event_data.get('id')]
+    )
+    return new_events
+
+
+def dispatch_batch(events: List[dict]) -> None:
+    """Передача пачки событий обработчикам, по одной транзакции на тип события."""
+    batches = defaultdict(list)
+    for event_data in events:
+        batches[event_data.get('type')].append(event_data)
+
+    for event_type, batch in batches.items():
+        with transaction.atomic():
+            batch = claim_events(batch)
+            if not batch:
+                continue
+            for handler in _handlers.get(event_type, []):
+                handler([event_data.get('data', {}) for event_data in batch])
+
+
+class RetryScheduler:
+    """Отложенные повторы (sorted set) и поток недоставленных событий (DLQ).
+
+    Элемент очереди: b"<попытка>\\n<payload>", score - время следующей попытки.
+    """
+
+    def __init__(self, backend: EventBackend):
+        self.backend = backend
+        self.retry_key = f"{settings.EVENT_STREAM_PREFIX}:retry:{settings.EVENT_CONSUMER_GROUP}"
+        self.dead_letter_stream = f"{settings.EVENT_STREAM_PREFIX}:dead:{settings.EVENT_CONSUMER_GROUP}"
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        """Экспоненциальная задержка с джиттером, в секундах."""
+        delay = min(settings.EVENT_RETRY_MAX_DELAY, settings.EVENT_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def schedule(self, payload: bytes, attempts: int, error: str) -> None:
+        """Планирование повтора или перенос в DLQ после исчерпания попыток."""
+        if attempts >= settings.EVENT_RETRY_MAX_ATTEMPTS:
+            self.dead_letter(payload, attempts, error)
+            return
+        due = time.time() + self.backoff(attempts)
+        self.backend.schedule(self.retry_key, b'%d\n' % attempts + payload, due)
+        logger.warning(f"Event scheduled for retry #{attempts + 1} in {due - time.time():.1f}s: {error}")
+
+    def claim_due(self, limit: int) -> List[Tuple[bytes, int]]:
+        """Берёт в работу события, время повтора которых наступило.
+
+        Из очереди они не удаляются, а откладываются на EVENT_CLAIM_IDLE_MS:
+        если потребитель упадёт до complete(), повтор снова наступит.
+        """
+        now = time.time()
+        due = []
+        for member in self.backend.claim_due(self.retry_key, now, limit, now + settings.EVENT_CLAIM_IDLE_MS / 1000):
+            attempts, payload = member.split(b'\n', 1)
+            due.append((payload, int(attempts)))
+        return due
+
+    def complete(self, messages: List[Tuple[bytes, int]]) -> None:
+        """Удаляет из очереди обработанные повторы (упавшие уже запланированы со следующей попыткой)."""
+        for payload, attempts in messages:
+            self.backend.unschedule(self.retry_key, b'%d\n' % attempts + payload)
+
+    def dead_letter(self, payload: bytes, attempts: int, error: str) -> None:
+        self.backend.append(self.dead_letter_stream, {
+            'payload': payload,
+            'attempts': attempts,
+            'error': error[:1000],
+            'failed_at': timezone.now().isoformat(),
+        }, maxlen=settings.EVENT_DEAD_LETTER_MAXLEN)
+        logger.error(f"Event moved to dead-letter stream after {attempts} attempts: {error}")
+
+    def dead_letters(self, count: Optional[int] = None, entry_ids: Optional[List[str]] = None):
+        """Записи DLQ: все (с ограничением count) или по идентификаторам."""
+        if entry_ids:
+            entries = []
+            for entry_id in entry_ids:
+                entries.extend(self.backend.range(self.dead_letter_stream, entry_id, entry_id))
+            return entries
+        return self.backend.range(self.dead_letter_stream, count=count)
+
+    def replay(self, entries) -> int:
+        """Возвращает записи DLQ в очередь повторов с обнулённым счётчиком попыток."""
+        now = time.time()
+        for entry_id, fields in entries:
+            self.backend.schedule(self.retry_key, b'0\n' + fields['payload'], now)
+            self.backend.delete(self.dead_letter_stream, entry_id)
+        return len(entries)
+
+
+class EventConsumer:
+    """Читает только потоки тех типов событий, для которых есть обработчики."""
+
+    def __init__(self, backend: Optional[EventBackend] = None):
+        self.backend = backend or get_event_backend()
+        self.retries = RetryScheduler(self.backend)
+        self.group = settings.EVENT_CONSUMER_GROUP
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self.streams = [stream_name(event_type) for event_type in _handlers]
+        self.last_purge = 0.0
+        self.last_claim = 0.0
+
+    def ensure_groups(self):
+        """Создание группы потребителей для каждого потока."""
+        for stream in self.streams:
+            self.backend.create_group(stream, self.group)
+
+    def purge_ledger(self):
+        """Периодическая очистка журнала обработанных событий."""
+        if time.monotonic() - self.last_purge < settings.EVENT_LEDGER_PURGE_INTERVAL:
+            return
+        self.last_purge = time.monotonic()
+        deleted = get_ledger_model().purge_expired(settings.EVENT_LEDGER_RETENTION)
+        if deleted:
+            logger.info(f"Purged {deleted} expired processed-event records")
+
+    def reclaim_stale(self):
+        """Периодический перехват записей, выданных упавшим потребителям группы и не подтверждённых."""
+        if time.monotonic() - self.last_claim < settings.EVENT_CLAIM_INTERVAL:
+            return
+        self.last_claim = time.monotonic()
+        for stream in self.streams:
+            messages = self.backend.claim_stale(stream, self.group, self.consumer_name,
+                                                settings.EVENT_CLAIM_IDLE_MS, settings.EVENT_BATCH_SIZE)
+            if messages:
+                logger.warning(f"Reclaimed {len(messages)} stale pending events from {stream}")
+                self.handle_stream(stream, messages)
+
+    def handle_stream(self, stream: str, messages) -> None:
+        """Обработка записей потока и их подтверждение."""
+        self.handle_messages([(fields['payload'], 0) for _, fields in messages])
+        self.backend.ack(stream, self.group, *[message_id for message_id, _ in messages])
+
+    def handle_retries(self, messages: List[Tuple[bytes, int]]) -> None:
+        """Обработка наступивших повторов и их удаление из очереди."""
+        self.handle_messages(messages)
+        self.retries.complete(messages)
+
+    def handle_messages(self, messages: List[Tuple[bytes, int]]) -> None:
+        """Обработка пачки (payload, число прошлых попыток).
+
+        Если пачка целиком не прошла, события обрабатываются по одному,
+        а упавшие уходят в очередь повторов - цикл чтения не ждёт.
+        """
+        decoded = []
+        for payload, attempts in messages:
+            try:
+                decoded.append((payload, attempts, decode_event(payload)))
+            except Exception as e:
+                logger.error(f"Error decoding event: {e}")
+                self.retries.dead_letter(payload, attempts, f"Decode error: {e}")
+
+        try:
+            dispatch_batch([event_data for _, _, event_data in decoded])
+            return
+        except Exception as e:
+            if len(decoded) == 1:
+                payload, attempts, event_data = decoded[0]
+                logger.error(f"Error processing event {event_data.get('id')}: {e}")
+                self.retries.schedule(payload, attempts + 1, f"{type(e).__name__}: {e}")
+                return
+            logger.error(f"Error processing batch of {len(decoded)} events, retrying one by one: {e}")
+
+        for payload, attempts, event_data in decoded:
+            try:
+                dispatch_batch([event_data])
+            except Exception as e:
+                logger.error(f"Error processing event {event_data.get('id')}: {e}")
+                self.retries.schedule(payload, attempts + 1, f"{type(e).__name__}: {e}")
+
+    def run(self):
+        """Основной цикл чтения событий."""
+        self.ensure_groups()
+        logger.info(f"Subscribed to streams: {', '.join(self.streams)}")
+
+        while True:
+            self.purge_ledger()
+            self.reclaim_stale()
+
+            due = self.retries.claim_due(settings.EVENT_BATCH_SIZE)
+            if due:
+                self.handle_retries(due)
+
+            response = self.backend.read_group(
+                self.group, self.consumer_name, self.streams,
+                count=settings.EVENT_BATCH_SIZE, block_ms=settings.EVENT_BLOCK_MS
+            )
+            for stream, messages in response:
+                self.handle_stream(stream, messages)
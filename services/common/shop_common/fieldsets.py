@@ -0,0 +1,144 @@
+from typing import Dict, Iterable, Optional, Set
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def parse_fieldset(value: Optional[str]) -> Optional[Dict[str, dict]]:
+    """'id,items.product_id' -> {'id': {}, 'items': {'product_id': {}}}."""
+    if not value:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldsetMixin:
+    """Выбор полей ответа параметрами ?fields= и ?exclude= запроса.
+
+    Поля перечисляются через запятую, поля вложенных сериализаторов - через
+    точку: ?fields=id,items.product_id. Неизвестные имена игнорируются.
+    Для полей, которых нет среди колонок модели (свойства, SerializerMethodField),
+    колонки и связи, от которых они зависят, указываются в Meta.field_dependencies;
+    без этого запрос не сужается. Поля из fieldset_required (идентификаторы,
+    по которым строятся ссылки и ключи кэша) возвращаются всегда.
+    """
+    fieldset_required = ('id',)
+
+    def _fieldset_path(self):
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
+
+    def _fieldset(self, param):
+        request = self.context.get('request')
+        tree = parse_fieldset(request.query_params.get(param)) if request is not None else None
+        for name in self._fieldset_path():
+            if tree is None:
+                return None
+            tree = tree.get(name) or None
+        return tree
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, exclude = self._fieldset(FIELDS_PARAM), self._fieldset(EXCLUDE_PARAM)
+        if only:
+            fields = {name: field for name, field in fields.items()
+                      if name in only or name in self.fieldset_required}
+        if exclude:
+            fields = {name: field for name, field in fields.items()
+                      if exclude.get(name, True) != {} or name in self.fieldset_required}
+        return fields
+
+
+def required_lookups(serializer) -> Optional[Set[str]]:
+    """Поля и связи модели, которые прочитает сериализатор с учётом выбранных полей.
+
+    None, если это не определить (поле без колонки модели и без Meta.field_dependencies).
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = serializer.Meta.model
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+    lookups = {model._meta.pk.name}
+    for name, field in serializer.fields.items():
+        if name in dependencies:
+            lookups.update(dependencies[name])
+            continue
+        if field.source == '*':
+            return None
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_one and len(field.source_attrs) > 1:
+            lookups.add('__'.join(field.source_attrs[:2]))
+        elif model_field.many_to_one and isinstance(field, serializers.PrimaryKeyRelatedField):
+            lookups.add(model_field.attname)
+        else:
+            lookups.add(model_field.name)
+    return lookups
+
+
+def narrow_queryset(queryset, lookups: Iterable[str], ordering: Iterable[str] = ()):
+    """Загрузка только нужных колонок (only) и связей (select_related, prefetch_related)."""
+    model = queryset.model
+    columns, relations = set(), set()
+    for lookup in list(lookups) + [field.lstrip('-') for field in ordering]:
+        name = lookup.split('__')[0]
+        try:
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.many_to_one and name == field.attname:
+            # Только ключ связи, без JOIN
+            columns.add(field.name)
+        elif field.many_to_one:
+            relations.add(name)
+            columns.add(lookup)
+        elif field.is_relation:
+            relations.add(name)
+        else:
+            columns.add(name)
+
+    if isinstance(queryset.query.select_related, dict):
+        selected = [name for name in queryset.query.select_related if name in relations]
+        queryset = queryset.select_related(None)
+        if selected:
+            queryset = queryset.select_related(*selected)
+    elif queryset.query.select_related:
+        return queryset
+
+    prefetches = queryset._prefetch_related_lookups
+    kept = [lookup for lookup in prefetches
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in relations]
+    if len(kept) != len(prefetches):
+        queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetViewMixin:
+    """Сужение запроса представления до колонок, нужных выбранным полям ответа."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        request = self.request
+        if request.method != 'GET' or not (FIELDS_PARAM in request.query_params
+                                           or EXCLUDE_PARAM in request.query_params):
+            return queryset
+        lookups = required_lookups(self.get_serializer())
+        if lookups is None:
+            return queryset
+        # Колонки сортировки нужны курсорной пагинации для позиции курсора
+        ordering = [field for field in (*queryset.query.order_by, *(getattr(self, 'ordering', None) or ()),
+                                        *getattr(self, 'cursor_ordering', ())) if isinstance(field, str)]
+        return narrow_queryset(queryset, lookups, ordering)
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .fieldsets import EXCLUDE_PARAM, FIELDS_PARAM, parse_fieldset
+
+
+def format_decimal(value, decimal_places=2, rounding=ROUND_HALF_UP):
+    """Decimal строкой с фиксированным числом знаков, как DecimalField DRF с тем же rounding."""
+    return '{:f}'.format(value.quantize(Decimal(1).scaleb(-decimal_places), rounding=rounding))
+
+
+class FlatField:
+    """Поле плоского сериализатора: значение колонки source строки values()."""
+
+    def __init__(self, source=None):
+        self.source = source
+
+    def bind(self, name):
+        self.name = name
+        self.source = self.source or name
+
+    def sources(self):
+        return [self.source]
+
+    def getter(self):
+        source, convert = self.source, self.convert
+        if convert is None:
+            return lambda row: row[source]
+
+        def get(row):
+            value = row[source]
+            return None if value is None else convert(value)
+        return get
+
+    convert = None
+
+
+class FlatDecimalField(FlatField):
+    """Decimal строкой с фиксированным числом знаков, как DecimalField DRF."""
+
+    def __init__(self, source=None, decimal_places=2, rounding=ROUND_HALF_UP):
+        super().__init__(source)
+        self.convert = lambda value: format_decimal(value, decimal_places, rounding)
+
+
+class FlatDateTimeField(FlatField):
+    """ISO 8601 в текущем часовом поясе, UTC с суффиксом Z, как DateTimeField DRF."""
+
+    def getter(self):
+        source, tz = self.source, timezone.get_current_timezone()
+
+        def get(row):
+            value = row[source]
+            if value is None:
+                return None
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return get
+
+
+class FlatMethodField(FlatField):
+    """Значение, вычисляемое функцией из строки; requires - поля, которые она читает."""
+
+    def __init__(self, method, requires=()):
+        super().__init__()
+        self.method = method
+        self.requires = tuple(requires)
+
+    def sources(self):
+        return []
+
+    def getter(self):
+        return self.method
+
+
+class FlatList(FlatField):
+    """Вложенный список строк связанной модели (аналог many=True).
+
+    Строки читаются одним запросом по внешнему ключу related_field
+    для всех строк страницы, как при prefetch_related.
+    """
+
+    def __init__(self, serializer_class, related_field):
+        super().__init__()
+        self.serializer_class = serializer_class
+        self.related_field = related_field
+
+    def sources(self):
+        return ['pk']
+
+    def getter(self):
+        name = self.name
+        return lambda row: row[name]
+
+    def attach(self, rows):
+        serializer = self.serializer_class()
+        model = serializer.model
+        related = model._meta.get_field(self.related_field).attname
+        children = (model.objects.filter(**{f'{related}__in': [row['pk'] for row in rows]})
+                    .order_by(*(model._meta.ordering or ['pk']))
+                    .values(related, *serializer.lookups))
+        grouped = defaultdict(list)
+        for child in children:
+            grouped[child[related]].append(child)
+        for row in rows:
+            row[self.name] = serializer.serialize(grouped[row['pk']])
+
+
+class FlatSerializer:
+    """Сериализация только для чтения по строкам values() без создания моделей.
+
+    Поля объявляются атрибутами класса в порядке вывода; для каждого поля
+    заранее строится функция извлечения, а запрос читает только нужные колонки.
+    Вывод должен совпадать с соответствующим ModelSerializer - это проверяется
+    тестом соответствия.
+    """
+    model = None
+    # Поля, которые выводятся при любом ?fields=, как в SparseFieldsetMixin
+    fieldset_required = ('id',)
+    _declared = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        declared = dict(cls._declared)
+        for name, field in vars(cls).items():
+            if isinstance(field, FlatField):
+                field.bind(name)
+                declared[name] = field
+        cls._declared = declared
+
+    def __init__(self, fields=None):
+        """fields: имена выводимых полей (по умолчанию все)."""
+        declared = self._declared
+        self.fields = {name: field for name, field in declared.items() if fields is None or name in fields}
+        needed = dict(self.fields)
+        for field in self.fields.values():
+            for name in getattr(field, 'requires', ()):
+                needed[name] = declared[name]
+
+        self.lookups = list(dict.fromkeys(source for field in needed.values() for source in field.sources()))
+        self.nested = [field for field in needed.values() if isinstance(field, FlatList)]
+        self.plan = [(name, field.getter()) for name, field in self.fields.items()]
+
+    def values(self, queryset, extra=()):
+        """Строки запроса с колонками полей и дополнительными extra (например, сортировки)."""
+        return queryset.values(*dict.fromkeys([*self.lookups, *extra]))
+
+    def serialize(self, rows):
+        rows = list(rows)
+        for field in self.nested:
+            field.attach(rows)
+        plan = self.plan
+        return [{name: get(row) for name, get in plan} for row in rows]
+
+
+class FlatListMixin:
+    """Список через flat_serializer_class вместо ModelSerializer.
+
+    Фильтры, сортировка и пагинация те же; ?fields= и ?exclude= выбирают
+    поля верхнего уровня. Выбор вложенных полей обрабатывает обычный сериализатор.
+    """
+    flat_serializer_class = None
+
+    def flat_fields(self):
+        """Имена полей для плоского сериализатора или None, если выбраны вложенные поля."""
+        only = parse_fieldset(self.request.query_params.get(FIELDS_PARAM)) or {}
+        exclude = parse_fieldset(self.request.query_params.get(EXCLUDE_PARAM)) or {}
+        if any(only.values()) or any(exclude.values()):
+            return None
+        required = set(self.flat_serializer_class.fieldset_required)
+        names = set(self.flat_serializer_class._declared)
+        if only:
+            names &= set(only) | required
+        return names - (set(exclude) - required)
+
+    def list(self, request, *args, **kwargs):
+        names = self.flat_fields() if self.flat_serializer_class is not None else None
+        if names is None:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.flat_serializer_class(fields=names)
+        # Вложенные списки плоский сериализатор читает сам
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        # Колонки сортировки нужны курсорной пагинации для позиции курсора
+        ordering = [field.lstrip('-') for field in (*queryset.query.order_by, *(getattr(self, 'ordering', None) or ()),
+                                                    *getattr(self, 'cursor_ordering', ()))
+                    if isinstance(field, str) and field.lstrip('-') != 'search_rank']
+        rows = serializer.values(queryset, ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
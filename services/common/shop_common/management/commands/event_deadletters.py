@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from ...event_codec import decode_event
+from ...event_backends import get_event_backend
+from ...events import RetryScheduler
+
+
+class Command(BaseCommand):
+    help = 'Просмотр и повторная обработка событий из dead-letter потока'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'replay'])
+        parser.add_argument('entry_ids', nargs='*', help='Идентификаторы записей DLQ (по умолчанию все)')
+        parser.add_argument('--count', type=int, default=100, help='Сколько записей показать/вернуть')
+
+    def handle(self, *args, **options):
+        retries = RetryScheduler(get_event_backend())
+        entries = retries.dead_letters(count=options['count'], entry_ids=options['entry_ids'])
+
+        if options['action'] == 'list':
+            for entry_id, fields in entries:
+                try:
+                    event_data = decode_event(fields['payload'])
+                    event = f"{event_data.get('type')} {event_data.get('id')}"
+                except Exception as e:
+                    event = f"<undecodable: {e}>"
+                self.stdout.write(
+                    f"{entry_id}  {event}  attempts={fields['attempts'].decode()}  "
+                    f"failed_at={fields['failed_at'].decode()}\n    {fields['error'].decode()}"
+                )
+            self.stdout.write(f"{len(entries)} dead-lettered events")
+        else:
+            replayed = retries.replay(entries)
+            self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} events"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+from ...events import EventConsumer
+
+
+class Command(BaseCommand):
+    help = ('Потребитель шины событий: обработчики из модулей event_handlers установленных приложений, '
+            'повторы и перехват записей упавших потребителей группы')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('event_handlers')
+        consumer = EventConsumer()
+        if not consumer.streams:
+            raise CommandError("No event handlers registered: no installed app has an event_handlers module")
+
+        self.stdout.write(f"Consuming {', '.join(consumer.streams)} as {consumer.group}/{consumer.consumer_name}")
+        try:
+            consumer.run()
+        except KeyboardInterrupt:
+            self.stdout.write("Event consumer stopped")
@@ -0,0 +1,49 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсорная пагинация по сортировке представления.
+
+    К сортировке добавляется id, чтобы порядок был однозначным
+    и совпадал с составным индексом.
+    """
+    tiebreaker = 'id'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in (self.tiebreaker, 'pk') for field in ordering):
+            ordering += (self.tiebreaker,)
+        return ordering
+
+
+class PageOrCursorPagination(PageNumberPagination):
+    """Пагинация по номеру страницы или по курсору на выбор клиента.
+
+    ?pagination=cursor (или переданный ?cursor=) включает курсорный режим:
+    без COUNT(*) и OFFSET, ссылки next/previous содержат непрозрачный курсор.
+    Сортировка курсора берётся из cursor_ordering представления.
+    """
+    mode_query_param = 'pagination'
+    cursor_class = KeysetCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class(getattr(view, 'cursor_ordering', None))
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
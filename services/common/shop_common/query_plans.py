@@ -0,0 +1,66 @@
+import re
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+# Строка плана SQLite без индекса: "SCAN orders_order", но не "SCAN ... USING INDEX ..."
+FULL_SCAN = re.compile(r'^SCAN \S+( AS \S+)?$')
+
+
+@contextmanager
+def seeded_test_database():
+    """Временная тестовая БД с применёнными миграциями; удаляется после проверки."""
+    if connection.vendor != 'sqlite':
+        raise RuntimeError('EXPLAIN QUERY PLAN check is implemented for SQLite only')
+
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def analyze():
+    """Статистика для планировщика, как на рабочей БД."""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def explain(sql: str) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def capture_selects(request: Callable[[Client], object]) -> List[str]:
+    """SELECT-запросы, выполненные при обработке запроса к представлению."""
+    with CaptureQueriesContext(connection) as context:
+        response = request(Client())
+    if response.status_code >= 400:
+        raise RuntimeError(f"request failed with {response.status_code}: {response.content[:200]}")
+    return [query['sql'] for query in context.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+
+
+def check_plans(scenarios, write) -> List[Tuple[str, str, str]]:
+    """Печатает планы запросов каждого сценария и возвращает найденные полные сканирования.
+
+    scenarios: список (название, функция, выполняющая запрос через тестовый клиент).
+    """
+    full_scans = []
+    for label, request in scenarios:
+        write(f"== {label}")
+        for sql in capture_selects(request):
+            plan = explain(sql)
+            write(f"   {sql[:160]}")
+            for detail in plan:
+                marker = '!!' if FULL_SCAN.match(detail) else '  '
+                write(f"   {marker} {detail}")
+                if marker == '!!':
+                    full_scans.append((label, detail, sql))
+    return full_scans
@@ -0,0 +1,72 @@
+import datetime
+import decimal
+
+import orjson
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+# Ключи не-строки (числа в словарях агрегатов) приводятся к строкам, как в json
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def default(obj):
+    """Типы, которые orjson не сериализует сам; то же, что JSONEncoder DRF.
+
+    Decimal выводится строкой без потери точности (DRF отдал бы float).
+    """
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON-ответы через orjson вместо JSONRenderer DRF.
+
+    datetime, date, time и UUID orjson сериализует сам: UTC выводится с Z,
+    микросекунды сохраняются. Отступ задаётся как у JSONRenderer:
+    Accept: application/json; indent=2 (orjson поддерживает только 2).
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = OPTIONS
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=options)
+
+
+class ORJSONParser(BaseParser):
+    """Разбор тела запроса через orjson.
+
+    Дробные числа читаются как float; DecimalField приводит их через str(),
+    а кратчайшее представление float восстанавливает десятичную запись
+    до 15 значащих цифр точно, чего достаточно для цен.
+    """
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,310 @@
+import re
+import sys
+import json as jsonlib
+import copy
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from decimal import Decimal
+from functools import lru_cache
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, urlencode
+
+import requests
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.utils.module_loading import import_string
+
+
+class HttpTransport:
+    """Вызовы других сервисов по HTTP с переиспользованием соединений."""
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def get(self, url: str, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.session.post(url, **kwargs)
+
+
+class LocalResponse:
+    """Ответ локальной подмены с интерфейсом requests.Response."""
+
+    def __init__(self, status_code: int, data: Optional[Dict[str, Any]] = None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+
+class LocalServiceTransport:
+    """Подмена cart-, product- и user-service в памяти процесса.
+
+    Позволяет нагружать и профилировать оформление заказа на одной машине
+    без запущенных сервисов и сети. Данные задаются через add_user,
+    add_product и set_cart.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.products = {}
+        self.carts = {}
+        self._lock = threading.Lock()
+        self._routes = [
+            ('GET', re.compile(r'^/api/auth/user-info/$'), self._user_info),
+            ('GET', re.compile(r'^/api/cart/$'), self._cart),
+            ('GET', re.compile(r'^/api/products/(?P<product_id>\d+)/$'), self._product),
+            ('GET', re.compile(r'^/api/products/(?P<product_id>\d+)/check-availability/$'), self._check_availability),
+            ('POST', re.compile(r'^/api/products/check-availability/$'), self._check_availability_batch),
+            ('POST', re.compile(r'^/api/products/(?P<product_id>\d+)/reserve/$'), self._reserve),
+            ('POST', re.compile(r'^/api/products/(?P<product_id>\d+)/release/$'), self._release),
+        ]
+
+    def add_user(self, token: str, user_id: int, email: str = '', first_name: str = '', last_name: str = ''):
+        self.users[token] = {
+            'id': user_id,
+            'email': email,
+            'first_name': first_name,
+            'last_name': last_name,
+        }
+
+    def add_product(self, product_id: int, name: str, price, stock_quantity: int, is_active: bool = True):
+        self.products[product_id] = {
+            'id': product_id,
+            'name': name,
+            'price': str(Decimal(price)),
+            'stock_quantity': stock_quantity,
+            'is_in_stock': stock_quantity > 0,
+            'image_url': '',
+            'is_active': is_active,
+        }
+
+    def set_cart(self, user_id: int, items: Dict[int, int]):
+        """Содержимое корзины: product_id -> количество."""
+        self.carts[user_id] = dict(items)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, headers=None, params=None, json=None, timeout=None):
+        path = urlsplit(url).path
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                kwargs = {key: int(value) for key, value in match.groupdict().items()}
+                return handler(headers or {}, params or {}, json or {}, **kwargs)
+        return LocalResponse(404, {'detail': 'Not found.'})
+
+    def _user(self, headers):
+        token = headers.get('Authorization', '').replace('Bearer ', '')
+        return self.users.get(token)
+
+    def _user_info(self, headers, params, data):
+        user = self._user(headers)
+        if user is None:
+            return LocalResponse(401, {'error': 'Invalid token'})
+        return LocalResponse(200, dict(user))
+
+    def _cart(self, headers, params, data):
+        user = self._user(headers)
+        if user is None:
+            return LocalResponse(401, {'error': 'Invalid token'})
+
+        items = []
+        for item_id, (product_id, quantity) in enumerate(self.carts.get(user['id'], {}).items(), start=1):
+            product = self.products[product_id]
+            price = Decimal(product['price'])
+            items.append({
+                'id': item_id,
+                'product_id': product_id,
+                'product_name': product['name'],
+                'quantity': quantity,
+                'price': str(price),
+                'subtotal': str(price * quantity),
+            })
+        return LocalResponse(200, {
+            'id': user['id'],
+            'user_id': user['id'],
+            'items': items,
+            'total_items': sum(item['quantity'] for item in items),
+            'total_amount': str(sum((Decimal(item['subtotal']) for item in items), Decimal('0.00'))),
+        })
+
+    def _product(self, headers, params, data, product_id):
+        product = self.products.get(product_id)
+        if product is None:
+            return LocalResponse(404, {'detail': 'Not found.'})
+        return LocalResponse(200, dict(product))
+
+    def _check_availability(self, headers, params, data, product_id):
+        product = self.products.get(product_id)
+        if product is None:
+            return LocalResponse(404, {'error': 'Product not found.'})
+        quantity = int(params.get('quantity', 1))
+        return LocalResponse(200, {
+            'product_id': product_id,
+            'name': product['name'],
+            'price': product['price'],
+            'available': product['stock_quantity'] >= quantity,
+            'stock_quantity': product['stock_quantity'],
+            'requested_quantity': quantity,
+        })
+
+    def _check_availability_batch(self, headers, params, data):
+        requested = {}
+        for item in data.get('items', []):
+            requested[item['product_id']] = requested.get(item['product_id'], 0) + item.get('quantity', 1)
+        results = []
+        for product_id, quantity in requested.items():
+            product = self.products.get(product_id)
+            if product is not None:
+                results.append({
+                    'product_id': product_id,
+                    'name': product['name'],
+                    'price': product['price'],
+                    'image_url': product['image_url'],
+                    'is_active': product['is_active'],
+                    'available': product['stock_quantity'] >= quantity,
+                    'stock_quantity': product['stock_quantity'],
+                    'requested_quantity': quantity,
+                })
+        return LocalResponse(200, {
+            'results': results,
+            'missing': [product_id for product_id in requested if product_id not in self.products],
+        })
+
+    def _reserve(self, headers, params, data, product_id):
+        quantity = data.get('quantity', 1)
+        with self._lock:
+            product = self.products.get(product_id)
+            if product is None:
+                return LocalResponse(404, {'error': 'Product not found.'})
+            if product['stock_quantity'] < quantity:
+                return LocalResponse(400, {'error': 'Insufficient stock quantity.'})
+            product['stock_quantity'] -= quantity
+        return LocalResponse(200, {'message': 'Product reserved successfully.'})
+
+    def _release(self, headers, params, data, product_id):
+        quantity = data.get('quantity', 1)
+        with self._lock:
+            product = self.products.get(product_id)
+            if product is None:
+                return LocalResponse(404, {'error': 'Product not found.'})
+            product['stock_quantity'] += quantity
+        return LocalResponse(200, {'message': 'Product released successfully.'})
+
+
+class InProcessResponse:
+    """Ответ Django-обработчика с интерфейсом requests.Response."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.content
+        self.headers = response.headers
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+class InProcessTransport:
+    """Вызов сервисов, развёрнутых в одном процессе (монолитный режим).
+
+    Запрос передаётся прямо в обработчик Django текущего процесса:
+    без сокетов и разбора HTTP, но с теми же middleware, URL и представлениями.
+    В отличие от WSGIHandler не отправляет сигналы request_started/request_finished,
+    которые закрыли бы соединение с БД внутри транзакции вызывающего запроса.
+    """
+
+    def __init__(self):
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, headers=None, params=None, json=None, timeout=None):
+        parts = urlsplit(url)
+        body = jsonlib.dumps(json).encode() if json is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': urlencode(params or {}, doseq=True),
+            'SERVER_NAME': parts.hostname or 'localhost',
+            'SERVER_PORT': str(parts.port or 80),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': parts.netloc or 'localhost',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': parts.scheme or 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        return InProcessResponse(self.handler.get_response(WSGIRequest(environ)))
+
+
+class ETagCache:
+    """Повторная проверка GET-ответов других сервисов по ETag.
+
+    Последний ответ с ETag хранится по URL, параметрам и заголовку
+    Authorization; следующий запрос уходит с If-None-Match, и при 304
+    возвращается сохранённое тело без повторной передачи и сериализации.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers=None, params=None, **kwargs):
+        headers = dict(headers or {})
+        key = (url, headers.get('Authorization', ''), urlencode(sorted((params or {}).items())))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+
+        response = get_transport().get(url, headers=headers, params=params, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            return LocalResponse(200, copy.deepcopy(cached[1]))
+
+        etag = response.headers.get('ETag') if response.status_code == 200 else None
+        with self._lock:
+            if etag:
+                self._entries[key] = (etag, response.json())
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.pop(key, None)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def get_transport():
+    """Транспорт для клиентов сервисов из настройки SERVICE_TRANSPORT."""
+    return import_string(settings.SERVICE_TRANSPORT)()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Бенчмарк оформления заказа в монолитном режиме.
+
+Сравнивает задержку POST /api/orders/create/, когда order-service ходит
+в user-, cart- и product-service по HTTP через loopback, и когда те же
+вызовы идут внутри процесса (InProcessTransport).
+
+    python bench_checkout.py [--iterations 200] [--items 3]
+"""
+import os
+import argparse
+import logging
+import tempfile
+import statistics
+import threading
+import time
+
+
+def setup_django(database_name):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database_name
+    settings.EVENT_BACKEND = 'shop_common.event_backends.InMemoryEventBackend'
+    settings.DEBUG = False
+    logging.disable(logging.WARNING)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def start_http_server():
+    """Тот же монолит, обслуживаемый по HTTP в фоновом потоке."""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        # Без Nagle ответы не ждут delayed ACK клиента
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+    server.set_app(WSGIHandler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def seed(items_count):
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from apps.users.models import User
+    from apps.products.models import Category, Product
+
+    user = User.objects.create_user(username='bench', email='bench@example.com', password='bench-password',
+                                    first_name='Bench', last_name='User')
+    category = Category.objects.create(name='Bench')
+    products = [
+        Product.objects.create(name=f'Bench product {i}', price='19.99', category=category, stock_quantity=10 ** 9)
+        for i in range(items_count)
+    ]
+    return user, str(RefreshToken.for_user(user).access_token), products
+
+
+def fill_cart(user, products):
+    from apps.cart.models import Cart, CartItem
+
+    cart, _ = Cart.objects.get_or_create(user_id=user.id)
+    cart.items.all().delete()
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product.id, product_name=product.name, price=product.price, quantity=1)
+        for product in products
+    ])
+    Cart.refresh_totals([cart.id])
+
+
+def use_transport(transport_path, base_url):
+    from django.conf import settings
+    from shop_common.transport import get_transport
+
+    settings.SERVICE_TRANSPORT = transport_path
+    settings.PRODUCT_SERVICE_URL = settings.CART_SERVICE_URL = settings.USER_SERVICE_URL = base_url
+    get_transport.cache_clear()
+
+
+def run(label, user, token, products, iterations):
+    from shop_common.transport import InProcessTransport
+
+    client = InProcessTransport()
+    headers = {'Authorization': f'Bearer {token}'}
+    payload = {'shipping_data': 'Benchmark street 1, apt 2'}
+    timings = []
+
+    for i in range(iterations + 5):
+        fill_cart(user, products)
+        start = time.perf_counter()
+        response = client.post('http://localhost/api/orders/create/', headers=headers, json=payload)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 201:
+            raise RuntimeError(f"{label}: checkout failed with {response.status_code}: {response.content[:200]}")
+        if i >= 5:
+            timings.append(elapsed * 1000)
+
+    timings.sort()
+    result = {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+    }
+    print(f"{label:<12} mean {result['mean']:7.2f} ms   p50 {result['p50']:7.2f} ms   p95 {result['p95']:7.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--items', type=int, default=3, help='Позиций в корзине')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.db'))
+        user, token, products = seed(args.items)
+        server, base_url = start_http_server()
+
+        print(f"Checkout with {args.items} cart items, {args.iterations} iterations")
+        use_transport('shop_common.transport.HttpTransport', base_url)
+        http = run('http', user, token, products, args.iterations)
+        use_transport('shop_common.transport.InProcessTransport', 'http://localhost')
+        in_process = run('in-process', user, token, products, args.iterations)
+
+        saved = http['mean'] - in_process['mean']
+        print(f"saved        {saved:7.2f} ms per checkout ({saved / http['mean']:.0%})")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
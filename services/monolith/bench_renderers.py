@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Бенчмарк JSON-рендереров на ответах списков заказов и товаров.
+
+Сравнивает JSONRenderer DRF и ORJSONRenderer на данных OrderSerializer
+и ProductSerializer (сериализация моделей в данные не входит в замер,
+только кодирование в JSON).
+
+    python bench_renderers.py [--iterations 500] [--objects 20] [--items 5]
+"""
+import os
+import argparse
+import logging
+import tempfile
+import statistics
+import time
+from decimal import Decimal
+
+
+def setup_django(database_name):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database_name
+    settings.DEBUG = False
+    logging.disable(logging.WARNING)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def payloads(objects, items_per_order):
+    """Данные страницы списка заказов и страницы списка товаров."""
+    from apps.orders.models import Order, OrderItem
+    from apps.orders.serializers import OrderSerializer
+    from apps.products.models import Category, Product
+    from apps.products.serializers import ProductSerializer
+
+    for _ in range(objects):
+        order = Order.objects.create(user_id=1, total_amount=Decimal('99.95'),
+                                     shipping_address='Benchmark street 1, apt 2')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=i, product_name=f'Bench product {i}', quantity=i + 1,
+                      price=Decimal('19.99'))
+            for i in range(items_per_order)
+        ])
+    category = Category.objects.create(name='Bench', slug='bench')
+    Product.objects.bulk_create([
+        Product(name=f'Bench product {i}', description='Описание товара ' * 10, price=Decimal('19.99'),
+                category=category, stock_quantity=100)
+        for i in range(objects)
+    ])
+
+    orders = OrderSerializer(Order.objects.with_items(), many=True).data
+    products = ProductSerializer(Product.objects.select_related('category'), many=True).data
+    return [
+        ('OrderSerializer', {'count': objects, 'next': None, 'previous': None, 'results': orders}),
+        ('ProductSerializer', {'count': objects, 'next': None, 'previous': None, 'results': products}),
+    ]
+
+
+def measure(renderer, data, iterations):
+    """Среднее время кодирования в микросекундах и размер ответа."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        body = renderer.render(data)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    return statistics.mean(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--objects', type=int, default=20, help='Объектов на странице')
+    parser.add_argument('--items', type=int, default=5, help='Позиций в заказе')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.db'))
+        from rest_framework.renderers import JSONRenderer
+        from shop_common.renderers import ORJSONRenderer
+
+        print(f"{args.objects} objects per page, {args.iterations} iterations")
+        for label, data in payloads(args.objects, args.items):
+            stock, size = measure(JSONRenderer(), data, args.iterations)
+            fast, fast_size = measure(ORJSONRenderer(), data, args.iterations)
+            if fast_size != size:
+                raise RuntimeError(f"{label}: renderers produced different output ({size} vs {fast_size} bytes)")
+            print(f"{label:<18} json {stock:8.1f} us   orjson {fast:8.1f} us   "
+                  f"x{stock / fast:4.1f}   {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
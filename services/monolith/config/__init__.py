@@ -0,0 +1,22 @@
+"""Модульный монолит: все четыре сервиса в одном процессе Django.
+
+Пакеты приложений сервисов лежат в одноимённых пакетах ``apps`` каждого
+сервиса, поэтому ``apps`` собирается из их каталогов до загрузки настроек.
+"""
+import sys
+import types
+from pathlib import Path
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent.parent
+
+SERVICE_DIRS = [
+    SERVICES_DIR / 'user-service',
+    SERVICES_DIR / 'producs-service',
+    SERVICES_DIR / 'cart-service',
+    SERVICES_DIR / 'order-service',
+]
+
+if 'apps' not in sys.modules:
+    apps_package = types.ModuleType('apps')
+    apps_package.__path__ = [str(service_dir / 'apps') for service_dir in SERVICE_DIRS]
+    sys.modules['apps'] = apps_package
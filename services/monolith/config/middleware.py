@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ServiceMiddleware:
+    """Применяет middleware сервиса только к запросам по его путям."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.routes = [
+            (prefix, import_string(middleware_path)(get_response))
+            for prefix, middleware_path in settings.SERVICE_MIDDLEWARE
+        ]
+
+    def __call__(self, request):
+        for prefix, middleware in self.routes:
+            if request.path.startswith(prefix):
+                return middleware(request)
+        return self.get_response(request)
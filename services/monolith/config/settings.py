@@ -0,0 +1,204 @@
+from pathlib import Path
+from datetime import timedelta
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SECRET_KEY = 'monolith-secret-key-change-in-production'
+DEBUG = True
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
+
+DJANGO_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+THIRD_PARTY_APPS = [
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'corsheaders',
+    'django_filters',
+]
+
+LOCAL_APPS = [
+    'shop_common',
+    'apps.users',
+    'apps.authentication',
+    'apps.products',
+    'apps.cart',
+    'apps.orders',
+]
+
+INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.middleware.ServiceMiddleware',
+]
+
+# Middleware аутентификации каждого сервиса применяется только к его путям
+SERVICE_MIDDLEWARE = [
+    ('/api/products/', 'apps.products.middleware.JWTAuthenticationMiddleware'),
+    ('/api/categories/', 'apps.products.middleware.JWTAuthenticationMiddleware'),
+    ('/api/cart/', 'apps.cart.middleware.JWTAuthenticationMiddleware'),
+    ('/api/orders/', 'apps.orders.middleware.JWTAuthenticationMiddleware'),
+]
+
+ROOT_URLCONF = 'config.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+# Одна база на все сервисы: транзакции охватывают таблицы любого приложения
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR.parent.parent / 'databases' / 'monolith.db',
+    }
+}
+
+# Кэш каталога: ответы списков и карточек, фасеты и версия каталога.
+# LocMemCache - свой кэш у каждого процесса, изменения из других процессов видны
+# только по истечении CATALOG_CACHE_TIMEOUT; вне DEBUG нужен общий Redis
+# (manage.py check --deploy, products.E001):
+# {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+CATALOG_CACHE = 'catalog'
+CATALOG_CACHE_TIMEOUT = 300
+# Множитель вероятностного раннего пересчёта: больше - раньше и чаще
+CATALOG_CACHE_EARLY_REFRESH = 1.0
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ],
+    # Представления cart, orders и users задают права явно, products открыт
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.AllowAny',
+    ],
+    # orjson: быстрее стандартного JSONRenderer, Decimal выводится строкой без потерь
+    'DEFAULT_RENDERER_CLASSES': [
+        'shop_common.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'shop_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 20,
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'ROTATE_REFRESH_TOKENS': True,
+}
+
+AUTH_USER_MODEL = 'users.User'
+
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+    "http://localhost:8000",
+    "http://127.0.0.1:8000",
+]
+
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'UTC'
+USE_I18N = True
+USE_TZ = True
+
+STATIC_URL = 'static/'
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+ORDER_STATISTICS_TABLE = True
+
+# Service URLs: в монолите вызовы между сервисами идут внутри процесса
+SERVICE_TRANSPORT = 'shop_common.transport.InProcessTransport'
+PRODUCT_SERVICE_URL = 'http://localhost:8000'
+CART_SERVICE_URL = 'http://localhost:8000'
+USER_SERVICE_URL = 'http://localhost:8000'
+
+# Redis settings
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+REDIS_DB = 0
+
+# Шина событий: публикация из order-service; обработчики cart и products
+# запускаются отдельными процессами со своими настройками
+EVENT_BACKEND = 'shop_common.event_backends.RedisEventBackend'
+EVENT_STREAM_PREFIX = 'events'
+EVENT_STREAM_MAXLEN = 100000
+EVENT_CODEC = 'msgpack'
+
+# Хранилище корзин: apps.cart.storage.DatabaseCartStorage (таблицы Cart/CartItem),
+# RedisCartStorage (горячие корзины в хешах Redis, запись в БД пачками командой flush_carts)
+# или LocalRedisCartStorage (то же в памяти процесса, без Redis)
+CART_STORAGE = 'apps.cart.storage.DatabaseCartStorage'
+# Корзина без изменений дольше этого срока выгружается из Redis и загружается из БД при обращении
+CART_REDIS_TTL = 7 * 24 * 3600
+CART_FLUSH_BATCH_SIZE = 500
+CART_FLUSH_INTERVAL = 1
+# Сохранение в фоновом потоке процесса вместо отдельного flush_carts
+# (для LocalRedisCartStorage, данные которого другим процессам не видны)
+CART_FLUSH_IN_PROCESS = False
+# Брошенные корзины, которые удаляет purge_carts: пустые и без изменений дольше срока
+CART_EMPTY_RETENTION = timedelta(days=1)
+CART_STALE_RETENTION = timedelta(days=90)
+CART_PURGE_CHUNK_SIZE = 500
+
+# Подсказки поиска: индекс в памяти процесса раз в TTL секунд перестраивается в фоне,
+# чтобы подхватывать изменения из других процессов
+SUGGEST_INDEX_TTL = 300
+
+# Фасеты каталога: границы диапазонов цен и время жизни кэша по набору фильтров
+PRODUCT_FACET_PRICE_BUCKETS = [10, 50, 100, 500, 1000]
+PRODUCT_FACETS_CACHE_TIMEOUT = 300
+
+# HTTP-кэш перед каталогом: Cache-Control по политикам представлений (max-age для браузера,
+# s-maxage для прокси) и очистка по Surrogate-Key при изменении товаров и категорий
+CATALOG_CACHE_POLICIES = {
+    'list': {'max_age': 30, 's_maxage': 600},
+    'detail': {'max_age': 60, 's_maxage': 3600},
+    # Индекс подсказок других процессов отстаёт до SUGGEST_INDEX_TTL секунд
+    'suggest': {'max_age': 60, 's_maxage': 300},
+}
+# Получатель очисток: apps.products.surrogate.HttpPurgeBackend или LocalProxyPurgeBackend
+SURROGATE_PURGE_BACKEND = 'apps.products.surrogate.LocalProxyPurgeBackend'
+SURROGATE_PURGE_URL = 'http://localhost:6081/'
+SURROGATE_PURGE_METHOD = 'PURGE'
+SURROGATE_PURGE_HEADERS = {}
+# Локальный кэширующий прокси перед приложением (config/wsgi.py) для проверки без Varnish/CDN
+SURROGATE_LOCAL_PROXY = False
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from django.urls import path, include
+from django.http import JsonResponse
+
+def health_check(request):
+    return JsonResponse({'status': 'healthy', 'service': 'monolith'})
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('health/', health_check),
+    path('api/auth/', include('apps.authentication.urls')),
+    path('api/users/', include('apps.users.urls')),
+    path('api/', include('apps.products.urls')),
+    path('api/', include('apps.cart.urls')),
+    path('api/', include('apps.orders.urls')),
+]
@@ -0,0 +1,23 @@
+"""
+WSGI config for the monolith project.
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.SURROGATE_LOCAL_PROXY:
+    from apps.products.surrogate import SurrogateCacheProxy
+
+    application = SurrogateCacheProxy(application)
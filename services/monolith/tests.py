@@ -0,0 +1,102 @@
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.cart.models import Cart, CartItem
+from apps.orders.models import Order
+from apps.orders.services import cart_etags, event_bus
+from apps.products.models import Category, Product
+from apps.users.models import User
+from shop_common.event_backends import InMemoryEventBackend
+from shop_common.transport import InProcessTransport, get_transport
+
+
+class RecordingTransport(InProcessTransport):
+    """InProcessTransport, запоминающий вызовы сервисов: (метод, путь, код ответа)."""
+    calls = []
+
+    def request(self, method, url, **kwargs):
+        response = super().request(method, url, **kwargs)
+        self.calls.append((method, urlsplit(url).path, response.status_code))
+        return response
+
+
+@override_settings(SERVICE_TRANSPORT='tests.RecordingTransport', PRODUCT_SERVICE_URL='http://localhost',
+                   CART_SERVICE_URL='http://localhost', USER_SERVICE_URL='http://localhost')
+class InProcessCheckoutTests(TestCase):
+    """Оформление заказа в монолите: order-service вызывает остальные сервисы внутри процесса."""
+
+    def setUp(self):
+        get_transport.cache_clear()
+        self.addCleanup(get_transport.cache_clear)
+        cart_etags.clear()
+        self.addCleanup(cart_etags.clear)
+        RecordingTransport.calls = []
+        self.events = InMemoryEventBackend()
+        patcher = mock.patch.object(event_bus, '_backend', self.events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyer-password',
+                                             first_name='Ivan', last_name='Petrov')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.product = Product.objects.create(name='Kettle', price=Decimal('20.00'), stock_quantity=5,
+                                              category=Category.objects.create(name='Kettles'))
+        cart = Cart.objects.create(user_id=self.user.id)
+        cart.items.create(product_id=self.product.id, product_name='Kettle', price=Decimal('20.00'), quantity=2)
+        Cart.refresh_totals([cart.id])
+
+    def checkout(self, token=None):
+        return self.client.post('/api/orders/create/', {'shipping_data': 'Lenina 1'}, content_type='application/json',
+                                HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+
+    def test_checkout_calls_services_in_process(self):
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.user_id, order.user_name, order.total_amount),
+                         (self.user.id, 'Ivan Petrov', Decimal('40.00')))
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.product.id, 2)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+
+        calls = RecordingTransport.calls
+        self.assertIn(('GET', '/api/cart/', 200), calls)
+        self.assertIn(('GET', '/api/auth/user-info/', 200), calls)
+        self.assertIn(('POST', f'/api/products/{self.product.id}/reserve/', 200), calls)
+        self.assertEqual({status for _, _, status in calls}, {200})
+        self.assertEqual(len(self.events.range('events:order.created')), 1)
+
+    def test_service_errors_come_back_as_responses(self):
+        self.product.stock_quantity = 1
+        self.product.save()
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'detail': 'Failed to reserve products.'})
+        self.assertIn(('POST', f'/api/products/{self.product.id}/reserve/', 400), RecordingTransport.calls)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_invalid_token_is_rejected_by_user_service(self):
+        response = self.checkout(token='not-a-token')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(RecordingTransport.calls, [('GET', '/api/auth/user-info/', 401)])
+        self.assertFalse(Order.objects.exists())
+
+    def test_exceptions_in_called_service_become_500(self):
+        transport = InProcessTransport()
+        with mock.patch('apps.products.views.Product.reserve_quantity', side_effect=RuntimeError('boom')), \
+                self.assertLogs('django.request', 'ERROR'):
+            response = transport.post(f'http://localhost/api/products/{self.product.id}/reserve/',
+                                      json={'quantity': 1})
+        self.assertEqual(response.status_code, 500)
+
+        response = transport.post('http://localhost/api/products/999999/reserve/', json={'quantity': 1})
+        self.assertEqual((response.status_code, response.json()), (404, {'error': 'Product not found.'}))
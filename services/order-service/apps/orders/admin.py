@@ -18,7 +18,7 @@ class OrderAdmin(admin.ModelAdmin):
     readonly_fields = ['total_quantity', 'items_count', 'created_at', 'updated_at']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related().prefetch_related('items')
+        return super().get_queryset(request).with_item_totals()
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
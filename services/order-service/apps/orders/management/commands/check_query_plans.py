@@ -0,0 +1,68 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from shop_common.query_plans import analyze, check_plans, seeded_test_database
+from shop_common.transport import get_transport
+from ...models import Order, OrderItem, OrderStatistics
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN QUERY PLAN основных запросов представлений на заполненной тестовой БД; ошибка при полном сканировании'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=40, help='Заказов на пользователя')
+
+    def seed(self, users, orders_per_user):
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+        Order.objects.bulk_create([
+            Order(user_id=user_id, status=random.choice(statuses), total_amount=Decimal('30.00'),
+                  shipping_address='Seed street 1')
+            for user_id in range(1, users + 1)
+            for _ in range(orders_per_user)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_id=product_id, product_name=f'Product {product_id}',
+                      quantity=1, price=Decimal('10.00'))
+            for order_id in Order.objects.values_list('id', flat=True)
+            for product_id in range(1, 4)
+        ])
+        for user_id in range(1, users + 1):
+            OrderStatistics.rebuild(user_id)
+        analyze()
+
+    def scenarios(self, headers):
+        order_id = Order.objects.filter(user_id=1).values_list('id', flat=True).first()
+
+        def cursor_pages(client):
+            first = client.get('/api/orders/', {'pagination': 'cursor'}, **headers)
+            return client.get(first.json()['next'], **headers)
+
+        def computed_statistics(client):
+            with override_settings(ORDER_STATISTICS_TABLE=False):
+                return client.get('/api/orders/statistics/', **headers)
+
+        return [
+            ('order list', lambda client: client.get('/api/orders/', **headers)),
+            ('order list, cursor', cursor_pages),
+            ('order detail', lambda client: client.get(f'/api/orders/{order_id}/', **headers)),
+            ('order statistics', lambda client: client.get('/api/orders/statistics/', **headers)),
+            ('order statistics, computed', computed_statistics),
+        ]
+
+    def handle(self, *args, **options):
+        with seeded_test_database(), override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport'):
+            get_transport.cache_clear()
+            try:
+                get_transport().add_user('plan-check', 1, email='plan-check@example.com')
+                self.seed(options['users'], options['orders'])
+                full_scans = check_plans(self.scenarios({'HTTP_AUTHORIZATION': 'Bearer plan-check'}),
+                                         self.stdout.write)
+            finally:
+                get_transport.cache_clear()
+
+        if full_scans:
+            raise CommandError('Full table scans: ' + '; '.join(f"{label}: {detail}" for label, detail, _ in full_scans))
+        self.stdout.write(self.style.SUCCESS('No full table scans'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from ...models import Order, OrderStatistics
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт таблицы статистики заказов по фактическим заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Пользователи (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or Order.objects.values_list('user_id', flat=True).distinct()
+        rebuilt = 0
+        for user_id in user_ids:
+            OrderStatistics.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt order statistics for {rebuilt} users"))
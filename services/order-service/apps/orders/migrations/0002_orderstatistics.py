@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatistics",
+            fields=[
+                ("user_id", models.IntegerField(primary_key=True, serialize=False)),
+                ("total_orders", models.PositiveIntegerField(default=0)),
+                ("pending_orders", models.PositiveIntegerField(default=0)),
+                ("confirmed_orders", models.PositiveIntegerField(default=0)),
+                ("shipped_orders", models.PositiveIntegerField(default=0)),
+                ("delivered_orders", models.PositiveIntegerField(default=0)),
+                ("cancelled_orders", models.PositiveIntegerField(default=0)),
+                (
+                    "total_spent",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_orderstatistics"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user_id", "-created_at", "id"], name="order_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_order_cursor_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user_id", "status", "total_amount"],
+                name="order_user_status_idx",
+            ),
+        ),
+    ]
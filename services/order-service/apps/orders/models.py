@@ -1,4 +1,27 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.conf import settings
+
+# Поля заказа, от которых зависит OrderStatistics
+STATISTICS_FIELDS = ('user_id', 'status', 'total_amount')
+
+class OrderQuerySet(models.QuerySet):
+
+    def with_items(self):
+        """Позиции заказов загружаются одним запросом на всю выборку."""
+        return self.prefetch_related('items')
+
+    def with_item_totals(self):
+        """Количество позиций и единиц товара считаются в том же запросе."""
+        return self.annotate(
+            annotated_items_count=Count('items'),
+            annotated_total_quantity=Sum('items__quantity'),
+        )
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -17,20 +40,58 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Список заказов пользователя и курсорная пагинация по (-created_at, id)
+            models.Index(fields=['user_id', '-created_at', 'id'], name='order_user_created_idx'),
+            # Статистика пользователя по статусам читается только из индекса
+            models.Index(fields=['user_id', 'status', 'total_amount'], name='order_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by User {self.user_id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Состояние при загрузке: по нему сохранение учитывает разницу в статистике
+        if set(STATISTICS_FIELDS) <= set(field_names):
+            instance._statistics_state = instance.statistics_state()
+        return instance
+
+    def statistics_state(self):
+        return self.user_id, self.status, Decimal(self.total_amount)
+
+    def save(self, *args, **kwargs):
+        """Сохранение заказа вместе с обновлением OrderStatistics (в том числе из админки)."""
+        adding = self._state.adding
+        before = getattr(self, '_statistics_state', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                OrderStatistics.record_change(None, self.statistics_state())
+            elif before is None:
+                # Заказ загружен без полей статистики: прежнее состояние неизвестно
+                OrderStatistics.record_unknown(self.user_id)
+            else:
+                OrderStatistics.record_change(before, self.statistics_state())
+        self._statistics_state = self.statistics_state()
+
     @property
     def items_count(self):
         """Вычисляет общее количество товаров в заказе."""
+        if hasattr(self, 'annotated_items_count'):
+            return self.annotated_items_count
         return self.items.count()
 
     @property
     def total_quantity(self):
         """Вычисляет общее количество единиц товаров в заказе."""
+        if hasattr(self, 'annotated_total_quantity'):
+            return self.annotated_total_quantity or 0
         return sum(item.quantity for item in self.items.all())
 
     def calcilate_total(self):
@@ -57,4 +118,99 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class OrderStatistics(models.Model):
+    """Статистика заказов пользователя, обновляемая вместе с заказами.
+
+    Включается настройкой ORDER_STATISTICS_TABLE; тогда эндпоинт статистики
+    читает одну строку по первичному ключу вместо агрегации по заказам.
+    """
+    user_id = models.IntegerField(primary_key=True)
+    total_orders = models.PositiveIntegerField(default=0)
+    pending_orders = models.PositiveIntegerField(default=0)
+    confirmed_orders = models.PositiveIntegerField(default=0)
+    shipped_orders = models.PositiveIntegerField(default=0)
+    delivered_orders = models.PositiveIntegerField(default=0)
+    cancelled_orders = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    FIELDS = [
+        'total_orders', 'pending_orders', 'confirmed_orders', 'shipped_orders',
+        'delivered_orders', 'cancelled_orders', 'total_spent',
+    ]
+
+    def __str__(self):
+        return f"Order statistics of User {self.user_id}"
+
+    @classmethod
+    def compute(cls, user_id):
+        """Статистика по заказам пользователя одним агрегирующим запросом."""
+        aggregates = {
+            f'{status}_orders': Count('id', filter=Q(status=status))
+            for status, _ in Order.STATUS_CHOICES
+        }
+        stats = Order.objects.filter(user_id=user_id).aggregate(
+            total_orders=Count('id'),
+            total_spent=Sum('total_amount', filter=~Q(status='cancelled')),
+            **aggregates
+        )
+        stats['total_spent'] = Decimal(stats['total_spent'] or 0).quantize(Decimal('0.01'))
+        return {field: stats[field] for field in cls.FIELDS}
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Пересчёт строки статистики по заказам пользователя."""
+        stats = cls.compute(user_id)
+        cls.objects.update_or_create(user_id=user_id, defaults=stats)
+        return stats
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Статистика пользователя из таблицы (строка создаётся при первом обращении)."""
+        row = cls.objects.filter(user_id=user_id).values(*cls.FIELDS).first()
+        return row if row is not None else cls.rebuild(user_id)
+
+    @classmethod
+    def _apply(cls, user_id, **changes):
+        # Если строки ещё нет (таблицу включили позже), она строится по заказам
+        if not cls.objects.filter(user_id=user_id).update(**changes):
+            cls.rebuild(user_id)
+
+    @classmethod
+    def record_change(cls, before, after):
+        """Учитывает создание (before=None), изменение или удаление (after=None) заказа.
+
+        before и after - Order.statistics_state(): (user_id, status, total_amount).
+        Вызывается в транзакции сохранения или удаления заказа.
+        """
+        if not settings.ORDER_STATISTICS_TABLE or before == after:
+            return
+        deltas = defaultdict(lambda: defaultdict(int))
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            user_id, status, total_amount = state
+            deltas[user_id]['total_orders'] += sign
+            deltas[user_id][f'{status}_orders'] += sign
+            if status != 'cancelled':
+                deltas[user_id]['total_spent'] += sign * total_amount
+        for user_id, changes in deltas.items():
+            changes = {field: F(field) + delta for field, delta in changes.items() if delta}
+            if changes:
+                cls._apply(user_id, **changes)
+
+    @classmethod
+    def record_unknown(cls, user_id):
+        """Пересчёт строки, когда прежнее состояние заказа неизвестно."""
+        if settings.ORDER_STATISTICS_TABLE:
+            cls.rebuild(user_id)
+
 
+@receiver(post_delete, sender=Order)
+def record_order_deleted(sender, instance, **kwargs):
+    """Удаление заказа (в том числе массовое из админки) уменьшает статистику пользователя."""
+    before = getattr(instance, '_statistics_state', None)
+    if before is None:
+        OrderStatistics.record_unknown(instance.user_id)
+    else:
+        OrderStatistics.record_change(before, None)
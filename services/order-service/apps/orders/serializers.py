@@ -1,9 +1,21 @@
+from decimal import ROUND_HALF_UP
+
 from rest_framework import serializers
+from shop_common.fieldsets import SparseFieldsetMixin
+from shop_common.flat import (
+    FlatDateTimeField,
+    FlatDecimalField,
+    FlatField,
+    FlatList,
+    FlatMethodField,
+    FlatSerializer,
+    format_decimal,
+)
 from .models import Order, OrderItem
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для элемента заказа."""
-    Subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, rounding=ROUND_HALF_UP)
 
     class Meta:
         model = OrderItem
@@ -16,8 +28,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'subtotal',
             'created_at',
         ]
+        field_dependencies = {'subtotal': ['price', 'quantity']}
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для заказа."""
     items = OrderItemSerializer(many=True, read_only=True)
     items_count = serializers.IntegerField(read_only=True)
@@ -38,6 +51,35 @@ class OrderSerializer(serializers.ModelSerializer):
             'items',
         ]
         read_only_fields = ['user_id', 'total_amount', 'user_email', 'user_name']
+        field_dependencies = {'items_count': ['items'], 'total_quantity': ['items']}
+
+class OrderItemFlatSerializer(FlatSerializer):
+    """Плоский вариант OrderItemSerializer для списков заказов."""
+    model = OrderItem
+    id = FlatField()
+    product_id = FlatField()
+    product_name = FlatField()
+    quantity = FlatField()
+    price = FlatDecimalField()
+    subtotal = FlatMethodField(lambda row: format_decimal(row['price'] * row['quantity']),
+                               requires=('price', 'quantity'))
+    created_at = FlatDateTimeField()
+
+
+class OrderFlatSerializer(FlatSerializer):
+    """Плоский вариант OrderSerializer: тот же JSON без создания моделей."""
+    model = Order
+    id = FlatField()
+    user_id = FlatField()
+    status = FlatField()
+    total_amount = FlatDecimalField()
+    items_count = FlatMethodField(lambda row: len(row['items']), requires=('items',))
+    total_quantity = FlatMethodField(lambda row: sum(item['quantity'] for item in row['items']), requires=('items',))
+    shipping_address = FlatField()
+    created_at = FlatDateTimeField()
+    updated_at = FlatDateTimeField()
+    items = FlatList(OrderItemFlatSerializer, related_field='order')
+
 
 class CreateOrderSerializer(serializers.Serializer):
     """Сериализатор для создания заказа."""
@@ -1,34 +1,54 @@
 from http.client import responses
 
 import requests
-import redis
-import json
+import uuid
 import logging
 from django.conf import settings
+from django.utils import timezone
 from typing import Optional, Dict, Any, List
+from shop_common.event_codec import EVENT_SCHEMA_VERSIONS, encode_event
+from shop_common.event_backends import EventBackend, get_event_backend
+from shop_common.transport import ETagCache, get_transport
 
 logger = logging.getLogger(__name__)
 
 
 class EventBus:
+    """Публикация событий: у каждого типа события свой поток.
 
-    def __init__(self):
-        self.redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-            decode_response=True
-        )
+    Хранилище (Redis или память процесса) берётся из EVENT_BACKEND
+    при первой публикации, а не при импорте модуля.
+    """
+
+    def __init__(self, backend: Optional[EventBackend] = None):
+        self._backend = backend
+
+    @property
+    def backend(self) -> EventBackend:
+        if self._backend is None:
+            self._backend = get_event_backend()
+        return self._backend
+
+    @staticmethod
+    def stream_name(event_type: str) -> str:
+        """Имя потока для типа события."""
+        return f"{settings.EVENT_STREAM_PREFIX}:{event_type}"
 
     def publish_event(self, event_type: str, data: Dict[str, Any]) -> None:
         """Публикация события в шину событий."""
         try:
-            event_data: {
+            event_data = {
+                'id': uuid.uuid4().hex,
                 'type': event_type,
+                'version': EVENT_SCHEMA_VERSIONS[event_type],
                 'data': data,
-                'timestamp': json.dumps({}, default=str)
+                'timestamp': timezone.now().isoformat()
             }
-            self.redis_client.publish('events', json.dumps(event_data))
+            self.backend.append(
+                self.stream_name(event_type),
+                {'payload': encode_event(event_data)},
+                maxlen=settings.EVENT_STREAM_MAXLEN
+            )
             logger.info(f"Published event {event_type}")
 
         except Exception as e:
@@ -36,6 +56,12 @@ class EventBus:
 
 event_bus = EventBus()
 
+# Корзина перепроверяется по ETag: при повторном оформлении она обычно не меняется
+cart_etags = ETagCache()
+
+# Поля корзины для оформления заказа: без сведений о товарах из product-service
+CART_FIELDS = 'total_amount,items.product_id,items.product_name,items.quantity,items.price'
+
 
 class CartService:
     """Сервис для взаимодействия с cart-service"""
@@ -44,9 +70,10 @@ class CartService:
     def get_user_cart(user_id: int, token: str)-> Optional[Dict[str,Any]]:
         try:
             headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
+            response = cart_etags.get(
                 f"{settings.CART_SERVICE_URL}/api/cart/",
                 headers=headers,
+                params={'fields': CART_FIELDS},
                 timeout=5
             )
             if response.status_code == 200:
@@ -65,12 +92,12 @@ class ProductService:
         """Резервирование продуктов"""
         try:
             for item in items:
-                response = requests.post(
+                response = get_transport().post(
                     f"{settings.PRODUCT_SERVICE_URL}/api/products/{item['product_id']}/reserve/",
                     json={'quantity': item['quantity']},
                     timeout=5
                 )
-                if response != 200:
+                if response.status_code != 200:
                     logger.error(f"Failed to reserve product {item['product_id']}")
                     return False
             return True
@@ -84,7 +111,7 @@ class ProductService:
         """Отмена резерва продуктов"""
         try:
             for item in items:
-                requests.post(
+                get_transport().post(
                     f"{settings.PRODUCT_SERVICE_URL}/api/products/{item['product_id']}/release/",
                     json={'quantity': item['quantity']},
                     timeout=5
@@ -100,7 +127,7 @@ class UserService:
         """Получение информации о пользователе по JWT токену"""
         try:
             headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
+            response = get_transport().get(
                 f"{settings.USER_SERVICE_URL}/api/auth/user-info/",
                 headers=headers,
                 timeout=5
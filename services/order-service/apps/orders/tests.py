@@ -1,3 +1,288 @@
-from django.test import TestCase
+from io import BytesIO, StringIO
+from unittest import mock
+from decimal import Decimal
+from datetime import datetime, timezone as dt_timezone
 
-# Create your tests here.
+import orjson
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from shop_common.flat import FlatDecimalField, format_decimal
+from shop_common.renderers import ORJSONParser, ORJSONRenderer
+from shop_common.transport import get_transport
+from .models import Order, OrderItem, OrderStatistics
+from .serializers import OrderFlatSerializer, OrderItemSerializer, OrderSerializer
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class OrderQueryCountTests(TestCase):
+    """Число запросов к БД не зависит от количества заказов и позиций."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+
+    def create_orders(self, count, items_per_order=3):
+        for _ in range(count):
+            order = Order.objects.create(user_id=self.user_id, total_amount=Decimal('30.00'),
+                                         shipping_address='Test street 1')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, product_name=f'Product {product_id}',
+                          quantity=2, price=Decimal('5.00'))
+                for product_id in range(1, items_per_order + 1)
+            ])
+        return order
+
+    def get(self, url):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_order_list_query_count_is_constant(self):
+        self.create_orders(1)
+        # count, заказы, позиции
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get(reverse('order-list')).status_code, 200)
+
+        self.create_orders(5)
+        with self.assertNumQueries(3):
+            response = self.get(reverse('order-list'))
+        self.assertEqual(response.json()['results'][0]['items_count'], 3)
+        self.assertEqual(response.json()['results'][0]['total_quantity'], 6)
+
+    def test_order_detail_query_count(self):
+        order = self.create_orders(1, items_per_order=10)
+        # валидаторы ETag, заказ, позиции
+        with self.assertNumQueries(3):
+            response = self.get(reverse('order-detail', args=[order.id]))
+        self.assertEqual(response.json()['items_count'], 10)
+
+    def test_item_totals_annotation(self):
+        self.create_orders(3)
+        with self.assertNumQueries(1):
+            totals = [(order.items_count, order.total_quantity)
+                      for order in Order.objects.with_item_totals()]
+        self.assertEqual(totals, [(3, 6)] * 3)
+
+    def test_sparse_fields_skip_items(self):
+        self.create_orders(3)
+        # count, заказы без позиций
+        with self.assertNumQueries(2):
+            response = self.get(reverse('order-list') + '?fields=status,total_amount')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'status', 'total_amount'})
+
+        response = self.get(reverse('order-list') + '?fields=items.quantity')
+        order = response.json()['results'][0]
+        self.assertEqual(set(order), {'id', 'items'})
+        self.assertEqual(set(order['items'][0]), {'id', 'quantity'})
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class OrderCursorPaginationTests(TestCase):
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+        self.orders = [
+            Order.objects.create(user_id=self.user_id, total_amount=Decimal('10.00'), shipping_address='Test street 1')
+            for _ in range(25)
+        ]
+
+    def get(self, url, **params):
+        return self.client.get(url, params, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_cursor_pages_cover_all_orders_once(self):
+        response = self.get(reverse('order-list'), pagination='cursor')
+        self.assertNotIn('count', response.json())
+        ids = [order['id'] for order in response.json()['results']]
+
+        next_url = response.json()['next']
+        self.assertIsNotNone(next_url)
+        with self.assertNumQueries(2):
+            response = self.client.get(next_url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        ids += [order['id'] for order in response.json()['results']]
+        self.assertIsNone(response.json()['next'])
+
+        expected = Order.objects.order_by('-created_at', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_page_number_mode_is_default(self):
+        response = self.get(reverse('order-list'))
+        self.assertEqual(response.json()['count'], 25)
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport')
+class OrderConditionalGetTests(TestCase):
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+        self.order = Order.objects.create(user_id=self.user_id, total_amount=Decimal('10.00'),
+                                          shipping_address='Test street 1')
+        self.url = reverse('order-detail', args=[self.order.id])
+
+    def get(self, **headers):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.token}', **headers)
+
+    def test_matching_etag_returns_304_without_serialization(self):
+        etag = self.get()['ETag']
+        with self.assertNumQueries(1):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_status_change_changes_etag(self):
+        response = self.get()
+        self.order.status = 'confirmed'
+        self.order.save()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+    def test_other_users_order_is_not_revalidated(self):
+        other = Order.objects.create(user_id=2, total_amount=Decimal('10.00'), shipping_address='Test street 2')
+        response = self.client.get(reverse('order-detail', args=[other.id]),
+                                   HTTP_AUTHORIZATION=f'Bearer {self.token}', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+
+@override_settings(SERVICE_TRANSPORT='shop_common.transport.LocalServiceTransport', ORDER_STATISTICS_TABLE=True)
+class OrderStatisticsTests(TestCase):
+    """Таблица статистики совпадает с агрегацией по заказам после любых изменений."""
+
+    token = 'test-token'
+    user_id = 1
+
+    def setUp(self):
+        get_transport.cache_clear()
+        get_transport().add_user(self.token, self.user_id, email='user@example.com')
+        self.addCleanup(get_transport.cache_clear)
+
+    def create_order(self, total, user_id=None):
+        return Order.objects.create(user_id=user_id or self.user_id, total_amount=Decimal(total),
+                                    shipping_address='Test street 1')
+
+    def assertStatisticsConsistent(self, user_id=None):
+        user_id = user_id or self.user_id
+        row = OrderStatistics.objects.filter(user_id=user_id).values(*OrderStatistics.FIELDS).get()
+        self.assertEqual(row, OrderStatistics.compute(user_id))
+        return row
+
+    def set_status(self, order, new_status):
+        with mock.patch('apps.orders.views.event_bus'):
+            return self.client.put(reverse('update-order-status', args=[order.id]), {'status': new_status},
+                                   content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_create_confirm_cancel_keep_counters_exact(self):
+        first, second = self.create_order('10.00'), self.create_order('25.50')
+        self.assertEqual(self.assertStatisticsConsistent()['pending_orders'], 2)
+
+        self.assertEqual(self.set_status(first, 'confirmed').status_code, 200)
+        self.assertEqual(self.assertStatisticsConsistent()['confirmed_orders'], 1)
+
+        self.assertEqual(self.set_status(second, 'cancelled').status_code, 200)
+        row = self.assertStatisticsConsistent()
+        self.assertEqual((row['cancelled_orders'], row['total_spent']), (1, Decimal('10.00')))
+
+    def test_admin_edits_and_deletes_are_counted(self):
+        order, other = self.create_order('10.00'), self.create_order('5.00', user_id=2)
+        order = Order.objects.get(pk=order.pk)
+        order.status, order.total_amount = 'delivered', Decimal('12.00')
+        order.save()
+        self.assertStatisticsConsistent()
+
+        # Перенос заказа другому пользователю меняет обе строки
+        order.user_id = 2
+        order.save()
+        self.assertEqual(self.assertStatisticsConsistent()['total_orders'], 0)
+        self.assertEqual(self.assertStatisticsConsistent(2)['total_spent'], Decimal('17.00'))
+
+        Order.objects.filter(pk__in=[order.pk, other.pk]).delete()
+        self.assertEqual(self.assertStatisticsConsistent(2)['total_orders'], 0)
+
+    def test_for_user_builds_missing_row(self):
+        self.create_order('10.00')
+        OrderStatistics.objects.all().delete()
+        stats = OrderStatistics.for_user(self.user_id)
+        self.assertEqual(stats, OrderStatistics.compute(self.user_id))
+        with self.assertNumQueries(1):
+            self.assertEqual(OrderStatistics.for_user(self.user_id), stats)
+
+    def test_rebuild_command_fixes_drift(self):
+        self.create_order('10.00')
+        self.create_order('7.00', user_id=2)
+        OrderStatistics.objects.update(total_orders=99, total_spent=Decimal('1.00'))
+
+        out = StringIO()
+        call_command('rebuild_order_statistics', stdout=out)
+        self.assertIn('Rebuilt order statistics for 2 users', out.getvalue())
+        self.assertStatisticsConsistent()
+        self.assertStatisticsConsistent(2)
+
+
+class ORJSONRendererTests(TestCase):
+
+    def test_matches_stock_renderer_on_order_payload(self):
+        order = Order.objects.create(user_id=1, total_amount=Decimal('30.00'), shipping_address='Test street 1')
+        OrderItem.objects.create(order=order, product_id=1, product_name='Товар', quantity=3, price=Decimal('10.00'))
+        data = OrderSerializer(Order.objects.with_items().get()).data
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_decimals_are_exact_and_datetimes_native(self):
+        data = {'price': Decimal('0.10') + Decimal('0.20'), 'big': Decimal('12345678901234567890.12'),
+                'at': datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc), 1: 'one'}
+        self.assertEqual(orjson.loads(ORJSONRenderer().render(data)),
+                         {'price': '0.30', 'big': '12345678901234567890.12', 'at': '2024-01-02T03:04:05Z', '1': 'one'})
+
+    def test_invalid_body_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"shipping_data": '))
+        self.assertEqual(ORJSONParser().parse(BytesIO(b'{"price": 19.99}')), {'price': 19.99})
+
+
+class OrderFlatSerializerTests(TestCase):
+    """Плоский сериализатор выдаёт тот же JSON, что и OrderSerializer."""
+
+    def setUp(self):
+        for index, status in enumerate(['pending', 'confirmed', 'cancelled']):
+            order = Order.objects.create(user_id=1, status=status, total_amount=Decimal('1234.5'),
+                                         shipping_address=f'Улица {index}, дом 1')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=i, product_name=f'Товар {i}', quantity=i + 1,
+                          price=Decimal('0.10') * (i + 1))
+                for i in range(index)
+            ])
+
+    def test_output_is_identical(self):
+        queryset = Order.objects.all()
+        expected = JSONRenderer().render(OrderSerializer(queryset.with_items(), many=True).data)
+        serializer = OrderFlatSerializer()
+        self.assertEqual(JSONRenderer().render(serializer.serialize(serializer.values(queryset))), expected)
+
+    def test_field_selection_reads_only_required_columns(self):
+        serializer = OrderFlatSerializer(fields={'id', 'total_quantity'})
+        with self.assertNumQueries(2):
+            rows = serializer.serialize(serializer.values(Order.objects.all()))
+        self.assertEqual(rows, [{'id': order.id, 'total_quantity': sum(item.quantity for item in order.items.all())}
+                                for order in Order.objects.all()])
+        self.assertNotIn('shipping_address', serializer.lookups)
+
+    def test_decimals_round_like_drf(self):
+        drf_field = OrderItemSerializer().fields['subtotal']
+        flat_field = FlatDecimalField()
+        for value in ('0.125', '0.135', '2.675', '-0.125', '7'):
+            with self.subTest(value):
+                expected = drf_field.to_representation(Decimal(value))
+                self.assertEqual(format_decimal(Decimal(value)), expected)
+                self.assertEqual(flat_field.convert(Decimal(value)), expected)
+        self.assertEqual(format_decimal(Decimal('0.125')), '0.13')
@@ -4,13 +4,20 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from .models import Order, OrderItem
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from shop_common.fieldsets import SparseFieldsetViewMixin
+from shop_common.flat import FlatListMixin
+from shop_common.pagination import PageOrCursorPagination
+from .models import Order, OrderItem, OrderStatistics
 from .serializers import (
-    OrderSerializer, CreateOrderSerializer,
+    OrderSerializer, OrderFlatSerializer, CreateOrderSerializer,
     UpdateOrderStatusSerializer
 )
 from .services import CartService, ProductService, UserService, event_bus
 import logging
+from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
@@ -20,22 +27,40 @@ class IsAuthenticatedCustom:
         return hasattr(request, 'user_id') and request.user_id is not None
 
 
-class OrderListView(generics.ListAPIView):
+class OrderListView(SparseFieldsetViewMixin, FlatListMixin, generics.ListAPIView):
     """Список заказов пользователя."""
     serializer_class = OrderSerializer
+    flat_serializer_class = OrderFlatSerializer
     permission_classes = [IsAuthenticatedCustom]
+    pagination_class = PageOrCursorPagination
+    cursor_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        return Order.objects.filter(user_id=self.request.user_id)
+        return Order.objects.filter(user_id=self.request.user_id).with_items()
 
 
-class OrderDetailView(generics.RetrieveAPIView):
+def order_validators(request, pk):
+    """ETag и Last-Modified заказа по updated_at: один запрос без сериализации."""
+    if not hasattr(request, 'order_validators'):
+        updated_at = (Order.objects.filter(id=pk, user_id=request.user_id)
+                      .values_list('updated_at', flat=True).first())
+        request.order_validators = (None, None) if updated_at is None else (
+            f"{pk}-{int(updated_at.timestamp() * 1_000_000)}", updated_at
+        )
+    return request.order_validators
+
+
+@method_decorator(condition(etag_func=lambda request, pk: order_validators(request, pk)[0],
+                            last_modified_func=lambda request, pk: order_validators(request, pk)[1]),
+                  name='get')
+class OrderDetailView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """Детали заказа."""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticatedCustom]
 
     def get_object(self):
-        return get_object_or_404(Order, id=self.kwargs['pk'], user_id=self.request.user_id)
+        return get_object_or_404(self.filter_queryset(Order.objects.with_items()),
+                                 id=self.kwargs['pk'], user_id=self.request.user_id)
 
 
 @api_view(['POST'])
@@ -93,37 +118,41 @@ def create_order(request):
             if not user_name:
                 user_name = f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
 
-            #создаем заказ
-            order = Order.objects.create(
-                user_id=user_id,
-                user_email=customer_info.get('email', user_data.get('email', '')),
-                user_name=user_name,
-                shipping_address=shipping_adress,
-                total_amount=cart_data['total_amount'],
-            )
-            logger.info("Order created with id %s for user_id: %s", order.id, user_id)
-
-            # создаем позиции заказа
-            order_items = []
-            for cart_item in cart_data['items']:
-                order_item = OrderItem(
-                    order=order,
-                    product_id=cart_item['product_id'],
-                    product_name=cart_item['product_name'],
-                    quantity=cart_item['quantity'],
-                    price=cart_item['price']
-                )
-                order_items.append({
-                    'product_id': order_item.product_id,
-                    'product_name': order_item.product_name,
-                    'quantity': order_item.quantity,
-                    'price': float(order_item.price)
-                })
-
-            # сохраняем  специальные инструкции, если есть
+            # добавляем специальные инструкции, если есть
+            shipping_address = shipping_adress
             if special_instructions:
-                order.shipping_address += f"\n\nSpecial Instructions: {special_instructions}"
-                order.save()
+                shipping_address += f"\n\nSpecial Instructions: {special_instructions}"
+
+            with transaction.atomic():
+                #создаем заказ
+                order = Order.objects.create(
+                    user_id=user_id,
+                    user_email=customer_info.get('email', user_data.get('email', '')),
+                    user_name=user_name,
+                    shipping_address=shipping_address,
+                    total_amount=Decimal(str(cart_data['total_amount'])),
+                )
+                logger.info("Order created with id %s for user_id: %s", order.id, user_id)
+
+                # создаем позиции заказа
+                items = []
+                order_items = []
+                for cart_item in cart_data['items']:
+                    order_item = OrderItem(
+                        order=order,
+                        product_id=cart_item['product_id'],
+                        product_name=cart_item['product_name'],
+                        quantity=cart_item['quantity'],
+                        price=Decimal(cart_item['price'])
+                    )
+                    items.append(order_item)
+                    order_items.append({
+                        'product_id': order_item.product_id,
+                        'product_name': order_item.product_name,
+                        'quantity': order_item.quantity,
+                        'price': order_item.price
+                    })
+                OrderItem.objects.bulk_create(items)
 
             # отправляем событие о создании заказа
 
@@ -131,7 +160,7 @@ def create_order(request):
                 'order_id': order.id,
                 'user_id': user_id,
                 'items': order_items,
-                'total_amount': float(order.total_amount),
+                'total_amount': order.total_amount,
                 'customer_info': customer_info,
             })
 
@@ -158,7 +187,7 @@ def create_order(request):
 @permission_classes([IsAuthenticatedCustom])
 def update_order_status(request, pk):
     """Обновление статуса заказа (только для администраторов)"""
-    order = get_object_or_404(Order, id=pk)
+    order = get_object_or_404(Order.objects.with_items(), id=pk)
 
     serializer = UpdateOrderStatusSerializer(data=request.data)
     if serializer.is_valid():
@@ -171,8 +200,9 @@ def update_order_status(request, pk):
                 'error': f'Invalid status transition from {old_status} to {new_status}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
+        with transaction.atomic():
+            order.status = new_status
+            order.save()
 
         # Публикуем событие об изменении статуса
         event_bus.publish_event('order.status_changed', {
@@ -219,18 +249,10 @@ def is_valid_status_transition(old_status: str, new_status: str) -> bool:
 def order_statistics(request):
     """Статистика заказов пользователя"""
     user_id = request.user_id
-    orders = Order.objects.filter(user_id=user_id)
-
-    stats = {
-        'total_orders': orders.count(),
-        'pending_orders': orders.filter(status='pending').count(),
-        'confirmed_orders': orders.filter(status='confirmed').count(),
-        'shipped_orders': orders.filter(status='shipped').count(),
-        'delivered_orders': orders.filter(status='delivered').count(),
-        'cancelled_orders': orders.filter(status='cancelled').count(),
-        'total_spent': sum(order.total_amount for order in orders if order.status != 'cancelled')
-    }
-
-    return Response(stats)
 
+    if settings.ORDER_STATISTICS_TABLE:
+        stats = OrderStatistics.for_user(user_id)
+    else:
+        stats = OrderStatistics.compute(user_id)
 
+    return Response(stats)
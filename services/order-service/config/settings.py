@@ -69,8 +69,14 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson: быстрее стандартного JSONRenderer, Decimal выводится строкой без потерь
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shop_common.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'shop_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -93,7 +99,13 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Статистика заказов из таблицы OrderStatistics, обновляемой при изменении заказов;
+# False - агрегирующий запрос по заказам при каждом обращении
+ORDER_STATISTICS_TABLE = True
+
 # Service URLs
+# Транспорт клиентов сервисов: shop_common.transport.HttpTransport или LocalServiceTransport
+SERVICE_TRANSPORT = 'shop_common.transport.HttpTransport'
 PRODUCT_SERVICE_URL = 'http://localhost:8001'
 CART_SERVICE_URL = 'http://localhost:8002'
 USER_SERVICE_URL = 'http://localhost:8004'
@@ -101,4 +113,12 @@ USER_SERVICE_URL = 'http://localhost:8004'
 # Redis settings
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
-REDIS_DB = 0
\ No newline at end of file
+REDIS_DB = 0
+
+# Шина событий: отдельный поток на каждый тип события.
+# Хранилище: shop_common.event_backends.RedisEventBackend или InMemoryEventBackend
+EVENT_BACKEND = 'shop_common.event_backends.RedisEventBackend'
+EVENT_STREAM_PREFIX = 'events'
+EVENT_STREAM_MAXLEN = 100000
+# Формат событий: 'msgpack' (по умолчанию) или 'json'
+EVENT_CODEC = 'msgpack'
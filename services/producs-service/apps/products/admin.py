@@ -1,9 +1,12 @@
 # ===== services/product-service/apps/products/admin.py =====
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import Category, Product
+from .suggest import suggest_index
+from .surrogate import purge_products
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -13,11 +16,15 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(products_total=Count('products'))
+
     def products_count(self, obj):
-        count = obj.products.count()
+        count = obj.products_total
         url = reverse('admin:products_product_changelist') + f'?category__id__exact={obj.id}'
         return format_html('<a href="{}">{} products</a>', url, count)
     products_count.short_description = 'Products Count'
+    products_count.admin_order_field = 'products_total'
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -83,12 +90,18 @@ class ProductAdmin(admin.ModelAdmin):
     actions = ['make_active', 'make_inactive', 'duplicate_products']
 
     def make_active(self, request, queryset):
+        product_ids = list(queryset.values_list('id', flat=True))
         count = queryset.update(is_active=True)
+        suggest_index.refresh_products(product_ids)
+        purge_products(product_ids, categories=True)
         self.message_user(request, f'{count} products were successfully activated.')
     make_active.short_description = "Activate selected products"
 
     def make_inactive(self, request, queryset):
+        product_ids = list(queryset.values_list('id', flat=True))
         count = queryset.update(is_active=False)
+        suggest_index.refresh_products(product_ids)
+        purge_products(product_ids, categories=True)
         self.message_user(request, f'{count} products were successfully deactivated.')
     make_inactive.short_description = "Deactivate selected products"
 
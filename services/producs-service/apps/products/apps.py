@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_indexes(sender, using, **kwargs):
+    from django.db import connections
+    from .search import install_search_indexes
+
+    install_search_indexes(connections[using])
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.products"
+
+    def ready(self):
+        from . import checks, suggest, surrogate  # noqa: F401 - проверки настроек, сигналы подсказок и очистки кэшей
+
+        post_migrate.connect(ensure_search_indexes, sender=self)
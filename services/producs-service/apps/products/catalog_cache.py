@@ -0,0 +1,224 @@
+import math
+import time
+import random
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+VERSION_KEY = 'products:catalog-version'
+LIST_VERSION_KEY = 'products:list-version'
+MODIFIED_KEY = 'products:catalog-modified'
+
+# Параметры, не влияющие на состав выборки
+IGNORED_PARAMS = {'page', 'cursor', 'pagination', 'ordering'}
+
+# Сколько ждать результата запроса, который уже пересчитывает значение
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.01
+
+
+def get_catalog_cache():
+    """Кэш каталога из CACHES по псевдониму CATALOG_CACHE (память процесса или Redis)."""
+    return caches[settings.CATALOG_CACHE]
+
+
+def _version(key) -> int:
+    cache = get_catalog_cache()
+    version = cache.get(key)
+    if version is None:
+        # Версия по времени не совпадёт с версиями ключей, записанных до вытеснения
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def catalog_version() -> int:
+    """Текущая версия каталога; входит в ключи всех кэшированных ответов."""
+    return _version(VERSION_KEY)
+
+
+def product_list_version() -> int:
+    """Версия списков товаров: меняется при любом изменении товара, включая остаток."""
+    return _version(LIST_VERSION_KEY)
+
+
+def catalog_last_modified() -> Optional[datetime]:
+    """Время последнего изменения каталога (или первого обращения после очистки кэша)."""
+    cache = get_catalog_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        cache.add(MODIFIED_KEY, time.time(), timeout=None)
+        modified = cache.get(MODIFIED_KEY)
+    return None if modified is None else datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def _bump(key):
+    cache = get_catalog_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+
+def bump_catalog_version():
+    """Делает устаревшими все кэшированные ответы каталога."""
+    _bump(VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    transaction.on_commit(bump_catalog_version)
+
+
+def bump_product_list_version():
+    """Делает устаревшими кэшированные списки товаров (остаток и updated_at есть в каждом элементе)."""
+    _bump(LIST_VERSION_KEY)
+
+
+def bump_product_list_version_on_commit():
+    transaction.on_commit(bump_product_list_version)
+
+
+def _signature(params) -> str:
+    return hashlib.sha1(urlencode(sorted(params)).encode()).hexdigest()
+
+
+def filter_signature(query_params) -> str:
+    """Хэш параметров запроса, определяющих выборку, независимо от их порядка."""
+    return _signature(
+        (key, value)
+        for key, values in query_params.lists() if key not in IGNORED_PARAMS
+        for value in values
+    )
+
+
+def catalog_cache_key(prefix: str, query_params) -> str:
+    return f"products:{prefix}:{catalog_version()}:{filter_signature(query_params)}"
+
+
+def request_signature(request) -> str:
+    """Хэш пути и всех параметров запроса в нормализованном порядке."""
+    params = [(key, value) for key, values in request.query_params.lists() for value in values]
+    return _signature([('', request.path)] + params)
+
+
+def response_cache_key(request, etag) -> str:
+    """Ключ ответа: ETag ресурса (версия каталога и состояние объекта) и параметры запроса."""
+    return f"products:response:{etag}:{request_signature(request)}"
+
+
+def get_or_compute(key, compute, timeout):
+    """Значение из кэша каталога с защитой от одновременного пересчёта.
+
+    При промахе значение считает один запрос (блокировка через cache.add),
+    остальные ждут его результат до LOCK_WAIT секунд. Незадолго до истечения
+    срока значение пересчитывается заранее с вероятностью, растущей к концу
+    срока (probabilistic early expiration), поэтому горячие ключи не истекают
+    одновременно у всех запросов.
+    """
+    cache = get_catalog_cache()
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, compute_time = entry
+        early = compute_time * settings.CATALOG_CACHE_EARLY_REFRESH * -math.log(1.0 - random.random())
+        if time.time() + early < expires_at:
+            return value
+        # Ранний пересчёт: остальные запросы продолжают получать текущее значение
+
+    lock_key = f'{key}:lock'
+    locked = entry is None and cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if entry is None and not locked:
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+
+    try:
+        started = time.monotonic()
+        value = compute()
+        cache.set(key, (value, time.time() + timeout, time.monotonic() - started), timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+class CachedResponseMixin:
+    """Кэширование успешных GET-ответов представления в кэше каталога.
+
+    Хранятся данные ответа после сериализации; ключ включает ETag ресурса,
+    поэтому изменение каталога или самого объекта делает ответ устаревшим.
+    ETag списка - версия каталога (и версия списков товаров для
+    product_list), хэш URL, число строк выборки и наибольший modified_field
+    из одного агрегирующего запроса; ETag карточки - версия, pk
+    и modified_field объекта из одного запроса values_list. Для
+    несуществующего объекта валидаторов нет: If-None-Match (и *) не
+    превращает 404 в 304.
+    """
+    # Поле, которое меняется при каждом сохранении объекта
+    modified_field = None
+    # Список товаров: его элементы меняются при любом сохранении товара
+    product_list = False
+
+    def get_validators(self) -> Tuple[Optional[str], Optional[datetime]]:
+        """(ETag, Last-Modified) ответа; (None, None) без кэша каталога или объекта."""
+        version = catalog_version()
+        if version is None:
+            return None, None
+        last_modified = catalog_last_modified()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            if self.product_list:
+                version = f"{version}-{product_list_version()}"
+            etag = f"{version}-{request_signature(self.request)}"
+            if not self.modified_field:
+                return etag, last_modified
+            # Состояние строк выборки: запись в обход версий не оставит устаревший 304
+            rows = (self.filter_queryset(self.get_queryset()).order_by()
+                    .aggregate(count=Count('pk'), modified=Max(self.modified_field)))
+            return self.modified_validators(f"{etag}-{rows['count']}", rows['modified'], last_modified)
+
+        fields = ['pk'] + ([self.modified_field] if self.modified_field else [])
+        row = (self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+               .values_list(*fields).first())
+        if row is None:
+            return None, None
+        if not self.modified_field:
+            return f"{version}-{row[0]}", last_modified
+        return self.modified_validators(f"{version}-{row[0]}", row[1], last_modified)
+
+    @staticmethod
+    def modified_validators(etag, modified, last_modified):
+        """Добавляет к ETag и Last-Modified время изменения объекта или выборки (None - пустая)."""
+        if modified is None:
+            return etag, last_modified
+        etag = f"{etag}-{int(modified.timestamp() * 1_000_000)}"
+        return etag, modified if last_modified is None else max(modified, last_modified)
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        conditional = condition(etag_func=lambda request, *args, **kwargs: etag,
+                                last_modified_func=lambda request, *args, **kwargs: last_modified)
+        return conditional(self.get_cached)(request, etag, *args, **kwargs)
+
+    def get_cached(self, request, etag, *args, **kwargs):
+        def compute():
+            response = super(CachedResponseMixin, self).get(request, *args, **kwargs)
+            return response.status_code, response.data
+
+        key = response_cache_key(request, etag)
+        status_code, data = get_or_compute(key, compute, settings.CATALOG_CACHE_TIMEOUT)
+        if status_code != 200:
+            get_catalog_cache().delete(key)
+        return Response(data, status=status_code)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Бэкенды, у которых своё содержимое в каждом процессе
+PROCESS_LOCAL_CACHES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register(Tags.caches, deploy=True)
+def check_catalog_cache(app_configs, **kwargs):
+    """Вне DEBUG версия каталога должна быть общей для всех процессов сервиса (manage.py check --deploy)."""
+    backend = settings.CACHES.get(settings.CATALOG_CACHE, {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"CATALOG_CACHE '{settings.CATALOG_CACHE}' uses {backend}, which is separate in every process",
+        hint="Use a shared backend such as django.core.cache.backends.redis.RedisCache: with a per-process "
+             "cache, catalog versions and cached responses diverge between workers.",
+        id='products.E001',
+    )]
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+
+def price_ranges():
+    """Диапазоны цен [min, max) по границам из PRODUCT_FACET_PRICE_BUCKETS."""
+    edges = [Decimal(str(edge)) for edge in settings.PRODUCT_FACET_PRICE_BUCKETS]
+    return list(zip([None] + edges, edges + [None]))
+
+
+def compute_facets(queryset, filters):
+    """Счётчики по категориям, диапазонам цен и наличию за один GROUP BY по категориям.
+
+    filters — условия активных фасетных фильтров {'category': Q, 'price': Q, 'stock': Q};
+    queryset ими не сужен. Счётчики каждого фасета учитывают все фильтры, кроме
+    его собственного (disjunctive faceting): выбранная категория не скрывает
+    остальные, а диапазон цен — соседние диапазоны. Все счётчики — условные
+    агрегаты одного запроса, суммируемые по категориям.
+    """
+    def without(*excluded):
+        condition = Q()
+        for name in ('category', 'price', 'stock'):
+            if name not in excluded:
+                condition &= filters.get(name, Q())
+        return condition or None
+
+    ranges = price_ranges()
+    aggregates = {
+        'matched': Count('id', filter=without()),
+        'in_category': Count('id', filter=without('category')),
+        'stock_total': Count('id', filter=without('stock')),
+        'in_stock': Count('id', filter=Q(stock_quantity__gt=0) & (without('stock') or Q())),
+    }
+    for index, (low, high) in enumerate(ranges):
+        condition = without('price') or Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('id', filter=condition or None)
+
+    rows = list(
+        queryset.order_by()
+        .values('category_id', 'category__name', 'category__slug')
+        .annotate(**aggregates)
+        .order_by('category__name')
+    )
+
+    in_stock = sum(row['in_stock'] for row in rows)
+    return {
+        'total': sum(row['matched'] for row in rows),
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'],
+             'slug': row['category__slug'], 'count': row['in_category']}
+            for row in rows if row['in_category']
+        ],
+        'price_ranges': [
+            {'min': str(low) if low is not None else None,
+             'max': str(high) if high is not None else None,
+             'count': sum(row[f'price_{index}'] for row in rows)}
+            for index, (low, high) in enumerate(ranges)
+        ],
+        'stock': {'in_stock': in_stock, 'out_of_stock': sum(row['stock_total'] for row in rows) - in_stock},
+    }
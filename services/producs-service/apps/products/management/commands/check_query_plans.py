@@ -0,0 +1,71 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from shop_common.query_plans import analyze, check_plans, seeded_test_database
+from ...models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN QUERY PLAN основных запросов представлений на заполненной тестовой БД; ошибка при полном сканировании'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=250, help='Товаров в категории')
+
+    def seed(self, categories, products_per_category):
+        Category.objects.bulk_create([
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(categories)
+        ])
+        Product.objects.bulk_create([
+            Product(name=f'Product {category_id}-{i}', category_id=category_id,
+                    price=Decimal(random.randint(100, 100000)) / 100,
+                    stock_quantity=random.choice([0, 0, 5, 10, 100]),
+                    is_active=random.random() > 0.1)
+            for category_id in Category.objects.values_list('id', flat=True)
+            for i in range(products_per_category)
+        ])
+        analyze()
+
+    def scenarios(self):
+        category = Category.objects.first()
+        product_id = Product.objects.values_list('id', flat=True).last()
+
+        def cursor_pages(params):
+            def request(client):
+                first = client.get('/api/products/', {'pagination': 'cursor', **params})
+                return client.get(first.json()['next'])
+            return request
+
+        def products(params):
+            return lambda client: client.get('/api/products/', params)
+
+        return [
+            ('product list', products({})),
+            ('product list, cursor', cursor_pages({})),
+            ('product list, cursor by price', cursor_pages({'ordering': '-price'})),
+            ('product list, category', products({'category': category.id})),
+            ('product list, price range', products({'min_price': '100', 'max_price': '200'})),
+            ('product list, in stock', products({'in_stock': 'true'})),
+            ('product list, category in stock by price',
+             products({'category': category.id, 'in_stock': 'true', 'min_price': '10', 'ordering': 'price'})),
+            ('product search', products({'search': 'product 1'})),
+            ('product search, category by price', products({'search': 'product', 'category': category.id,
+                                                           'ordering': 'price'})),
+            ('product facets', lambda client: client.get('/api/products/facets/')),
+            ('product facets, search in stock',
+             lambda client: client.get('/api/products/facets/', {'search': 'product 1', 'in_stock': 'true'})),
+            ('product detail', lambda client: client.get(f'/api/products/{product_id}/')),
+            ('category list', lambda client: client.get('/api/categories/')),
+            ('category search', lambda client: client.get('/api/categories/', {'search': 'category'})),
+            ('category detail', lambda client: client.get(f'/api/categories/{category.slug}/')),
+        ]
+
+    def handle(self, *args, **options):
+        with seeded_test_database():
+            self.seed(options['categories'], options['products'])
+            full_scans = check_plans(self.scenarios(), self.stdout.write)
+
+        if full_scans:
+            raise CommandError('Full table scans: ' + '; '.join(f"{label}: {detail}" for label, detail, _ in full_scans))
+        self.stdout.write(self.style.SUCCESS('No full table scans'))
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_cursor_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_price_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_active_name_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["created_at", "id", "is_active"],
+                name="product_active_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["price", "id", "is_active"],
+                name="product_active_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["name", "id", "is_active"],
+                name="product_active_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["category", "created_at", "id", "is_active"],
+                name="product_active_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("stock_quantity__gt", 0)),
+                fields=["created_at", "id", "is_active", "stock_quantity"],
+                name="product_in_stock_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from apps.products.search import install_search_indexes
+
+    install_search_indexes(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from apps.products.search import uninstall_search_indexes
+
+    uninstall_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_product_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sales_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
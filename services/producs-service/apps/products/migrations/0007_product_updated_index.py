@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_sales_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["updated_at", "id", "is_active"],
+                name="product_active_updated_idx",
+            ),
+        ),
+    ]
@@ -1,12 +1,32 @@
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, When, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from django.utils.text import slugify
 
+class CategoryQuerySet(models.QuerySet):
+
+    def with_products_count(self):
+        """Количество активных товаров считается в том же запросе.
+
+        Подзапрос вместо JOIN с GROUP BY: COUNT(*) пагинации его отбрасывает
+        и не сканирует таблицу категорий.
+        """
+        active_products = (
+            Product.objects.filter(category=OuterRef('pk'), is_active=True)
+            .order_by().values('category').annotate(count=Count('id')).values('count')
+        )
+        return self.annotate(active_products_count=Coalesce(Subquery(active_products), 0))
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField( unique=True, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
@@ -29,11 +49,33 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     image_url = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Зарезервировано единиц за всё время: популярность для подсказок поиска
+    sales_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['created_at']
+        # Частичные индексы только по активным товарам: каталог всегда фильтрует is_active.
+        # is_active в конце ключа делает индекс покрывающим для COUNT(*) пагинации.
+        indexes = [
+            # Курсорная пагинация каталога по допустимым сортировкам
+            models.Index(fields=['created_at', 'id', 'is_active'], condition=Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['price', 'id', 'is_active'], condition=Q(is_active=True),
+                         name='product_active_price_idx'),
+            models.Index(fields=['name', 'id', 'is_active'], condition=Q(is_active=True),
+                         name='product_active_name_idx'),
+            # Фильтр по категории с сортировкой по умолчанию
+            models.Index(fields=['category', 'created_at', 'id', 'is_active'], condition=Q(is_active=True),
+                         name='product_active_category_idx'),
+            # Валидаторы списка: COUNT и MAX(updated_at) по выборке
+            models.Index(fields=['updated_at', 'id', 'is_active'], condition=Q(is_active=True),
+                         name='product_active_updated_idx'),
+            # Фильтр in_stock=true
+            models.Index(fields=['created_at', 'id', 'is_active', 'stock_quantity'],
+                         condition=Q(is_active=True, stock_quantity__gt=0), name='product_in_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -47,12 +89,46 @@ class Product(models.Model):
         """Резервирует указанное количество товара, если достаточно на складе."""
         if self.stock_quantity >= quantity:
             self.stock_quantity -= quantity
+            self.sales_count += quantity
             self.save()
             return True
         return False
 
     def release_quantity(self, quantity):
-        """Освобождает указанное количество товара обратно на склад."""
+        """Освобождает указанное количество товара обратно на склад и вычитает его из продаж."""
         self.stock_quantity += quantity
+        self.sales_count = max(self.sales_count - quantity, 0)
         self.save()
 
+    @classmethod
+    def release_quantities(cls, quantities):
+        """Освобождает товары нескольких позиций одним UPDATE, вычитая их из продаж.
+
+        quantities: словарь product_id -> количество.
+        """
+        if not quantities:
+            return 0
+        increment = Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            output_field=models.PositiveIntegerField()
+        )
+        return cls.objects.filter(id__in=quantities).update(
+            stock_quantity=F('stock_quantity') + increment,
+            sales_count=Greatest(F('sales_count') - increment, Value(0)),
+            updated_at=timezone.now()
+        )
+
+
+class ProcessedEvent(models.Model):
+    """Журнал обработанных событий для защиты от повторной доставки."""
+    event_id = models.UUIDField(primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.event_id)
+
+    @classmethod
+    def purge_expired(cls, retention):
+        """Удаляет записи старше срока хранения."""
+        deleted, _ = cls.objects.filter(processed_at__lt=timezone.now() - retention).delete()
+        return deleted
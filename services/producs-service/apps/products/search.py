@@ -0,0 +1,111 @@
+import re
+from typing import Optional
+
+from django.db import connection
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+# Полнотекстовые индексы FTS5: таблица модели -> веса колонок для bm25
+FTS_INDEXES = {
+    'products_product': {'name': 10.0, 'description': 1.0},
+    'products_category': {'name': 10.0, 'description': 1.0},
+}
+
+TOKEN = re.compile(r'\w+')
+
+# Более короткие слова ищутся целиком: префикс из 1-2 букв совпадает
+# с большей частью каталога, и ранжирование всех совпадений стоит дорого
+MIN_PREFIX_LENGTH = 3
+
+
+def fts_table(table: str) -> str:
+    return f'{table}_fts'
+
+
+def _fts_statements(table, columns):
+    fts = fts_table(table)
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def install_search_indexes(schema_connection=connection):
+    """Создаёт таблицы FTS5 и триггеры синхронизации, если их нет.
+
+    Индекс хранит только словарь (external content), сами тексты читаются
+    из таблицы модели. Вызывается из миграции и после каждого migrate:
+    SQLite пересоздаёт таблицу при некоторых ALTER, и её триггеры теряются.
+    """
+    if schema_connection.vendor != 'sqlite':
+        return
+    with schema_connection.cursor() as cursor:
+        for table, weights in FTS_INDEXES.items():
+            fts = fts_table(table)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts])
+            created = cursor.fetchone() is None
+            if created:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(weights)}, "
+                    f"content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2', prefix='3 4')"
+                )
+            for statement in _fts_statements(table, weights):
+                cursor.execute(statement)
+            if created:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall_search_indexes(schema_connection=connection):
+    if schema_connection.vendor != 'sqlite':
+        return
+    with schema_connection.cursor() as cursor:
+        for table in FTS_INDEXES:
+            fts = fts_table(table)
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Запрос MATCH из пользовательской строки: все слова обязательны, каждое - как префикс."""
+    tokens = TOKEN.findall(text)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' if len(token) >= MIN_PREFIX_LENGTH else f'"{token}"' for token in tokens)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """Поиск ?search= по индексу FTS5 с ранжированием bm25.
+
+    Без явного ?ordering= результаты упорядочены по релевантности, поэтому
+    фильтр должен стоять после OrderingFilter. Для таблиц без индекса
+    и на других БД работает как обычный SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        table = queryset.model._meta.db_table
+        if connection.vendor != 'sqlite' or table not in FTS_INDEXES:
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(' '.join(self.get_search_terms(request)))
+        if match is None:
+            return queryset
+
+        fts = fts_table(table)
+        weights = ', '.join(str(weight) for weight in FTS_INDEXES[table].values())
+        # JOIN с виртуальной таблицей: MATCH выполняется один раз, строки товара читаются по rowid
+        queryset = queryset.extra(
+            select={'search_rank': f"bm25({fts}, {weights})"},
+            tables=[fts],
+            where=[f"{fts}.rowid = {table}.id", f"{fts} MATCH %s"],
+            params=[match],
+        )
+        if request.query_params.get(OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by('search_rank', 'pk')
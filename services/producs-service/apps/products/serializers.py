@@ -1,8 +1,11 @@
 from rest_framework import serializers
+from shop_common.fieldsets import SparseFieldsetMixin
+from shop_common.flat import FlatDateTimeField, FlatDecimalField, FlatField, FlatMethodField, FlatSerializer
 from .models import Product, Category
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     products_count = serializers.SerializerMethodField()
+    fieldset_required = ('id', 'slug')
 
     class Meta:
         model = Category
@@ -15,12 +18,16 @@ class CategorySerializer(serializers.ModelSerializer):
             'created_at',
 
         ]
+        # products_count берётся из аннотации запроса
+        field_dependencies = {'products_count': []}
 
     def get_products_count(self, obj):
+        if hasattr(obj, 'active_products_count'):
+            return obj.active_products_count
         return obj.products.filter(is_active=True).count()
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_in_stock = serializers.BooleanField(read_only=True)
 
@@ -40,6 +47,23 @@ class ProductSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
+        field_dependencies = {'is_in_stock': ['stock_quantity']}
+
+class ProductFlatSerializer(FlatSerializer):
+    """Плоский вариант ProductSerializer для списка товаров: тот же JSON без создания моделей."""
+    model = Product
+    id = FlatField()
+    name = FlatField()
+    description = FlatField()
+    price = FlatDecimalField()
+    category = FlatField('category_id')
+    category_name = FlatField('category__name')
+    stock_quantity = FlatField()
+    is_in_stock = FlatMethodField(lambda row: row['stock_quantity'] > 0, requires=('stock_quantity',))
+    image_url = FlatField()
+    is_active = FlatField()
+    created_at = FlatDateTimeField()
+    updated_at = FlatDateTimeField()
 
 class ProductDetailSerializer(ProductSerializer):
     """ОБработка детальной информации о продукте с вложенной категорией."""
@@ -58,3 +82,15 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             'image_url',
             'is_active',
         ]
+
+
+class AvailabilityItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class BatchAvailabilitySerializer(serializers.Serializer):
+    """Запрос пакетной проверки доступности: товары и количества."""
+    MAX_ITEMS = 100
+
+    items = serializers.ListField(child=AvailabilityItemSerializer(), min_length=1, max_length=MAX_ITEMS)
@@ -0,0 +1,258 @@
+import re
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r'\w+')
+
+MAX_LIMIT = 20
+CACHE_SIZE = 10000
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace('ё', 'е').strip()
+
+
+class SuggestIndex:
+    """Индекс подсказок по префиксу в памяти процесса.
+
+    Отсортированный список ключей (название, начиная с каждого слова) и bisect:
+    подсказки для префикса - непрерывный диапазон списка. Результаты по префиксу
+    кэшируются и сбрасываются только для префиксов изменившихся названий.
+
+    Изменения своего процесса приходят через сигналы; чтобы подхватывать
+    изменения других процессов, индекс раз в SUGGEST_INDEX_TTL секунд
+    перестраивается в фоновом потоке и подменяется целиком, а запросы
+    до этого обслуживает прежний индекс. Синхронно строится только первый.
+    """
+    # Состояние, которое перестройка подменяет целиком
+    STATE = ('_keys', '_entries', '_cache', '_products', '_category_popularity')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._refreshing = False
+        # Изменения, пришедшие во время перестройки: применяются к новому индексу
+        self._journal = None
+        self._keys = []
+        self._entries = {}
+        self._cache = {}
+        # product_id -> (category_id, популярность) для популярности категорий
+        self._products = {}
+        self._category_popularity = defaultdict(int)
+
+    def invalidate(self):
+        """Полная перестройка при следующем обращении."""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            self.refresh()
+        elif time.monotonic() - self._loaded_at >= settings.SUGGEST_INDEX_TTL and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, name='suggest-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing suggest index: {e}")
+        finally:
+            self._refreshing = False
+            connections.close_all()
+
+    def refresh(self):
+        """Перестройка из БД без блокировки запросов и атомарная подмена индекса."""
+        with self._lock:
+            self._journal = []
+        fresh = SuggestIndex()
+        try:
+            fresh._load()
+        finally:
+            with self._lock:
+                journal, self._journal = self._journal, None
+        with self._lock:
+            for name in self.STATE:
+                setattr(self, name, getattr(fresh, name))
+            self._loaded_at = time.monotonic()
+            for method, args in journal:
+                method(*args)
+
+    def _record(self, method, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def _load(self):
+        self._keys, self._entries, self._cache = [], {}, {}
+        self._products, self._category_popularity = {}, defaultdict(int)
+
+        for product in Product.objects.filter(is_active=True).values('id', 'name', 'category_id', 'sales_count'):
+            self._products[product['id']] = (product['category_id'], product['sales_count'])
+            self._category_popularity[product['category_id']] += product['sales_count']
+            self._add(('product', product['id']), product['name'], product['sales_count'], {})
+
+        for category in Category.objects.values('id', 'name', 'slug'):
+            self._add(('category', category['id']), category['name'],
+                      self._category_popularity[category['id']], {'slug': category['slug']})
+
+        self._keys.sort()
+
+    def _add(self, entry_key, name, popularity, extra, keep_sorted=False):
+        normalized = normalize(name)
+        keys = [normalized[match.start():] for match in WORD.finditer(normalized)] or [normalized]
+        self._entries[entry_key] = {'name': name, 'popularity': popularity, 'keys': keys, **extra}
+        for key in keys:
+            if keep_sorted:
+                insort(self._keys, (key, entry_key))
+            else:
+                self._keys.append((key, entry_key))
+        self._forget(keys)
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for key in entry['keys']:
+            position = bisect_left(self._keys, (key, entry_key))
+            if position < len(self._keys) and self._keys[position] == (key, entry_key):
+                del self._keys[position]
+        self._forget(entry['keys'])
+
+    def _forget(self, keys):
+        """Сброс кэша для всех префиксов ключей."""
+        if not self._cache:
+            return
+        for key in keys:
+            for length in range(1, len(key) + 1):
+                self._cache.pop(key[:length], None)
+
+    def _set_category_popularity(self, category_id, delta):
+        self._category_popularity[category_id] += delta
+        entry = self._entries.get(('category', category_id))
+        if delta and entry is not None:
+            entry['popularity'] = self._category_popularity[category_id]
+            self._forget(entry['keys'])
+
+    def update_product(self, product_id, name, category_id, popularity, is_active):
+        with self._lock:
+            self._record(self.update_product, product_id, name, category_id, popularity, is_active)
+            if self._loaded_at is None:
+                return
+            self._remove_product(product_id)
+            if is_active:
+                self._products[product_id] = (category_id, popularity)
+                self._set_category_popularity(category_id, popularity)
+                self._add(('product', product_id), name, popularity, {}, keep_sorted=True)
+
+    def refresh_products(self, product_ids):
+        """Обновление товаров, изменённых массовым UPDATE (без сигналов), одним запросом."""
+        for product in Product.objects.filter(id__in=product_ids).values(
+                'id', 'name', 'category_id', 'sales_count', 'is_active'):
+            self.update_product(product['id'], product['name'], product['category_id'],
+                                product['sales_count'], product['is_active'])
+
+    def remove_product(self, product_id):
+        with self._lock:
+            self._record(self.remove_product, product_id)
+            if self._loaded_at is None:
+                return
+            self._remove_product(product_id)
+
+    def _remove_product(self, product_id):
+        self._remove(('product', product_id))
+        category_id, popularity = self._products.pop(product_id, (None, 0))
+        if category_id is not None:
+            self._set_category_popularity(category_id, -popularity)
+
+    def update_category(self, category_id, name, slug):
+        with self._lock:
+            self._record(self.update_category, category_id, name, slug)
+            if self._loaded_at is None:
+                return
+            self._remove(('category', category_id))
+            self._add(('category', category_id), name, self._category_popularity[category_id],
+                      {'slug': slug}, keep_sorted=True)
+
+    def remove_category(self, category_id):
+        with self._lock:
+            self._record(self.remove_category, category_id)
+            if self._loaded_at is None:
+                return
+            self._remove(('category', category_id))
+            self._category_popularity.pop(category_id, None)
+
+    def suggest(self, query: str, limit: int = 10):
+        """Самые популярные товары и категории, название которых (или слово в нём) начинается с query."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_LIMIT)
+
+        with self._lock:
+            self._ensure_loaded()
+            ranked = self._cache.get(prefix)
+            if ranked is None:
+                matches = set()
+                for position in range(bisect_left(self._keys, (prefix,)), len(self._keys)):
+                    key, entry_key = self._keys[position]
+                    if not key.startswith(prefix):
+                        break
+                    matches.add(entry_key)
+                # При равной популярности категория выше своих товаров
+                ranked = heapq.nlargest(MAX_LIMIT, matches, key=lambda entry_key: (
+                    self._entries[entry_key]['popularity'], entry_key[0] == 'category', -entry_key[1]
+                ))
+                if len(self._cache) >= CACHE_SIZE:
+                    self._cache.clear()
+                self._cache[prefix] = ranked
+
+            results = []
+            for kind, entry_id in ranked[:limit]:
+                entry = self._entries[(kind, entry_id)]
+                result = {'type': kind, 'id': entry_id, 'name': entry['name']}
+                if kind == 'category':
+                    result['slug'] = entry['slug']
+                results.append(result)
+            return results
+
+
+suggest_index = SuggestIndex()
+
+
+# Индекс меняется только после фиксации транзакции, чтобы откат не оставлял в нём следов
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, **kwargs):
+    values = (instance.id, instance.name, instance.category_id, instance.sales_count, instance.is_active)
+    transaction.on_commit(lambda: suggest_index.update_product(*values))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: suggest_index.remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    values = (instance.id, instance.name, instance.slug)
+    transaction.on_commit(lambda: suggest_index.update_category(*values))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    category_id = instance.id
+    transaction.on_commit(lambda: suggest_index.remove_category(category_id))
@@ -0,0 +1,326 @@
+import re
+import time
+import logging
+import threading
+import weakref
+from collections import defaultdict
+from functools import lru_cache
+from typing import Iterable
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+from .catalog_cache import bump_catalog_version_on_commit, bump_product_list_version_on_commit
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+# Ключи ответов, зависящих от состава каталога, а не от одного объекта
+PRODUCTS_KEY = 'products'
+CATEGORIES_KEY = 'categories'
+SUGGEST_KEY = 'suggest'
+
+# Поля товара, от которых зависят списки (фильтры, поиск, сортировка), подсказки и счётчики категорий
+PRODUCT_FIELDS = ('name', 'description', 'price', 'category_id', 'is_active', 'stock_quantity', 'sales_count')
+PRODUCT_LIST_FIELDS = {'name', 'description', 'price', 'category_id', 'is_active'}
+PRODUCT_SUGGEST_FIELDS = {'name', 'category_id', 'is_active', 'sales_count'}
+PRODUCT_COUNT_FIELDS = {'category_id', 'is_active'}
+CATEGORY_FIELDS = ('name', 'slug')
+
+MISSING = object()
+
+
+def product_key(product_id) -> str:
+    return f'product-{product_id}'
+
+
+def category_key(slug) -> str:
+    return f'category-{slug}'
+
+
+def _results(data):
+    """Объекты ответа списка: с пагинацией и без."""
+    if isinstance(data, dict):
+        return data.get('results', [])
+    return data
+
+
+def set_cache_headers(response, policy, keys):
+    """Cache-Control по политике из CATALOG_CACHE_POLICIES и Surrogate-Key успешного ответа."""
+    if response.status_code not in (200, 304):
+        return
+    patch_cache_control(response, public=True, **settings.CATALOG_CACHE_POLICIES[policy])
+    if response.status_code == 200:
+        response['Surrogate-Key'] = ' '.join(dict.fromkeys(keys))
+
+
+class SurrogateKeyMixin:
+    """Заголовки Cache-Control и Surrogate-Key для кэширующего прокси.
+
+    Политика (max-age для браузера, s-maxage для прокси) берётся
+    из CATALOG_CACHE_POLICIES по имени cache_policy. По ключам из
+    Surrogate-Key прокси удаляет ответы при изменении товаров и категорий,
+    поэтому s-maxage может быть намного больше max-age.
+    """
+    cache_policy = None
+
+    def surrogate_keys(self, data) -> Iterable[str]:
+        return []
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            keys = self.surrogate_keys(response.data) if response.status_code == 200 else []
+            set_cache_headers(response, self.cache_policy, keys)
+        return response
+
+
+class ProductListKeysMixin(SurrogateKeyMixin):
+    cache_policy = 'list'
+
+    def surrogate_keys(self, data):
+        return [PRODUCTS_KEY] + [product_key(product['id']) for product in _results(data)]
+
+
+class ProductDetailKeysMixin(SurrogateKeyMixin):
+    cache_policy = 'detail'
+
+    def surrogate_keys(self, data):
+        keys = [product_key(data['id'])]
+        if isinstance(data.get('category'), dict):
+            keys.append(category_key(data['category']['slug']))
+        return keys
+
+
+class CategoryListKeysMixin(SurrogateKeyMixin):
+    cache_policy = 'list'
+
+    def surrogate_keys(self, data):
+        return [CATEGORIES_KEY] + [category_key(category['slug']) for category in _results(data)]
+
+
+class CategoryDetailKeysMixin(SurrogateKeyMixin):
+    cache_policy = 'detail'
+
+    def surrogate_keys(self, data):
+        return [category_key(data['slug'])]
+
+
+class HttpPurgeBackend:
+    """Очистка по ключам в HTTP-кэше перед сервисом (Varnish xkey, Fastly и т.п.).
+
+    Отправляет SURROGATE_PURGE_METHOD на SURROGATE_PURGE_URL с ключами
+    в заголовке Surrogate-Key и заголовками из SURROGATE_PURGE_HEADERS.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def purge(self, keys):
+        try:
+            response = self.session.request(
+                settings.SURROGATE_PURGE_METHOD,
+                settings.SURROGATE_PURGE_URL,
+                headers={**settings.SURROGATE_PURGE_HEADERS, 'Surrogate-Key': ' '.join(keys)},
+                timeout=5
+            )
+            if response.status_code >= 400:
+                logger.error(f"Surrogate key purge failed with {response.status_code}: {' '.join(keys)}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error purging surrogate keys {' '.join(keys)}: {e}")
+
+
+# Локальные прокси текущего процесса, которые очищает LocalProxyPurgeBackend
+_local_proxies = weakref.WeakSet()
+
+
+class LocalProxyPurgeBackend:
+    """Очистка локальных SurrogateCacheProxy текущего процесса (разработка и тесты)."""
+
+    def purge(self, keys):
+        for proxy in list(_local_proxies):
+            proxy.purge(keys)
+
+
+@lru_cache(maxsize=None)
+def get_purge_backend():
+    """Получатель очисток из настройки SURROGATE_PURGE_BACKEND (создаётся при первом обращении)."""
+    return import_string(settings.SURROGATE_PURGE_BACKEND)()
+
+
+def purge_on_commit(keys):
+    """Очистка ключей после фиксации транзакции: до неё прокси получил бы старые данные."""
+    keys = sorted(set(keys))
+    if keys:
+        transaction.on_commit(lambda: get_purge_backend().purge(keys))
+
+
+def invalidate_on_commit(keys):
+    """Очистка прокси и новая версия кэша каталога или только списков товаров.
+
+    Версия каталога меняется, если изменились списки (фильтры, поиск,
+    наличие) или категории. Остаток и updated_at есть в каждом элементе
+    списка, поэтому любое изменение товара меняет хотя бы версию списков;
+    карточка товара входит в кэш со своим updated_at.
+    """
+    keys = list(keys)
+    purge_on_commit(keys)
+    if any(key in (PRODUCTS_KEY, CATEGORIES_KEY) or key.startswith(category_key('')) for key in keys):
+        bump_catalog_version_on_commit()
+    elif any(key.startswith(product_key('')) for key in keys):
+        bump_product_list_version_on_commit()
+
+
+def purge_products(product_ids, categories=False):
+    """Очистка после массовых UPDATE товаров, которые обходят сигналы моделей."""
+    product_ids = list(product_ids)
+    keys = [PRODUCTS_KEY] + [product_key(product_id) for product_id in product_ids]
+    if categories:
+        slugs = Category.objects.filter(products__id__in=product_ids).values_list('slug', flat=True).distinct()
+        keys += [SUGGEST_KEY] + [category_key(slug) for slug in slugs]
+    invalidate_on_commit(keys)
+
+
+class SurrogateCacheProxy:
+    """Кэширующий прокси перед WSGI-приложением для локальной проверки.
+
+    Ведёт себя как CDN или Varnish с очисткой по ключам: хранит успешные
+    GET-ответы с s-maxage до истечения срока, индексирует их по Surrogate-Key
+    и удаляет по purge(). Подключается настройкой SURROGATE_LOCAL_PROXY.
+    """
+
+    S_MAXAGE = re.compile(r's-maxage=(\d+)')
+
+    def __init__(self, app):
+        self.app = app
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._urls_by_key = defaultdict(set)
+        self._lock = threading.Lock()
+        _local_proxies.add(self)
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD') or environ.get('HTTP_AUTHORIZATION'):
+            return self.app(environ, start_response)
+
+        url = f"{environ.get('PATH_INFO', '')}?{environ.get('QUERY_STRING', '')}"
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                start_response(entry[1], entry[2])
+                return [entry[3] if environ['REQUEST_METHOD'] == 'GET' else b'']
+            self.misses += 1
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers]
+            return lambda data: None
+
+        result = self.app(environ, capture)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        status, headers = captured
+        if environ['REQUEST_METHOD'] == 'GET':
+            self._store(url, status, headers, body)
+        start_response(status, headers)
+        return [body]
+
+    def _store(self, url, status, headers, body):
+        values = {name.lower(): value for name, value in headers}
+        max_age = self.S_MAXAGE.search(values.get('cache-control', ''))
+        if not status.startswith('200') or max_age is None or 'private' in values.get('cache-control', ''):
+            return
+        keys = values.get('surrogate-key', '').split()
+        with self._lock:
+            self._entries[url] = (time.monotonic() + int(max_age.group(1)), status, headers, body)
+            for key in keys:
+                self._urls_by_key[key].add(url)
+
+    def purge(self, keys):
+        with self._lock:
+            for key in keys:
+                for url in self._urls_by_key.pop(key, ()):
+                    self._entries.pop(url, None)
+
+
+# Снимок полей при загрузке объекта: по нему после сохранения
+# определяется, какие ответы устарели
+
+def _snapshot(instance, fields):
+    return {field: instance.__dict__.get(field, MISSING) for field in fields}
+
+
+@receiver(post_init, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    instance._surrogate_state = _snapshot(instance, PRODUCT_FIELDS)
+
+
+@receiver(post_init, sender=Category)
+def remember_category_state(sender, instance, **kwargs):
+    instance._surrogate_state = _snapshot(instance, CATEGORY_FIELDS)
+
+
+def _category_slugs(instance, category_ids):
+    category_ids = {category_id for category_id in category_ids if category_id not in (None, MISSING)}
+    field = Product._meta.get_field('category')
+    if field.is_cached(instance) and instance.category.pk in category_ids:
+        category_ids.discard(instance.category.pk)
+        yield instance.category.slug
+    if category_ids:
+        yield from Category.objects.filter(id__in=category_ids).values_list('slug', flat=True)
+
+
+def product_purge_keys(instance, changed):
+    before, after = instance._surrogate_state, _snapshot(instance, PRODUCT_FIELDS)
+    keys = [product_key(instance.id)]
+    was_in_stock = before['stock_quantity'] not in (0, MISSING)
+    if changed is None:
+        changed = {field for field in PRODUCT_FIELDS if before[field] != after[field]}
+    if changed & PRODUCT_LIST_FIELDS or ('stock_quantity' in changed and was_in_stock != bool(after['stock_quantity'])):
+        keys.append(PRODUCTS_KEY)
+    if changed & PRODUCT_SUGGEST_FIELDS:
+        keys.append(SUGGEST_KEY)
+    if changed & PRODUCT_COUNT_FIELDS:
+        category_ids = {before['category_id'], after['category_id']}
+        keys += [category_key(slug) for slug in _category_slugs(instance, category_ids)]
+    instance._surrogate_state = after
+    return keys
+
+
+@receiver(post_save, sender=Product)
+def purge_product_on_save(sender, instance, created, **kwargs):
+    invalidate_on_commit(product_purge_keys(instance, set(PRODUCT_FIELDS) if created else None))
+
+
+@receiver(post_delete, sender=Product)
+def purge_product_on_delete(sender, instance, **kwargs):
+    invalidate_on_commit(product_purge_keys(instance, set(PRODUCT_FIELDS)))
+
+
+@receiver(post_save, sender=Category)
+def purge_category_on_save(sender, instance, created, **kwargs):
+    before = instance._surrogate_state
+    keys = [category_key(instance.slug), CATEGORIES_KEY]
+    if before['slug'] not in (instance.slug, MISSING, ''):
+        keys.append(category_key(before['slug']))
+    if created or before['name'] != instance.name:
+        # Название категории есть в списках товаров и в подсказках
+        keys += [PRODUCTS_KEY, SUGGEST_KEY]
+    instance._surrogate_state = _snapshot(instance, CATEGORY_FIELDS)
+    invalidate_on_commit(keys)
+
+
+@receiver(post_delete, sender=Category)
+def purge_category_on_delete(sender, instance, **kwargs):
+    invalidate_on_commit([category_key(instance.slug), CATEGORIES_KEY, SUGGEST_KEY])
@@ -1,3 +1,599 @@
-from django.test import TestCase
+import uuid
+from decimal import Decimal
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
 
-# Create your tests here.
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from shop_common.event_codec import EVENT_SCHEMA_VERSIONS
+from shop_common.events import dispatch_batch
+from .models import Category, Product, ProcessedEvent
+from .serializers import ProductFlatSerializer, ProductSerializer
+from .views import ProductListView
+from .catalog_cache import catalog_version, get_catalog_cache, product_list_version
+from .checks import check_catalog_cache
+from .suggest import SuggestIndex, suggest_index
+from .surrogate import SurrogateCacheProxy, get_purge_backend
+
+# Для тестов, не проверяющих кэш ответов каталога
+NO_CATALOG_CACHE = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+})
+
+
+@NO_CATALOG_CACHE
+class ProductQueryCountTests(TestCase):
+    """Число запросов к БД не зависит от количества товаров и категорий."""
+
+    def create_products(self, categories, per_category):
+        for index in range(categories):
+            category = Category.objects.create(name=f'Category {Category.objects.count()}-{index}')
+            Product.objects.bulk_create([
+                Product(name=f'{category.name} product {i}', price=Decimal('9.99'),
+                        category=category, stock_quantity=10)
+                for i in range(per_category)
+            ])
+        return category
+
+    def test_product_list_query_count_is_constant(self):
+        self.create_products(1, 1)
+        # count, товары с категориями
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+
+        self.create_products(5, 3)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.json()['count'], 16)
+
+    def test_product_detail_query_count(self):
+        self.create_products(1, 5)
+        product = Product.objects.last()
+        # товар с категорией, число товаров категории
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-detail', args=[product.id]))
+        self.assertEqual(response.json()['category']['products_count'], 5)
+
+    def test_category_list_query_count_is_constant(self):
+        self.create_products(1, 2)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('category-list')).status_code, 200)
+
+        self.create_products(5, 2)
+        Product.objects.filter(pk=Product.objects.first().pk).update(is_active=False)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('category-list'))
+        counts = sorted(category['products_count'] for category in response.json()['results'])
+        self.assertEqual(counts, [1, 2, 2, 2, 2, 2])
+
+
+@NO_CATALOG_CACHE
+class ProductCursorPaginationTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Category')
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', price=Decimal(i % 3), category=category, stock_quantity=10)
+            for i in range(45)
+        ])
+
+    def collect(self, **params):
+        ids = []
+        response = self.client.get(reverse('product-list'), {'pagination': 'cursor', **params})
+        while True:
+            self.assertNotIn('count', response.json())
+            ids += [product['id'] for product in response.json()['results']]
+            if not response.json()['next']:
+                return ids
+            response = self.client.get(response.json()['next'])
+
+    def test_cursor_follows_requested_ordering(self):
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.collect(ordering='price'), expected)
+
+        expected = list(Product.objects.order_by('-price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.collect(ordering='-price'), expected)
+
+    def test_default_cursor_ordering(self):
+        expected = list(Product.objects.order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(self.collect(), expected)
+
+
+@NO_CATALOG_CACHE
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Посуда', description='Чайники и кружки')
+        self.kettle = Product.objects.create(name='Электрический чайник', description='Стальной корпус',
+                                             price=Decimal('20.00'), category=self.category)
+        self.mug = Product.objects.create(name='Кружка', description='Подходит к любому чайнику',
+                                          price=Decimal('5.00'), category=self.category)
+        Product.objects.create(name='Сковорода', description='Антипригарное покрытие',
+                               price=Decimal('30.00'), category=self.category)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('product-list'), {'search': query, **params})
+        return [product['id'] for product in response.json()['results']]
+
+    def test_prefix_search_ranks_name_matches_first(self):
+        self.assertEqual(self.search('чайн'), [self.kettle.id, self.mug.id])
+
+    def test_all_terms_are_required(self):
+        self.assertEqual(self.search('чайник сталь'), [self.kettle.id])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self.assertEqual(self.search('чайн', ordering='price'), [self.mug.id, self.kettle.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        Product.objects.filter(pk=self.kettle.pk).update(name='Термопот')
+        self.assertEqual(self.search('термо'), [self.kettle.id])
+        self.assertEqual(self.search('электр'), [])
+
+        self.mug.delete()
+        self.assertEqual(self.search('кружк'), [])
+
+    def test_category_search(self):
+        response = self.client.get(reverse('category-list'), {'search': 'кружк'})
+        self.assertEqual([category['id'] for category in response.json()['results']], [self.category.id])
+
+
+@NO_CATALOG_CACHE
+class ProductSuggestTests(TestCase):
+
+    def setUp(self):
+        suggest_index.invalidate()
+        self.category = Category.objects.create(name='Чайники', slug='kettles')
+        self.kettle = Product.objects.create(name='Электрический чайник', price=Decimal('20.00'),
+                                             category=self.category, sales_count=5)
+        self.teapot = Product.objects.create(name='Заварочный чайник', price=Decimal('10.00'),
+                                             category=self.category, sales_count=50)
+
+    def suggest(self, query):
+        response = self.client.get(reverse('product-suggest'), {'q': query})
+        return [(result['type'], result['id']) for result in response.json()['results']]
+
+    def test_matches_word_prefixes_ranked_by_popularity(self):
+        self.assertEqual(self.suggest('чай'), [('category', self.category.id),
+                                               ('product', self.teapot.id), ('product', self.kettle.id)])
+        self.assertEqual(self.suggest('ЭЛЕКТ'), [('product', self.kettle.id)])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.suggest('чай')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kettle.sales_count = 100
+            self.kettle.save()
+            self.teapot.is_active = False
+            self.teapot.save()
+        self.assertEqual(self.suggest('чайн'), [('category', self.category.id), ('product', self.kettle.id)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kettle.delete()
+        self.assertEqual(self.suggest('элек'), [])
+
+    def test_lookup_does_not_query_database_once_loaded(self):
+        self.suggest('чай')
+        with self.assertNumQueries(0):
+            self.suggest('зав')
+
+    def test_limit_must_be_positive(self):
+        for limit in ('0', '-1', 'many'):
+            with self.subTest(limit):
+                response = self.client.get(reverse('product-suggest'), {'q': 'чай', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+    def test_stale_index_is_rebuilt_in_background(self):
+        self.suggest('чай')
+        Product.objects.filter(pk=self.kettle.pk).update(name='Электрический самовар')
+        with override_settings(SUGGEST_INDEX_TTL=0), mock.patch('apps.products.suggest.threading.Thread') as thread:
+            # Запрос обслуживает прежний индекс и не ждёт перестройки
+            with self.assertNumQueries(0):
+                self.assertEqual(self.suggest('элек'), [('product', self.kettle.id)])
+            self.suggest('элек')
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
+        suggest_index._refreshing = False  # поток не запускался
+
+        suggest_index.refresh()
+        self.assertEqual(self.suggest('самов'), [('product', self.kettle.id)])
+
+    def test_changes_during_rebuild_are_kept(self):
+        self.suggest('чай')
+        load = SuggestIndex._load
+
+        def load_with_concurrent_change(index):
+            load(index)
+            suggest_index.update_product(self.kettle.id, 'Чайник со свистком', self.category.id, 5, True)
+
+        with mock.patch.object(SuggestIndex, '_load', autospec=True, side_effect=load_with_concurrent_change):
+            suggest_index.refresh()
+        self.assertEqual(self.suggest('свист'), [('product', self.kettle.id)])
+
+
+class ProductFacetsTests(TestCase):
+
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.kettles = Category.objects.create(name='Чайники', slug='kettles')
+        self.mugs = Category.objects.create(name='Кружки', slug='mugs')
+        Product.objects.create(name='Чайник стальной', price=Decimal('40.00'), category=self.kettles, stock_quantity=3)
+        Product.objects.create(name='Чайник стеклянный', price=Decimal('120.00'), category=self.kettles)
+        Product.objects.create(name='Кружка большая', price=Decimal('8.00'), category=self.mugs, stock_quantity=1)
+        Product.objects.create(name='Кружка скрытая', price=Decimal('8.00'), category=self.mugs, is_active=False)
+
+    def facets(self, **params):
+        return self.client.get(reverse('product-facets'), params).json()
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            facets = self.facets()
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual([(category['id'], category['count']) for category in facets['categories']],
+                         [(self.mugs.id, 1), (self.kettles.id, 2)])
+        self.assertEqual([price_range['count'] for price_range in facets['price_ranges']], [1, 1, 0, 1, 0, 0])
+        self.assertEqual(facets['stock'], {'in_stock': 2, 'out_of_stock': 1})
+
+    def test_facets_follow_search_and_filters(self):
+        facets = self.facets(search='чайн', in_stock='true')
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['categories'][0]['id'], self.kettles.id)
+
+    def test_facet_counts_ignore_own_filter(self):
+        with self.assertNumQueries(2):  # проверка категории и подсчёт
+            facets = self.facets(category=self.kettles.id, in_stock='true', min_price='10')
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual([(category['id'], category['count']) for category in facets['categories']],
+                         [(self.kettles.id, 1)])
+        self.assertEqual([price_range['count'] for price_range in facets['price_ranges']], [0, 1, 0, 0, 0, 0])
+        self.assertEqual(facets['stock'], {'in_stock': 1, 'out_of_stock': 1})
+
+        facets = self.facets(category=self.kettles.id, in_stock='true')
+        self.assertEqual([(category['id'], category['count']) for category in facets['categories']],
+                         [(self.mugs.id, 1), (self.kettles.id, 1)])
+        self.assertEqual([price_range['count'] for price_range in facets['price_ranges']], [0, 1, 0, 0, 0, 0])
+        self.assertEqual(facets['stock'], {'in_stock': 1, 'out_of_stock': 1})
+
+    def test_invalid_category_is_rejected(self):
+        response = self.client.get(reverse('product-facets'), {'category': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.json())
+
+    def test_cached_until_catalog_changes(self):
+        self.facets(min_price='10')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.facets(min_price='10')['total'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Чайник медный', price=Decimal('60.00'), category=self.kettles)
+        self.assertEqual(self.facets(min_price='10')['total'], 3)
+
+
+class CatalogResponseCacheTests(TestCase):
+
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.category = Category.objects.create(name='Kettles')
+        self.product = Product.objects.create(name='Kettle', price=Decimal('20.00'), category=self.category)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        # Карточке и списку товаров нужен один запрос за валидаторами объекта или выборки
+        for url, queries in [(reverse('product-list'), 1), (reverse('product-detail', args=[self.product.id]), 1),
+                             (reverse('category-list'), 0), (reverse('category-detail', args=[self.category.slug]), 1)]:
+            first = self.client.get(url, {'b': '2', 'a': '1'}).json()
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(url, {'a': '1', 'b': '2'}).json(), first)
+
+    def test_saving_a_product_invalidates_cached_responses(self):
+        self.client.get(reverse('product-detail', args=[self.product.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('25.00')
+            self.product.save()
+        response = self.client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.json()['price'], '25.00')
+
+    def test_matching_etag_returns_304_until_catalog_changes(self):
+        url = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_any_product_change_refreshes_lists(self):
+        self.product.stock_quantity = 2
+        self.product.save()
+        self.product = Product.objects.get()
+
+        def save(**fields):
+            versions = catalog_version(), product_list_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                for name, value in fields.items():
+                    setattr(self.product, name, value)
+                self.product.save()
+            return tuple(before != after for before, after in zip(versions, (catalog_version(), product_list_version())))
+
+        # (версия каталога, версия списков товаров)
+        self.assertEqual(save(), (False, True))
+        self.assertEqual(save(stock_quantity=1, sales_count=1), (False, True))
+        self.assertTrue(save(stock_quantity=0)[0])
+        self.assertTrue(save(price=Decimal('21.00'))[0])
+        self.assertTrue(save(is_active=False)[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            version = catalog_version()
+            self.category.name = 'Чайники'
+            self.category.save()
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_stock_change_is_not_served_from_a_stale_list(self):
+        self.product.stock_quantity = 5
+        self.product.save()
+        response = self.client.get(reverse('product-list'))
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(Product.objects.get().reserve_quantity(1))
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['stock_quantity'], 4)
+
+    def test_list_etag_follows_rows_changed_without_signals(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=7, updated_at=timezone.now())
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['stock_quantity'], 7)
+
+    @override_settings(DEBUG=False)
+    def test_process_local_catalog_cache_fails_deploy_check(self):
+        self.assertEqual([error.id for error in check_catalog_cache(None)], ['products.E001'])
+        shared = {'catalog': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                              'LOCATION': 'redis://localhost:6379/1'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_catalog_cache(None), [])
+
+    def test_missing_objects_are_not_cached(self):
+        self.assertEqual(self.client.get(reverse('product-detail', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[999])).status_code, 404)
+
+    def test_etag_is_per_resource_and_missing_objects_return_404(self):
+        other = Product.objects.create(name='Mug', price=Decimal('5.00'), category=self.category)
+        etag = self.client.get(reverse('product-detail', args=[self.product.id]))['ETag']
+        for if_none_match in (etag, '*'):
+            response = self.client.get(reverse('product-detail', args=[99999]), HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[other.id]),
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class RecordingPurgeBackend:
+    purged = []
+
+    def purge(self, keys):
+        self.purged.append(set(keys))
+
+
+@NO_CATALOG_CACHE
+@override_settings(SURROGATE_PURGE_BACKEND='apps.products.tests.RecordingPurgeBackend')
+class SurrogateKeyTests(TestCase):
+
+    def setUp(self):
+        get_purge_backend.cache_clear()
+        self.addCleanup(get_purge_backend.cache_clear)
+        RecordingPurgeBackend.purged = []
+        self.category = Category.objects.create(name='Kettles', slug='kettles')
+        self.product = Product.objects.create(name='Kettle', price=Decimal('20.00'), category=self.category,
+                                              stock_quantity=5)
+
+    def save(self, **fields):
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(product, name, value)
+            product.save()
+        return RecordingPurgeBackend.purged[-1]
+
+    def test_responses_carry_cache_policy_and_keys(self):
+        response = self.client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertIn('s-maxage=3600', response['Cache-Control'])
+        self.assertEqual(response['Surrogate-Key'], f'product-{self.product.id} category-kettles')
+
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response['Surrogate-Key'], f'products product-{self.product.id}')
+        self.assertNotIn('Surrogate-Key', self.client.post(reverse('product-list'), {}))
+
+    def test_purges_only_responses_affected_by_the_change(self):
+        self.assertEqual(self.save(stock_quantity=3), {f'product-{self.product.id}'})
+        self.assertEqual(self.save(stock_quantity=0), {f'product-{self.product.id}', 'products'})
+        self.assertEqual(self.save(is_active=False),
+                         {f'product-{self.product.id}', 'products', 'suggest', 'category-kettles'})
+
+
+@NO_CATALOG_CACHE
+@override_settings(SURROGATE_PURGE_BACKEND='apps.products.surrogate.LocalProxyPurgeBackend')
+class SurrogateCacheProxyTests(TestCase):
+
+    def setUp(self):
+        get_purge_backend.cache_clear()
+        self.addCleanup(get_purge_backend.cache_clear)
+        # Как тестовый клиент: обработчик WSGI не должен закрывать соединение тестовой транзакции
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        self.proxy = SurrogateCacheProxy(WSGIHandler())
+        self.product = Product.objects.create(name='Kettle', price=Decimal('20.00'),
+                                              category=Category.objects.create(name='Kettles', slug='kettles'))
+
+    def get(self, path):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path}
+        setup_testing_defaults(environ)
+        return b''.join(self.proxy(environ, lambda status, headers: None))
+
+    def test_serves_from_cache_until_purged(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.get(url)
+        with self.assertNumQueries(0):
+            self.get(url)
+        self.assertEqual((self.proxy.hits, self.proxy.misses), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('25.00')
+            self.product.save()
+        self.assertIn(b'"25.00"', self.get(url))
+        self.assertEqual(self.proxy.misses, 2)
+
+
+@NO_CATALOG_CACHE
+class SparseFieldsetTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Kettles', slug='kettles')
+        self.product = Product.objects.create(name='Kettle', description='Steel body', price=Decimal('20.00'),
+                                              category=self.category, stock_quantity=5)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, queries[-1]['sql']
+
+    def test_fields_trim_output_and_query(self):
+        response, sql = self.get(reverse('product-list'), fields='name,price')
+        self.assertEqual(response.json()['results'], [{'id': self.product.id, 'name': 'Kettle', 'price': '20.00'}])
+        self.assertNotIn('description', sql)
+        self.assertNotIn('products_category', sql)
+
+    def test_exclude_and_property_dependencies(self):
+        response, sql = self.get(reverse('product-detail', args=[self.product.id]),
+                                 exclude='description,category', fields='id,is_in_stock,category_name')
+        self.assertEqual(response.json(), {'id': self.product.id, 'is_in_stock': True, 'category_name': 'Kettles'})
+        self.assertIn('stock_quantity', sql)
+        self.assertNotIn('description', sql)
+
+    def test_cursor_pagination_with_sparse_fields(self):
+        Product.objects.bulk_create([Product(name=f'Product {i}', price=Decimal('1.00'), category=self.category)
+                                     for i in range(25)])
+        response = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'fields': 'name'})
+        with self.assertNumQueries(1):
+            response = self.client.get(response.json()['next'])
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+
+@NO_CATALOG_CACHE
+class ProductFlatSerializerTests(TestCase):
+    """Плоский сериализатор выдаёт тот же JSON, что и ProductSerializer."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Чайники', slug='kettles')
+        Product.objects.bulk_create([
+            Product(name=f'Товар {i}', description='Описание' if i % 2 else '', price=Decimal('19.9') * i,
+                    category=category, stock_quantity=i % 3, image_url='http://example.com/1.png' if i else '')
+            for i in range(10)
+        ])
+
+    def test_output_is_identical(self):
+        queryset = Product.objects.select_related('category')
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+        serializer = ProductFlatSerializer()
+        self.assertEqual(JSONRenderer().render(serializer.serialize(serializer.values(queryset))), expected)
+
+    def test_list_endpoint_matches_model_serializer(self):
+        for params in [{}, {'ordering': '-price'}, {'pagination': 'cursor'}, {'fields': 'name,is_in_stock'}]:
+            response = self.client.get(reverse('product-list'), params)
+            with mock.patch.object(ProductListView, 'flat_serializer_class', None):
+                expected = self.client.get(reverse('product-list'), params)
+            self.assertEqual(response.content, expected.content)
+
+
+class BatchAvailabilityTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Kettles', slug='kettles')
+        self.kettle = Product.objects.create(name='Kettle', price=Decimal('20.00'), category=category,
+                                             stock_quantity=5)
+        self.teapot = Product.objects.create(name='Teapot', price=Decimal('12.50'), category=category,
+                                             stock_quantity=1)
+
+    def post(self, items):
+        return self.client.post(reverse('check-availability-batch'), {'items': items}, content_type='application/json')
+
+    def test_checks_all_products_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.post([{'product_id': self.kettle.id, 'quantity': 3},
+                                  {'product_id': self.teapot.id, 'quantity': 2},
+                                  {'product_id': 999},
+                                  {'product_id': self.kettle.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, 200)
+        results = {result['product_id']: result for result in response.json()['results']}
+        self.assertEqual((results[self.kettle.id]['requested_quantity'], results[self.kettle.id]['available']), (5, True))
+        self.assertEqual(results[self.teapot.id]['available'], False)
+        self.assertEqual(results[self.teapot.id]['price'], '12.50')
+        self.assertEqual(response.json()['missing'], [999])
+
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'product_id': i} for i in range(101)]).status_code, 400)
+
+
+class ReleaseStockHandlerTests(TestCase):
+
+    def setUp(self):
+        from . import event_handlers  # noqa: F401 - регистрация обработчиков
+
+        category = Category.objects.create(name='Kettles', slug='kettles')
+        self.kettle = Product.objects.create(name='Kettle', price=Decimal('20.00'), category=category,
+                                             stock_quantity=5, sales_count=10)
+        self.teapot = Product.objects.create(name='Teapot', price=Decimal('12.50'), category=category,
+                                             stock_quantity=1)
+
+    def cancelled(self, *items):
+        return {'id': uuid.uuid4().hex, 'type': 'order.cancelled', 'version': EVENT_SCHEMA_VERSIONS['order.cancelled'],
+                'data': {'items': [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in items]}}
+
+    def test_batch_releases_stock_in_one_update(self):
+        events = [self.cancelled((self.kettle.id, 2), (self.teapot.id, 1)), self.cancelled((self.kettle.id, 3))]
+        with CaptureQueriesContext(connection) as queries:
+            dispatch_batch(events)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+        self.kettle.refresh_from_db()
+        self.teapot.refresh_from_db()
+        self.assertEqual((self.kettle.stock_quantity, self.teapot.stock_quantity), (10, 2))
+        self.assertEqual((self.kettle.sales_count, self.teapot.sales_count), (5, 0))
+
+    def test_batch_release_refreshes_suggestions(self):
+        with mock.patch.object(suggest_index, 'refresh_products') as refresh_products, \
+                self.captureOnCommitCallbacks(execute=True):
+            dispatch_batch([self.cancelled((self.kettle.id, 2), (self.teapot.id, 1))])
+        refresh_products.assert_called_once_with([self.kettle.id, self.teapot.id])
+
+    def test_release_quantity_returns_sales(self):
+        self.assertTrue(self.kettle.reserve_quantity(2))
+        self.kettle.release_quantity(2)
+        self.teapot.release_quantity(1)
+        self.kettle.refresh_from_db()
+        self.teapot.refresh_from_db()
+        self.assertEqual((self.kettle.stock_quantity, self.kettle.sales_count), (5, 10))
+        self.assertEqual((self.teapot.stock_quantity, self.teapot.sales_count), (2, 0))
+
+    def test_redelivered_cancellation_releases_stock_once(self):
+        event = self.cancelled((self.kettle.id, 2))
+        dispatch_batch([event])
+        dispatch_batch([event, self.cancelled((self.kettle.id, 1))])
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.stock_quantity, 8)
+        self.assertEqual(ProcessedEvent.objects.count(), 2)
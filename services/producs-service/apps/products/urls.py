@@ -5,6 +5,9 @@ urlpatterns = [
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
     path('categories/<slug:slug>/', views.CategoryDetailView.as_view(), name='category-detail'),
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/suggest/', views.suggest_products, name='product-suggest'),
+    path('products/facets/', views.ProductFacetsView.as_view(), name='product-facets'),
+    path('products/check-availability/', views.check_availability_batch, name='check-availability-batch'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:product_id>/reserve/', views.reserve_product, name='reserve-product'),
     path('products/<int:product_id>/release/', views.release_product, name='release-product'),
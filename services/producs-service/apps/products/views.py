@@ -1,76 +1,164 @@
+from django import forms
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.shortcuts import render
 from rest_framework.views import status
 from rest_framework import generics
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from django.db.models import Q
+from django.conf import settings
 from .models import Product, Category
+from shop_common.pagination import PageOrCursorPagination
+from shop_common.fieldsets import SparseFieldsetViewMixin
+from shop_common.flat import FlatListMixin
+from .search import FullTextSearchFilter
+from .suggest import MAX_LIMIT, suggest_index
+from .catalog_cache import CachedResponseMixin, catalog_cache_key, get_or_compute
+from .facets import compute_facets
+from .surrogate import (
+    SUGGEST_KEY,
+    CategoryDetailKeysMixin,
+    CategoryListKeysMixin,
+    ProductDetailKeysMixin,
+    ProductListKeysMixin,
+    set_cache_headers,
+)
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 from django_filters.rest_framework import DjangoFilterBackend
 from .serializers import (
     ProductSerializer,
+    ProductFlatSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
     CategorySerializer,
+    BatchAvailabilitySerializer,
 )
 
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(CategoryListKeysMixin, CachedResponseMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """Представление для получения списка категорий."""
-    queryset = Category.objects.all()
+    queryset = Category.objects.with_products_count().order_by('name')
     serializer_class = CategorySerializer
-    filter_backends = [SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'description']
 
-class CategoryDetailView(generics.RetrieveAPIView):
+class CategoryDetailView(CategoryDetailKeysMixin, CachedResponseMixin, SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """Представление для получения детальной информации о категории."""
-    queryset = Category.objects.all()
+    queryset = Category.objects.with_products_count()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
 
-class ProductListView(generics.ListCreateAPIView):
+class ProductListView(ProductListKeysMixin, CachedResponseMixin, SparseFieldsetViewMixin, FlatListMixin,
+                      generics.ListCreateAPIView):
     """Представление для получения списка продуктов и создания нового продукта."""
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    flat_serializer_class = ProductFlatSerializer
+    pagination_class = PageOrCursorPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['category', 'is_active']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['created_at']
+    modified_field = 'updated_at'
+    product_list = True
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        for condition in self.facet_filters().values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def facet_filters(self):
+        """Условия фильтров по цене и наличию из параметров запроса, по одному Q на фасет."""
         # Фильтрация по диапазону цен
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
 
+        price = Q()
         if min_price :
-            queryset = queryset.filter(price__gte=min_price)
+            price &= Q(price__gte=min_price)
 
         if max_price :
-            queryset = queryset.filter(price__lte=max_price)
+            price &= Q(price__lte=max_price)
 
         # Фильтрация по наличию на складе
         in_stock = self.request.query_params.get('in_stock')
+        stock = Q()
         if in_stock and in_stock.lower() == 'true':
-            queryset = queryset.filter(stock_quantity__gt=0)
+            stock = Q(stock_quantity__gt=0)
 
-        return queryset
+        return {'price': price, 'stock': stock}
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ProductCreateUpdateSerializer
         return ProductSerializer
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+class ProductFacetsView(ProductListView):
+    """Счётчики фильтров каталога (категории, цены, наличие) для текущего поиска и фильтров.
+
+    Принимает те же параметры, что и список товаров; счётчики каждого фасета
+    не учитывают его собственный фильтр. Результат кэшируется по набору
+    фильтров до изменения каталога.
+    """
+    http_method_names = ['get', 'head', 'options']
+    pagination_class = None
+    # Категория — фасет: её фильтр применяет compute_facets, а не DjangoFilterBackend
+    filterset_fields = ['is_active']
+
+    def get_queryset(self):
+        # Фасетные фильтры не сужают выборку, их условия передаются в compute_facets
+        return self.queryset.all()
+
+    def facet_filters(self):
+        filters = super().facet_filters()
+        category = self.request.query_params.get('category')
+        if category:
+            try:
+                category = forms.ModelChoiceField(Category.objects.all()).clean(category)
+            except DjangoValidationError as error:
+                raise ValidationError({'category': error.messages})
+            filters['category'] = Q(category=category)
+        return filters
+
+    def get(self, request, *args, **kwargs):
+        facets = get_or_compute(
+            catalog_cache_key('facets', request.query_params),
+            lambda: compute_facets(self.filter_queryset(self.get_queryset()), self.facet_filters()),
+            settings.PRODUCT_FACETS_CACHE_TIMEOUT
+        )
+        return Response(facets)
+
+
+class ProductDetailView(ProductDetailKeysMixin, CachedResponseMixin, SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.select_related('category')
+    modified_field = 'updated_at'
 
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return ProductCreateUpdateSerializer
         return ProductDetailSerializer
 
+@api_view(['GET'])
+def suggest_products(request):
+    """Подсказки для строки поиска: популярные товары и категории по префиксу названия."""
+    query = request.query_params.get('q', '')
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({'error': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(limit, MAX_LIMIT)
+
+    response = Response({'query': query, 'results': suggest_index.suggest(query, limit)})
+    set_cache_headers(response, 'suggest', [SUGGEST_KEY])
+    return response
+
+
 @api_view(['POST'])
 def reserve_product(request, product_id):
     """Представление для резервирования определенного количества продукта."""
@@ -120,3 +208,39 @@ def check_availability(request, product_id):
 
     except Product.DoesNotExist:
         return Response({'error': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['POST'])
+def check_availability_batch(request):
+    """Проверка доступности нескольких товаров одним запросом к БД.
+
+    Количества одного товара, указанного несколько раз, складываются.
+    Ответ содержит и сведения о товарах, которые корзина показывает в позициях.
+    """
+    serializer = BatchAvailabilitySerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    requested = {}
+    for item in serializer.validated_data['items']:
+        requested[item['product_id']] = requested.get(item['product_id'], 0) + item['quantity']
+
+    products = Product.objects.filter(id__in=requested).only(
+        'id', 'name', 'price', 'image_url', 'is_active', 'stock_quantity'
+    ).in_bulk()
+    results = []
+    for product_id, quantity in requested.items():
+        product = products.get(product_id)
+        if product is not None:
+            results.append({
+                'product_id': product.id,
+                'name': product.name,
+                'price': str(product.price),
+                'image_url': product.image_url,
+                'is_active': product.is_active,
+                'available': product.stock_quantity >= quantity,
+                'stock_quantity': product.stock_quantity,
+                'requested_quantity': quantity,
+            })
+    return Response({
+        'results': results,
+        'missing': [product_id for product_id in requested if product_id not in products],
+    })
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,6 +24,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'shop_common',
     'apps.products',
 ]
 
@@ -65,12 +67,37 @@ DATABASES = {
     }
 }
 
+# Кэш каталога: ответы списков и карточек, фасеты и версия каталога.
+# LocMemCache - свой кэш у каждого процесса, изменения из других процессов видны
+# только по истечении CATALOG_CACHE_TIMEOUT; вне DEBUG нужен общий Redis
+# (manage.py check --deploy, products.E001):
+# {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+CATALOG_CACHE = 'catalog'
+CATALOG_CACHE_TIMEOUT = 300
+# Множитель вероятностного раннего пересчёта: больше - раньше и чаще
+CATALOG_CACHE_EARLY_REFRESH = 1.0
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # orjson: быстрее стандартного JSONRenderer, Decimal выводится строкой без потерь
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shop_common.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'shop_common.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -96,4 +123,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redis настройки
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
-REDIS_DB = 0
\ No newline at end of file
+REDIS_DB = 0
+
+# Шина событий: отдельный поток на каждый тип события.
+# Хранилище: shop_common.event_backends.RedisEventBackend или InMemoryEventBackend
+EVENT_BACKEND = 'shop_common.event_backends.RedisEventBackend'
+EVENT_STREAM_PREFIX = 'events'
+EVENT_CONSUMER_GROUP = 'product-service'
+EVENT_BATCH_SIZE = 100
+# Короткое ожидание, чтобы вовремя забирать наступившие повторы
+EVENT_BLOCK_MS = 1000
+# Записи, не подтверждённые дольше EVENT_CLAIM_IDLE_MS (упавший потребитель),
+# забираются живым потребителем группы раз в EVENT_CLAIM_INTERVAL секунд;
+# через то же время снова наступают взятые, но не завершённые повторы
+EVENT_CLAIM_IDLE_MS = 60000
+EVENT_CLAIM_INTERVAL = 30
+# Журнал обработанных событий (дедупликация повторной доставки)
+EVENT_LEDGER_MODEL = 'products.ProcessedEvent'
+# Журнал обработанных событий: срок хранения должен превышать окно повторной доставки
+EVENT_LEDGER_RETENTION = timedelta(days=7)
+EVENT_LEDGER_PURGE_INTERVAL = 3600
+# Повторы с экспоненциальной задержкой, затем поток недоставленных событий
+EVENT_RETRY_MAX_ATTEMPTS = 5
+EVENT_RETRY_BASE_DELAY = 2
+EVENT_RETRY_MAX_DELAY = 300
+EVENT_DEAD_LETTER_MAXLEN = 10000
+
+# Подсказки поиска: индекс в памяти процесса раз в TTL секунд перестраивается в фоне,
+# чтобы подхватывать изменения из других процессов
+SUGGEST_INDEX_TTL = 300
+
+# Фасеты каталога: границы диапазонов цен и время жизни кэша по набору фильтров
+PRODUCT_FACET_PRICE_BUCKETS = [10, 50, 100, 500, 1000]
+PRODUCT_FACETS_CACHE_TIMEOUT = 300
+
+# HTTP-кэш перед каталогом: Cache-Control по политикам представлений (max-age для браузера,
+# s-maxage для прокси) и очистка по Surrogate-Key при изменении товаров и категорий
+CATALOG_CACHE_POLICIES = {
+    'list': {'max_age': 30, 's_maxage': 600},
+    'detail': {'max_age': 60, 's_maxage': 3600},
+    # Индекс подсказок других процессов отстаёт до SUGGEST_INDEX_TTL секунд
+    'suggest': {'max_age': 60, 's_maxage': 300},
+}
+# Получатель очисток: apps.products.surrogate.HttpPurgeBackend или LocalProxyPurgeBackend
+SURROGATE_PURGE_BACKEND = 'apps.products.surrogate.LocalProxyPurgeBackend'
+SURROGATE_PURGE_URL = 'http://localhost:6081/'
+SURROGATE_PURGE_METHOD = 'PURGE'
+SURROGATE_PURGE_HEADERS = {}
+# Локальный кэширующий прокси перед приложением (config/wsgi.py) для проверки без Varnish/CDN
+SURROGATE_LOCAL_PROXY = False
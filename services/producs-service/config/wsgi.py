@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.SURROGATE_LOCAL_PROXY:
+    from apps.products.surrogate import SurrogateCacheProxy
+
+    application = SurrogateCacheProxy(application)
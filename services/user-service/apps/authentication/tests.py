@@ -1,3 +1,43 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from apps.users.models import User
+
+
+class LoginTests(TestCase):
+    """Вход и данные пользователя по токену: так user-service используют другие сервисы."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass',
+                                             first_name='Иван')
+
+    def login(self, email='buyer@example.com', password='secret-pass'):
+        return self.client.post(reverse('login'), {'email': email, 'password': password},
+                                content_type='application/json')
+
+    def test_login_and_user_info_round_trip(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['user']['id'], self.user.id)
+
+        response = self.client.get(reverse('user-info'),
+                                   HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': self.user.id, 'email': 'buyer@example.com', 'username': 'buyer',
+                                           'first_name': 'Иван', 'last_name': ''})
+
+    def test_refreshed_access_token_is_accepted(self):
+        refresh = self.login().json()['refresh']
+        access = self.client.post(reverse('refresh'), {'refresh': refresh}, content_type='application/json').json()
+        response = self.client.get(reverse('user-info'), HTTP_AUTHORIZATION=f"Bearer {access['access']}")
+        self.assertEqual(response.json()['id'], self.user.id)
+
+    def test_invalid_credentials_and_tokens_are_rejected(self):
+        self.assertEqual(self.login(password='wrong-pass').status_code, 401)
+        self.assertEqual(self.client.get(reverse('user-info')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('user-info'), HTTP_AUTHORIZATION='Bearer garbage').status_code, 401)
+
+    def test_malformed_json_is_a_bad_request(self):
+        response = self.client.post(reverse('login'), '{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
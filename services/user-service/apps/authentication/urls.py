@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('refresh/', views.refresh_token_view, name='refresh'),
+    path('user-info/', views.user_info_view, name='user-info'),
 ]
\ No newline at end of file
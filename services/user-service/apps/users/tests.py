@@ -1,3 +1,28 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import User
+
+
+class RegistrationTests(TestCase):
+
+    def test_registered_user_gets_profile_and_can_log_in(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'buyer', 'email': 'buyer@example.com', 'first_name': '', 'last_name': '',
+            'password': 'secret-pass', 'password_confirm': 'secret-pass',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(email='buyer@example.com')
+        self.assertTrue(hasattr(user, 'profile'))
+
+        response = self.client.post(reverse('login'), {'email': 'buyer@example.com', 'password': 'secret-pass'},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['user']['id'], user.id)
+
+    def test_mismatched_passwords_are_rejected(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'buyer', 'email': 'buyer@example.com',
+            'password': 'secret-pass', 'password_confirm': 'other-pass',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.exists())